@@ -9,8 +9,21 @@ https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
-
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'poll.settings')
 
-application = get_asgi_application()
+try:
+    from django.core.asgi import get_asgi_application
+except ImportError:  # Django < 3.0: синхронное приложение в потоках asgiref
+    from asgiref.wsgi import WsgiToAsgi
+    from django.core.wsgi import get_wsgi_application
+
+    def get_asgi_application():
+        return WsgiToAsgi(get_wsgi_application())
+
+django_application = get_asgi_application()
+
+# Импорт после настройки Django
+from questionnaire.asgi import AsyncReadApplication  # noqa: E402
+
+# /api/v1/async/... читаются асинхронно, остальное обслуживает Django
+application = AsyncReadApplication(django_application)
@@ -0,0 +1,95 @@
+"""
+    BasicAuthentication с кэшем успешных проверок пароля в памяти процесса.
+
+    Полная проверка пароля (PBKDF2) стоит десятки миллисекунд CPU на каждый запрос интеграции.
+    После успешной проверки в кэш кладется pk пользователя и хэш пароля из базы под ключом HMAC
+    от логина и пароля, сами пароли в памяти не хранятся. Повторный запрос с теми же данными
+    читает пользователя по pk и сверяет хэш пароля: после смены пароля (в любом процессе)
+    хэш другой, запись выбрасывается и пароль проверяется заново. Кэш ограничен по размеру
+    (AUTH_CACHE_SIZE, вытесняются давно не использованные) и по времени жизни (AUTH_CACHE_TTL).
+"""
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from rest_framework.authentication import BasicAuthentication
+
+
+class CredentialCache(object):
+    """
+        LRU с временем жизни: ключ HMAC -> (pk пользователя, хэш пароля, время истечения)
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def make_key(self, userid, password):
+        secret = hashlib.sha256(('poll.authentication' + settings.SECRET_KEY).encode()).digest()
+        return hmac.new(secret, '{0}\0{1}'.format(userid, password).encode(), hashlib.sha256).digest()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, user):
+        ttl = getattr(settings, 'AUTH_CACHE_TTL', 300)
+        size = getattr(settings, 'AUTH_CACHE_SIZE', 1024)
+        if ttl <= 0 or size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (user.pk, user.password, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > size:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def discard_user(self, pk):
+        with self.lock:
+            for key in [key for key, entry in self.entries.items() if entry[0] == pk]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+credentials = CredentialCache()
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    def authenticate_credentials(self, userid, password, request=None):
+        key = credentials.make_key(userid, password)
+        entry = credentials.get(key)
+        if entry is not None:
+            user = get_user_model()._default_manager.filter(pk=entry[0]).first()
+            if user is not None and user.is_active and user.password == entry[1]:
+                return user, None
+            # Пароль сменен или пользователь отключен: полная проверка
+            credentials.discard(key)
+
+        user, auth = super(CachedBasicAuthentication, self).authenticate_credentials(userid, password, request)
+        credentials.set(key, user)
+        return user, auth
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, **kwargs):
+    # Другие процессы увидят смену пароля по хэшу, в этом запись удаляется сразу
+    credentials.discard_user(instance.pk)
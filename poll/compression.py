@@ -0,0 +1,114 @@
+"""
+    Сжатие ответов по Accept-Encoding: brotli, если установлен пакет brotli, иначе gzip.
+
+    Сжимаются ответы от COMPRESSION_MIN_SIZE байт и потоковые ответы (выгрузки). Уже сжатые ответы
+    (Content-Encoding, например опубликованные анкеты) и ответы на HEAD и с кодом, отличным от 200, не трогаются.
+
+    Сжатые и несжатые байты одного ответа различаются, поэтому у сжатого ответа ETag становится слабым (W/"..."),
+    как в GZipMiddleware Django. If-None-Match сравнивается слабо, см. etag_matches.
+"""
+import gzip
+import re
+import zlib
+
+from django.conf import settings
+from django.utils.cache import parse_etags, patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # Без brotli только gzip
+    brotli = None
+
+_accepts_re = re.compile(r'(?:^|,)\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?')
+
+
+def get_encoding(accept_encoding, encodings=None):
+    """
+        Лучшая из поддерживаемых кодировок encodings (по умолчанию br и gzip), которую принимает клиент, или None
+    """
+    accepted = {}
+    for name, quality in _accepts_re.findall(accept_encoding.lower()):
+        try:
+            accepted[name] = float(quality) if quality else 1.0
+        except ValueError:
+            accepted[name] = 0.0
+    if encodings is None:
+        encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+    for encoding in encodings:
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def weaken_etag(response):
+    etag = response.get('ETag')
+    if etag and not etag.startswith('W/'):
+        response['ETag'] = 'W/' + etag
+
+
+def etag_matches(etag, if_none_match):
+    """
+        Слабое сравнение ETag с If-None-Match: W/"x" и "x" совпадают. Возвращает совпавший тег из заголовка,
+        его и нужно вернуть в 304 (у сжатого ответа он слабый), или None
+    """
+    for tag in parse_etags(if_none_match):
+        if tag == '*':
+            return etag
+        if (tag[2:] if tag.startswith('W/') else tag) == etag:
+            return tag
+    return None
+
+
+def compress(encoding, content):
+    if encoding == 'br':
+        return brotli.compress(content, quality=getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5))
+    return gzip.compress(content, compresslevel=getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6), mtime=0)
+
+
+def compress_sequence(encoding, sequence):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5))
+        for chunk in sequence:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+    # Заголовок gzip пишет сам zlib (wbits=31), каждый кусок отдается сразу
+    compressor = zlib.compressobj(getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6), zlib.DEFLATED, 31)
+    for chunk in sequence:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class CompressionMiddleware(object):
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (response.status_code != 200 or request.method == 'HEAD' or response.has_header('Content-Encoding') or
+                not getattr(settings, 'COMPRESSION_ENABLED', True)):
+            return response
+        if not response.streaming and len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = get_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_sequence(encoding, response.streaming_content)
+            del response['Content-Length']
+        else:
+            content = compress(encoding, response.content)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        weaken_etag(response)
+        return response
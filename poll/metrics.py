@@ -0,0 +1,173 @@
+"""
+    Метрики запросов: время, время в базе, число SQL запросов, повторы запросов (N+1) и размер ответа
+    по каждому view и action. Гистограммы копятся в памяти процесса и отдаются в формате Prometheus на /metrics.
+
+    /metrics открыт только адресам из METRICS_ALLOWED_IPS и персоналу (is_staff) с сессией или Basic.
+"""
+import contextlib
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger('poll.metrics')
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+METRICS = (
+    ('poll_request_duration_seconds', 'Request wall time', TIME_BUCKETS),
+    ('poll_request_db_duration_seconds', 'Time spent in database queries', TIME_BUCKETS),
+    ('poll_request_queries', 'SQL queries per request', COUNT_BUCKETS),
+    ('poll_request_duplicate_queries', 'Repeated SQL statements per request (N+1)', COUNT_BUCKETS),
+    ('poll_response_size_bytes', 'Response body size', SIZE_BUCKETS),
+)
+
+
+class Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.histograms = {}
+        self.responses = Counter()
+
+    def observe(self, labels, status, values):
+        with self.lock:
+            self.responses[labels + (str(status),)] += 1
+            for (name, help_text, buckets), value in zip(METRICS, values):
+                if value is None:
+                    continue
+                key = (name, labels)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(buckets)
+                self.histograms[key].observe(value)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            lines.append('# HELP poll_responses_total Responses by view, action and status')
+            lines.append('# TYPE poll_responses_total counter')
+            for (view, action, status), value in sorted(self.responses.items()):
+                lines.append('poll_responses_total{{view="{0}",action="{1}",status="{2}"}} {3}'.format(
+                    view, action, status, value))
+            for name, help_text, buckets in METRICS:
+                lines.append('# HELP {0} {1}'.format(name, help_text))
+                lines.append('# TYPE {0} histogram'.format(name))
+                for (metric, (view, action)), histogram in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    labels = 'view="{0}",action="{1}"'.format(view, action)
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append('{0}_bucket{{{1},le="{2}"}} {3}'.format(name, labels, bound, count))
+                    lines.append('{0}_bucket{{{1},le="+Inf"}} {2}'.format(name, labels, histogram.count))
+                    lines.append('{0}_sum{{{1}}} {2}'.format(name, labels, histogram.sum))
+                    lines.append('{0}_count{{{1}}} {2}'.format(name, labels, histogram.count))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class QueryRecorder(object):
+    """
+        execute_wrapper: считает запросы, их время и повторы одного и того же SQL
+    """
+
+    def __init__(self):
+        self.statements = Counter()
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.statements[sql] += 1
+
+    @property
+    def count(self):
+        return sum(self.statements.values())
+
+    @property
+    def duplicates(self):
+        return self.count - len(self.statements)
+
+
+class MetricsMiddleware(object):
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        view, action = getattr(request, '_metrics_labels', ('unresolved', ''))
+        size = None if response.streaming else len(response.content)
+        registry.observe((view, action), response.status_code,
+                         (duration, recorder.duration, recorder.count, recorder.duplicates, size))
+
+        budget = getattr(settings, 'METRICS_QUERY_BUDGET', None)
+        if budget is not None and recorder.count > budget:
+            logger.warning('%s %s (%s.%s) ran %d queries, budget %d, %d duplicates',
+                           request.method, request.path, view, action, recorder.count, budget, recorder.duplicates)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        cls = getattr(view_func, 'cls', None)
+        view = cls.__name__ if cls is not None else getattr(view_func, '__name__', type(view_func).__name__)
+        # У ViewSet action определяется по методу запроса
+        actions = getattr(view_func, 'actions', None) or {}
+        request._metrics_labels = (view, actions.get(request.method.lower(), ''))
+        return None
+
+
+def is_allowed(request):
+    if request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ()):
+        return True
+    if request.user.is_authenticated:
+        return request.user.is_staff
+    # Сборщик метрик (Prometheus basic_auth) входит тем же Basic, что и API
+    from poll.authentication import CachedBasicAuthentication
+    from rest_framework.exceptions import AuthenticationFailed
+    try:
+        result = CachedBasicAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return result is not None and result[0].is_staff
+
+
+def metrics(request):
+    if not is_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
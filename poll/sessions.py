@@ -0,0 +1,61 @@
+"""
+    Хранение сессий SessionAuthentication, переменная окружения SESSION_MODE:
+
+    db - таблица django_session, по запросу к ней на каждый запрос с сессией (по умолчанию).
+    cached_db - сессия читается из кэша SESSION_CACHE_ALIAS, в базу идет только запись. Нужен общий для
+    всех процессов кэш (memcached, redis, файлы на одном сервере), переменные окружения SESSION_CACHE_BACKEND
+    и SESSION_CACHE_LOCATION. С кэшем в памяти процесса выход из системы в одном процессе не виден
+    в других, поэтому такие настройки отклоняются при запуске.
+    signed_cookies - данные сессии в подписанной cookie, без базы и кэша. Отозвать такую сессию до
+    истечения SESSION_COOKIE_AGE можно только сменой SECRET_KEY.
+
+    Истекшие сессии в базе удаляет purge_expired пачками, не удерживая блокировку SQLite надолго.
+"""
+import time
+
+MODES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+
+# Кэши, не общие для процессов: с ними cached_db не видит выхода из системы в другом процессе
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def get_engine(mode, cache_backend=None):
+    """
+        SESSION_ENGINE для режима mode. cache_backend - BACKEND кэша сессий, для cached_db он должен быть общим.
+        Без cache_backend кэш не проверяется (замеры в одном процессе)
+    """
+    try:
+        engine = MODES[mode]
+    except KeyError:
+        raise ValueError('Unknown SESSION_MODE "{0}", expected one of: {1}'.format(mode, ', '.join(sorted(MODES))))
+    if mode == 'cached_db' and cache_backend in LOCAL_CACHE_BACKENDS:
+        raise ValueError('SESSION_MODE "cached_db" needs a cache shared by all processes, got {0}. '
+                         'Set SESSION_CACHE_BACKEND and SESSION_CACHE_LOCATION'.format(cache_backend))
+    return engine
+
+
+def purge_expired(batch_size=1000, pause=0.0, now=None):
+    """
+        Удалить истекшие сессии пачками по batch_size с паузой pause секунд между ними. Возвращает число удаленных
+    """
+    from django.contrib.sessions.models import Session
+    from django.utils import timezone
+
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        keys = list(Session.objects.filter(expire_date__lt=now).values_list('session_key', flat=True)[:batch_size])
+        if not keys:
+            return deleted
+        deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+        if len(keys) < batch_size:
+            return deleted
+        if pause:
+            time.sleep(pause)
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 
 import os
 
+from poll import db, sessions
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -39,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'django.contrib.admindocs',
     'rest_framework',
+    'rest_framework.authtoken',
     'django_filters',
     'drf_yasg',
     'questionnaire',
@@ -47,6 +50,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'poll.compression.CompressionMiddleware',
+    'poll.metrics.MetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -81,17 +86,94 @@ WSGI_APPLICATION = 'poll.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
 
-DATABASES = {
+# DATABASE_URL, DATABASE_REPLICA_URLS, DATABASE_CONN_MAX_AGE, см. poll/db.py
+DATABASES = db.get_databases(os.environ, 'sqlite:///' + os.path.join(BASE_DIR, 'db_v1.sqlite3'))
+
+DATABASE_ROUTERS = ['poll.db.ReplicaRouter']
+
+# Профиль SQLite для одновременной записи из нескольких процессов, None - настройки SQLite по умолчанию
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,
+    'cache_size': -64 * 1024,  # В KiB
+    'temp_store': 'MEMORY',
+}
+# Повторы записи ответов при "database is locked" и начальная пауза между ними в секундах
+SQLITE_WRITE_RETRIES = 5
+SQLITE_RETRY_DELAY = 0.05
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db_v1.sqlite3'),
-    }
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Для SESSION_MODE=cached_db - общий для процессов кэш, например
+    # SESSION_CACHE_BACKEND=django.core.cache.backends.memcached.MemcachedCache SESSION_CACHE_LOCATION=127.0.0.1:11211
+    'sessions': {
+        'BACKEND': os.environ.get('SESSION_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('SESSION_CACHE_LOCATION', 'sessions'),
+    },
 }
+if CACHES['sessions']['BACKEND'] in sessions.LOCAL_CACHE_BACKENDS:
+    CACHES['sessions']['OPTIONS'] = {'MAX_ENTRIES': 10000}
+
+# Хранение сессий: db, cached_db или signed_cookies, см. poll/sessions.py
+SESSION_ENGINE = sessions.get_engine(os.environ.get('SESSION_MODE', 'db'), CACHES['sessions']['BACKEND'])
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Кэш определений анкет для retrieve, см. questionnaire/cache.py
+QUESTIONNAIRE_CACHE = 'default'
+QUESTIONNAIRE_CACHE_TIMEOUT = 60 * 60
+
+# Списки админки по таблицам ответов: COUNT(*) не дальше этого числа строк, см. questionnaire/admin.py
+ADMIN_COUNT_LIMIT = 10000
+
+# Метрики запросов на /metrics, см. poll/metrics.py
+METRICS_ENABLED = True
+# Предупреждение в лог poll.metrics, если запрос выполнил больше SQL запросов. None - не проверять
+METRICS_QUERY_BUDGET = None
+# Адреса, с которых /metrics доступен без входа, через запятую. Остальным - только персонал
+METRICS_ALLOWED_IPS = [ip for ip in os.environ.get('METRICS_ALLOWED_IPS', '').split(',') if ip]
+
+# Потоки для базы у асинхронного чтения /api/v1/async/..., см. questionnaire/asgi.py
+ASYNC_READ_THREADS = 8
+
+# Файл очереди записи пройденных анкет, см. questionnaire/ingest.py
+ANSWER_QUEUE_PATH = os.path.join(BASE_DIR, 'answer_queue.sqlite3')
+
+# Пройденные анкеты хранятся еще и документом JSON, см. questionnaire/documents.py
+ANSWER_DOCUMENTS_ENABLED = False
+
+# Каталог столбцовых массивов ответов для перекрестных таблиц, см. questionnaire/analytics.py
+ANALYTICS_PATH = os.path.join(BASE_DIR, 'analytics')
+
+# Архив ответов анкет, закрытых больше ARCHIVE_AFTER_DAYS дней назад, см. questionnaire/archive.py
+ARCHIVE_PATH = os.path.join(BASE_DIR, 'archive')
+ARCHIVE_AFTER_DAYS = 90
+
+# Сжатие ответов от COMPRESSION_MIN_SIZE байт, см. poll/compression.py
+COMPRESSION_ENABLED = True
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+
+# GET list и retrieve без ModelSerializer, по строкам values_list, см. questionnaire/readers.py
+FAST_READ_ENABLED = True
+
+# Кэш успешных проверок пароля BasicAuthentication в памяти процесса, см. poll/authentication.py
+AUTH_CACHE_TTL = 300
+AUTH_CACHE_SIZE = 1024
 
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'questionnaire.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.BasicAuthentication',
+        'poll.authentication.CachedBasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.TokenAuthentication',
     ],
     # 'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     # 'PAGE_SIZE': 100
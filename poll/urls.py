@@ -19,12 +19,13 @@ from django.conf.urls import url, include
 from django.contrib.auth.views import LoginView, LogoutView
 
 from rest_framework import permissions
+from rest_framework.authtoken.views import obtain_auth_token
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
 # from rest_framework.schemas.openapi import AutoSchema
 
-from poll import views
+from poll import metrics, views
 
 schema_view = get_schema_view(
    openapi.Info(
@@ -48,7 +49,9 @@ urlpatterns = [
     path('admin/doc/', include('django.contrib.admindocs.urls')),
 
     url(r'^$', views.home, name='home'),
+    url(r'^api/v1/token/$', obtain_auth_token, name='api-token'),
     url(r'^api/v1/', include('questionnaire.urls')),
+    url(r'^metrics$', metrics.metrics, name='metrics'),
 
     # path('accounts/login/', LoginView.as_view(template_name='login.html'), name="login", kwargs={'next_page': '/'}),
     # path("accounts/logout/", LogoutView.as_view(), name="logout", kwargs={'next_page': '/'}),
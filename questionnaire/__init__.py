@@ -0,0 +1 @@
+default_app_config = 'questionnaire.apps.QuestionnaireV1Config'
@@ -1,10 +1,167 @@
+from django.conf import settings
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+from questionnaire import documents, progress, purge, results
 from questionnaire.models import *
 # Register your models here.
 
-admin.site.register(Questionnaire)
-admin.site.register(Question)
-admin.site.register(Option)
-admin.site.register(AnswerQuestionnaire)
-admin.site.register(AnswerQuestion)
-admin.site.register(AnswerOption)
+
+def estimate_count(model, using):
+    """
+        Оценка числа строк таблицы без COUNT(*): статистика PostgreSQL, иначе наибольший pk по индексу
+    """
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+            row = cursor.fetchone()
+            if row and row[0] > 0:
+                return row[0]
+    return model._default_manager.using(using).aggregate(Max('pk'))['pk__max'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+        Список без отборов считается по оценке, если в таблице больше ADMIN_COUNT_LIMIT строк,
+        отобранный - COUNT(*) не больше чем по ADMIN_COUNT_LIMIT строкам
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = getattr(settings, 'ADMIN_COUNT_LIMIT', 10000)
+        if not queryset.query.where:
+            estimate = estimate_count(queryset.model, queryset.db)
+            if estimate > limit:
+                return estimate
+        return queryset[:limit].count()
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+        Таблицы ответов: новые строки первыми по индексу pk, без полного COUNT(*) и без выпадающих
+        списков по большим таблицам
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ('-pk',)
+
+
+class DeleteEachMixin(object):
+    """
+        Удаление отмеченных по одному через delete_model, что бы вычитались итоги results
+    """
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            self.delete_model(request, obj)
+
+
+@admin.register(Questionnaire)
+class QuestionnaireAdmin(DeleteEachMixin, admin.ModelAdmin):
+    """
+        Удаление, как DELETE в API, только отмечает анкету, строки удаляет purge_questionnaires, см. purge.py
+    """
+    list_display = ('pk', 'name', 'date_begin', 'date_end', 'deleted_at')
+    search_fields = ('name',)
+    # Индекс questionnaire_date_end_idx
+    list_filter = ('date_end',)
+
+    def get_deleted_objects(self, objs, request):
+        # Страница подтверждения без сборщика каскада: он загрузил бы все ответы анкеты
+        objs = list(objs)
+        perms_needed = set() if self.has_delete_permission(request) else {self.opts.verbose_name}
+        return [str(obj) for obj in objs], {self.opts.verbose_name_plural: len(objs)}, perms_needed, []
+
+    def delete_model(self, request, obj):
+        if obj.deleted_at is None:
+            purge.mark_deleted(obj)
+
+
+@admin.register(Question)
+class QuestionAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'name', 'questionnaire', 'question_type')
+    list_select_related = ('questionnaire',)
+    list_filter = ('questionnaire',)
+    search_fields = ('name',)
+    autocomplete_fields = ('questionnaire',)
+
+
+@admin.register(Option)
+class OptionAdmin(DeleteEachMixin, admin.ModelAdmin):
+    list_display = ('pk', 'option', 'question')
+    list_select_related = ('question__questionnaire',)
+    search_fields = ('option',)
+    autocomplete_fields = ('question',)
+
+    def get_readonly_fields(self, request, obj=None):
+        # Вариант с ответами не переносится в другой вопрос, см. OptionSerializer.validate
+        if obj is not None and AnswerOption.objects.filter(option=obj).exists():
+            return ('question',)
+        return ()
+
+    def delete_model(self, request, obj):
+        # Как OptionViewSet.perform_destroy
+        with transaction.atomic():
+            rows = list(AnswerOption.objects.filter(option=obj)
+                        .values_list('answer_question__question', 'answer_question', 'option'))
+            answer_questionnaire_pks = []
+            if documents.is_enabled():
+                answer_questionnaire_pks = (AnswerQuestion.objects.filter(pk__in={row[1] for row in rows})
+                                            .values_list('answer_questionnaire', flat=True))
+            obj.delete()
+            results.discount_answer_options(rows)
+            documents.save(answer_questionnaire_pks)
+
+
+@admin.register(AnswerQuestionnaire)
+class AnswerQuestionnaireAdmin(DeleteEachMixin, LargeTableAdmin):
+    list_display = ('pk', 'questionnaire', 'user', 'created_at', 'snapshot_version')
+    list_select_related = ('questionnaire', 'user')
+    # Индексы внешнего ключа questionnaire и answer_created_idx
+    list_filter = ('questionnaire', 'created_at')
+    autocomplete_fields = ('questionnaire',)
+
+    def delete_model(self, request, obj):
+        # Как AnswerViewSet.perform_destroy: без каскада Django, сигнал pre_delete не срабатывает
+        with transaction.atomic():
+            results.discount_answer_questionnaire(obj)
+            purge.delete_answer_questionnaires([obj.pk])
+            progress.refresh(obj.questionnaire_id, [obj.user_id])
+
+
+@admin.register(AnswerQuestion)
+class AnswerQuestionAdmin(DeleteEachMixin, LargeTableAdmin):
+    list_display = ('pk', 'answer_questionnaire_id', 'question', 'question_type', 'text')
+    list_select_related = ('question__questionnaire',)
+    # По копии questionnaire, без join с пройденной анкетой
+    list_filter = ('questionnaire',)
+    raw_id_fields = ('answer_questionnaire', 'question')
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            rows = list(obj.answer_options.values_list('answer_question__question', 'answer_question', 'option'))
+            obj.delete()
+            results.discount_answer_options(rows)
+            progress.refresh(obj.questionnaire_id, [obj.user_id])
+            documents.save([obj.answer_questionnaire_id])
+
+
+@admin.register(AnswerOption)
+class AnswerOptionAdmin(DeleteEachMixin, LargeTableAdmin):
+    list_display = ('pk', 'answer_question_id', 'option', 'user_id')
+    list_select_related = ('option__question__questionnaire',)
+    list_filter = ('questionnaire',)
+    raw_id_fields = ('answer_question', 'option')
+
+    def delete_model(self, request, obj):
+        # Как AnswerOptionViewSet.perform_destroy
+        with transaction.atomic():
+            obj.delete()
+            results.discount_answer_options([(obj.answer_question.question_id, obj.answer_question_id,
+                                              obj.option_id)])
+            documents.save([obj.answer_question.answer_questionnaire_id])
@@ -0,0 +1,273 @@
+"""
+    Столбцовое хранение ответов анкеты для перекрестных таблиц.
+
+    На каждый вопрос с вариантами хранится массив масок по респондентам (пройденным анкетам):
+    бит i - выбран i-й вариант вопроса по возрастанию pk, 0 - ответа нет. Фильтр и перекрестная таблица
+    считаются операциями над массивами, без самосоединений AnswerOption.
+
+    Массивы лежат в файле ANALYTICS_PATH/questionnaire_<pk>.columns и дополняются при чтении ответами
+    с pk больше сохраненного. Если ответы удаляли (изменился Questionnaire.answer_deletions, его увеличивает
+    results.py при каждом удалении) или изменились вопросы и варианты анкеты, массивы строятся заново.
+    Ответы заархивированных пройденных анкет берутся из архива, см. archive.py.
+"""
+import json
+import os
+import tempfile
+from array import array
+
+from django.conf import settings
+
+from questionnaire import archive
+from questionnaire.models import *
+from questionnaire.serializers import get_metadata
+
+try:
+    import numpy
+except ImportError:  # Без numpy те же операции идут циклом по array
+    numpy = None
+
+# Маска варианта - бит 64-битного числа
+MAX_OPTIONS = 64
+EMPTY_ARCHIVE = {'answer_watermark': 0, 'answers': 0, 'options': 0}
+
+
+class ColumnsError(ValueError):
+    pass
+
+
+def _bits(mask):
+    i = 0
+    while mask:
+        if mask & 1:
+            yield i
+        mask >>= 1
+        i += 1
+
+
+class Columns(object):
+    def __init__(self, questionnaire_pk, questions):
+        self.questionnaire_pk = questionnaire_pk
+        # {question_pk: [option_pk, ...]} по возрастанию pk
+        self.questions = questions
+        self.option_indexes = {question_pk: {option_pk: i for i, option_pk in enumerate(option_pks)}
+                               for question_pk, option_pks in questions.items()}
+        self.answers = array('q')
+        self.rows = {}
+        self.masks = {question_pk: array('Q') for question_pk in questions}
+        self.answer_watermark = 0
+        self.option_watermark = 0
+        self.deletions = 0
+
+    def add_answers(self, answer_pks):
+        for pk in answer_pks:
+            self.rows[pk] = len(self.answers)
+            self.answers.append(pk)
+            self.answer_watermark = max(self.answer_watermark, pk)
+        for masks in self.masks.values():
+            masks.extend([0] * (len(self.answers) - len(masks)))
+
+    def add_options(self, rows):
+        """
+            rows - (answer_option_pk, answer_questionnaire_pk, question_pk, option_pk)
+        """
+        for pk, answer_pk, question_pk, option_pk in rows:
+            # Вариант, добавленный после чтения метаданных, попадет в массивы при перестроении
+            index = self.option_indexes.get(question_pk, {}).get(option_pk)
+            if index is not None:
+                self.masks[question_pk][self.rows[answer_pk]] |= 1 << index
+            self.option_watermark = max(self.option_watermark, pk)
+
+    def save(self, path):
+        header = {
+            'questionnaire': self.questionnaire_pk,
+            'questions': [[question_pk, option_pks] for question_pk, option_pks in self.questions.items()],
+            'answer_watermark': self.answer_watermark, 'option_watermark': self.option_watermark,
+            'deletions': self.deletions, 'rows': len(self.answers),
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Запись в свой временный файл и переименование: читатель не увидит половину файла,
+        # одновременные записи не пишут в один файл
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(json.dumps(header).encode() + b'\n')
+                self.answers.tofile(f)
+                for question_pk in self.questions:
+                    self.masks[question_pk].tofile(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        with f:
+            header = json.loads(f.readline().decode())
+            columns = cls(header['questionnaire'], {question_pk: option_pks for question_pk, option_pks in header['questions']})
+            columns.answers.fromfile(f, header['rows'])
+            for question_pk in columns.questions:
+                columns.masks[question_pk].fromfile(f, header['rows'])
+        columns.rows = {pk: i for i, pk in enumerate(columns.answers)}
+        for name in ('answer_watermark', 'option_watermark', 'deletions'):
+            setattr(columns, name, header.get(name))
+        return columns
+
+    def get_masks(self, question_pk):
+        if question_pk not in self.masks:
+            raise ColumnsError('Question pk {0} is not a choice question of Questionnaire pk {1} '
+                               'or has more than {2} options'.format(question_pk, self.questionnaire_pk, MAX_OPTIONS))
+        return self.masks[question_pk]
+
+    def get_bits(self, question_pk, option_pks):
+        self.get_masks(question_pk)
+        bits = 0
+        for option_pk in option_pks:
+            if option_pk not in self.option_indexes[question_pk]:
+                raise ColumnsError('Invalid Option pk {0} for Question pk {1}'.format(option_pk, question_pk))
+            bits |= 1 << self.option_indexes[question_pk][option_pk]
+        return bits
+
+    def crosstab(self, row, col=None, filters=()):
+        """
+            Число респондентов по вариантам вопроса row и, если задан col, по парам вариантов row x col.
+            filters - (question_pk, [option_pk]): выбран хотя бы один из вариантов, условия через И
+        """
+        conditions = [(self.get_masks(question_pk), self.get_bits(question_pk, option_pks))
+                      for question_pk, option_pks in filters]
+        row_masks = self.get_masks(row)
+        col_masks = self.get_masks(col) if col is not None else None
+        width = len(self.questions[col]) if col is not None else 0
+        compute = self._crosstab_numpy if numpy is not None else self._crosstab_array
+        respondents, counts, cells = compute(conditions, row_masks, len(self.questions[row]), col_masks, width)
+        data = {
+            'questionnaire': self.questionnaire_pk,
+            'respondents': respondents,
+            'row': {'question': row, 'options': self.questions[row], 'counts': counts},
+        }
+        if col is not None:
+            data['col'] = {'question': col, 'options': self.questions[col]}
+            data['cells'] = cells
+        return data
+
+    def _crosstab_numpy(self, conditions, row_masks, height, col_masks, width):
+        def matrix(masks, size):
+            # Респонденты x варианты, 1 - вариант выбран
+            shifts = numpy.arange(size, dtype=numpy.uint64)
+            return ((masks[:, None] >> shifts) & numpy.uint64(1)).astype(numpy.int64)
+
+        selected = numpy.ones(len(self.answers), dtype=bool)
+        for masks, bits in conditions:
+            selected &= (numpy.frombuffer(masks, dtype=numpy.uint64) & numpy.uint64(bits)) != 0
+        rows = matrix(numpy.frombuffer(row_masks, dtype=numpy.uint64)[selected], height)
+        cells = None
+        if col_masks is not None:
+            cols = matrix(numpy.frombuffer(col_masks, dtype=numpy.uint64)[selected], width)
+            cells = (rows.T @ cols).tolist()
+        return int(selected.sum()), rows.sum(axis=0).tolist(), cells
+
+    def _crosstab_array(self, conditions, row_masks, height, col_masks, width):
+        selected = [i for i in range(len(self.answers)) if all(masks[i] & bits for masks, bits in conditions)]
+        counts = [0] * height
+        cells = [[0] * width for i in range(height)] if col_masks is not None else None
+        for i in selected:
+            row_bits = list(_bits(row_masks[i]))
+            for r in row_bits:
+                counts[r] += 1
+            if cells is not None and row_bits:
+                col_bits = list(_bits(col_masks[i]))
+                for r in row_bits:
+                    for c in col_bits:
+                        cells[r][c] += 1
+        return len(selected), counts, cells
+
+
+def get_path(questionnaire_pk):
+    return os.path.join(settings.ANALYTICS_PATH, 'questionnaire_{0}.columns'.format(questionnaire_pk))
+
+
+def _live_answers(questionnaire_pk, archived):
+    # Пройденные анкеты до answer_watermark архива уже в нем, даже если удаление из базы не закончено
+    return AnswerQuestionnaire.objects.filter(questionnaire=questionnaire_pk, pk__gt=archived['answer_watermark'])
+
+
+def _live_options(questionnaire_pk, archived):
+    return AnswerOption.objects.filter(questionnaire=questionnaire_pk,
+                                       answer_question__answer_questionnaire__gt=archived['answer_watermark'])
+
+
+def _new_answers(columns, archived):
+    return list(_live_answers(columns.questionnaire_pk, archived).filter(pk__gt=columns.answer_watermark)
+                .order_by('pk').values_list('pk', flat=True))
+
+
+def _new_options(columns, archived):
+    return list(_live_options(columns.questionnaire_pk, archived).filter(pk__gt=columns.option_watermark)
+                .values_list('pk', 'answer_question__answer_questionnaire', 'answer_question__question', 'option'))
+
+
+def _add_archived(columns):
+    answer_pks = []
+    rows = []
+    for row in archive.iter_rows(columns.questionnaire_pk):
+        if not answer_pks or answer_pks[-1] != row[0]:
+            answer_pks.append(row[0])
+        if row[6] is not None:
+            # pk строки варианта в архиве нет, option_watermark относится только к строкам базы
+            rows.append((0, row[0], row[3], row[6]))
+    columns.add_answers(answer_pks)
+    columns.add_options(rows)
+
+
+def get_questions(metadata):
+    """
+        Вопросы с вариантами из метаданных анкеты: {question_pk: [option_pk, ...]}
+    """
+    return {question_pk: sorted(option_pks) for question_pk, (question_type, option_pks) in sorted(metadata.items())
+            if question_type in (QT_CHOICES, QT_MULTI_CHOICES) and len(option_pks) <= MAX_OPTIONS}
+
+
+def build(questionnaire_pk, questions, archived=None, deletions=0):
+    archived = archived or EMPTY_ARCHIVE
+    columns = Columns(questionnaire_pk, questions)
+    columns.deletions = deletions
+    if archived['answers']:
+        _add_archived(columns)
+    columns.add_answers(_new_answers(columns, archived))
+    columns.add_options(_new_options(columns, archived))
+    return columns
+
+
+def get_columns(questionnaire_pk):
+    """
+        Массивы анкеты, дополненные новыми ответами. None, если анкеты нет
+    """
+    metadata = get_metadata(questionnaire_pk)
+    if metadata is False:
+        return None
+    questions = get_questions(metadata)
+    # Читается до строк ответов: удаление между чтениями только приведет к лишнему перестроению
+    deletions = Questionnaire.objects.filter(pk=questionnaire_pk).values_list('answer_deletions', flat=True).first()
+    archived = archive.read_header(questionnaire_pk) or EMPTY_ARCHIVE
+    path = get_path(questionnaire_pk)
+    columns = Columns.load(path)
+    # Удаленные строки не видны по pk, их выдает answer_deletions.
+    # Перенос в архив строки не удаляет из массивов, они остаются годными
+    if columns is not None and columns.questions == questions and columns.deletions == deletions:
+        answer_pks = _new_answers(columns, archived)
+        rows = _new_options(columns, archived)
+        if answer_pks or rows:
+            columns.add_answers(answer_pks)
+            columns.add_options(rows)
+            columns.save(path)
+        return columns
+    columns = build(questionnaire_pk, questions, archived, deletions or 0)
+    columns.save(path)
+    return columns
+
+
+def crosstab(questionnaire_pk, row, col=None, filters=()):
+    return get_columns(questionnaire_pk).crosstab(row, col, filters)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class QuestionnaireV1Config(AppConfig):
     name = 'questionnaire'
+
+    def ready(self):
+        from questionnaire import signals  # noqa
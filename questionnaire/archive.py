@@ -0,0 +1,199 @@
+"""
+    Архив ответов закрытых анкет.
+
+    Ответы анкет, закрытых больше ARCHIVE_AFTER_DAYS дней назад, переносятся в файл
+    ARCHIVE_PATH/questionnaire_<pk>.ndjson.gz и удаляются из таблиц ответов пачками, см. purge.py.
+    Индексы таблиц ответов, по которым ходят респонденты, остаются по размеру только открытых анкет.
+
+    Файл - две части gzip: строка заголовка JSON и строки ответов массивами в порядке export.FIELDS,
+    одна строка на вариант ответа, как в выгрузке. Пройденная анкета без ответов хранится строкой
+    с question = null: она нужна для числа респондентов в перекрестных таблицах.
+
+    answer_watermark заголовка - наибольший pk пройденной анкеты в архиве. Ответы пройденных анкет с pk
+    до него читаются из архива, после - из базы, так export, analytics и results.recount видят все ответы.
+    Счетчики итогов остаются в базе, results.get_results архив не читает. Архивирование можно прервать
+    и повторить: сначала файл заменяется целиком, затем из базы удаляется то, что уже в архиве.
+
+    Между записью файла и удалением ответы не должны меняться: API отклоняет запись ответов анкеты
+    после date_end (serializers.check_open), а архивируются только анкеты, закрытые ARCHIVE_AFTER_DAYS назад.
+    Правка ответов такой анкеты в обход API (админка, SQL) во время архивирования теряется, после нее
+    нужен rebuild_results.
+"""
+import datetime
+import gzip
+import itertools
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.db.models import Max
+
+from questionnaire import purge
+from questionnaire.models import *
+
+CHUNK_SIZE = 2000
+
+
+def get_path(questionnaire_pk):
+    return os.path.join(settings.ARCHIVE_PATH, 'questionnaire_{0}.ndjson.gz'.format(questionnaire_pk))
+
+
+def read_header(questionnaire_pk):
+    """
+        Заголовок архива анкеты или None, если архива нет
+    """
+    try:
+        f = gzip.open(get_path(questionnaire_pk), 'rb')
+    except FileNotFoundError:
+        return None
+    with f:
+        return json.loads(f.readline().decode())
+
+
+def get_watermark(questionnaire_pk):
+    header = read_header(questionnaire_pk)
+    return header['answer_watermark'] if header else 0
+
+
+def get_watermarks(questionnaire=None):
+    """
+        {questionnaire_pk: answer_watermark} заархивированных анкет, всех или только questionnaire
+    """
+    pks = [questionnaire.pk] if questionnaire is not None else Questionnaire.objects.values_list('pk', flat=True)
+    watermarks = {pk: get_watermark(pk) for pk in pks}
+    return {pk: watermark for pk, watermark in watermarks.items() if watermark}
+
+
+def iter_rows(questionnaire_pk):
+    """
+        Все строки архива, в том числе пройденные анкеты без ответов и ответы на удаленные вопросы и варианты
+    """
+    try:
+        f = gzip.open(get_path(questionnaire_pk), 'rt', encoding='utf-8')
+    except FileNotFoundError:
+        return
+    with f:
+        f.readline()
+        for line in f:
+            yield tuple(json.loads(line))
+
+
+def iter_answers(questionnaire_pk):
+    """
+        Строки архива в виде export.iter_rows: только ответы на существующие вопросы и варианты
+    """
+    questions = set(Question.objects.filter(questionnaire=questionnaire_pk).values_list('pk', flat=True))
+    options = set(Option.objects.filter(question__questionnaire=questionnaire_pk).values_list('pk', flat=True))
+    for row in iter_rows(questionnaire_pk):
+        if row[3] in questions and (row[6] is None or row[6] in options):
+            yield row
+
+
+def _live_rows(questionnaire_pk, watermark, last_pk):
+    # Соединение от пройденной анкеты, а не от AnswerQuestion: пройденные анкеты без ответов тоже попадают в архив
+    queryset = (AnswerQuestionnaire.objects.filter(questionnaire=questionnaire_pk, pk__gt=watermark, pk__lte=last_pk)
+                .order_by('pk', 'answer_questions__question', 'answer_questions__answer_options__option')
+                .values_list('pk', 'user', 'created_at', 'answer_questions__question',
+                             'answer_questions__question_type', 'answer_questions__text',
+                             'answer_questions__answer_options__option'))
+    for row in queryset.iterator(chunk_size=CHUNK_SIZE):
+        yield row[:2] + (row[2].isoformat(),) + row[3:]
+
+
+def _write(questionnaire_pk, rows):
+    """
+        Записать архив из rows по возрастанию pk пройденной анкеты. Заголовок - отдельная часть gzip
+        перед строками: счетчики в нем известны только после записи строк
+    """
+    path = get_path(questionnaire_pk)
+    header = {'questionnaire': questionnaire_pk, 'answer_watermark': 0, 'answers': 0, 'options': 0, 'rows': 0}
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # Свои временные файлы у каждого запуска: параллельный или прерванный запуск не допишет в чужой файл
+    rows_fd, rows_path = tempfile.mkstemp(dir=directory, suffix='.rows')
+    tmp_path = None
+    try:
+        with os.fdopen(rows_fd, 'wb') as rows_file, gzip.open(rows_file, 'wt', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False, separators=(',', ':')) + '\n')
+                if row[0] != header['answer_watermark']:
+                    header['answer_watermark'] = row[0]
+                    header['answers'] += 1
+                if row[6] is not None:
+                    header['options'] += 1
+                header['rows'] += 1
+        # Запись во временный файл и переименование: читатель не увидит половину файла
+        tmp_fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(tmp_fd, 'wb') as f:
+            f.write(gzip.compress(json.dumps(header).encode() + b'\n'))
+            with open(rows_path, 'rb') as rows_file:
+                shutil.copyfileobj(rows_file, f)
+        os.replace(tmp_path, path)
+    finally:
+        for name in (rows_path, tmp_path):
+            if name is None:
+                continue
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+    return header
+
+
+def _steps(questionnaire_pk, watermark):
+    return (
+        ('answer_options', AnswerOption.objects.filter(questionnaire=questionnaire_pk,
+                                                       answer_question__answer_questionnaire__lte=watermark)),
+        ('answer_documents', AnswerDocument.objects.filter(answer_questionnaire__questionnaire=questionnaire_pk,
+                                                           pk__lte=watermark)),
+        ('answer_questions', AnswerQuestion.objects.filter(questionnaire=questionnaire_pk,
+                                                           answer_questionnaire__lte=watermark)),
+        ('answer_questionnaires', AnswerQuestionnaire.objects.filter(questionnaire=questionnaire_pk,
+                                                                     pk__lte=watermark)),
+    )
+
+
+def archive_questionnaire(questionnaire_pk, batch_size=1000, pause=0.0, progress=None):
+    """
+        Дописать в архив пройденные анкеты из базы и удалить заархивированные из базы пачками по batch_size.
+        Анкета должна быть закрыта: ответы в нее после записи файла не попадут в архив.
+        progress(step, count): archived - строк в архиве, остальные шаги - удалено строк. Возвращает {шаг: число}
+    """
+    progress = progress or (lambda step, count: None)
+    counts = {}
+    watermark = get_watermark(questionnaire_pk)
+    last_pk = AnswerQuestionnaire.objects.filter(questionnaire=questionnaire_pk).aggregate(Max('pk'))['pk__max']
+    if last_pk is not None and last_pk > watermark:
+        header = _write(questionnaire_pk, itertools.chain(iter_rows(questionnaire_pk),
+                                                          _live_rows(questionnaire_pk, watermark, last_pk)))
+        watermark = header['answer_watermark']
+        counts['archived'] = header['rows']
+        progress('archived', header['rows'])
+    for step, queryset in _steps(questionnaire_pk, watermark):
+        counts[step] = purge.delete_in_batches(queryset, batch_size, pause,
+                                               lambda deleted, step=step: progress(step, deleted))
+    return counts
+
+
+def get_closed(days=None):
+    """
+        Анкеты с ответами в базе, закрытые больше days дней назад, по умолчанию ARCHIVE_AFTER_DAYS
+    """
+    if days is None:
+        days = getattr(settings, 'ARCHIVE_AFTER_DAYS', 90)
+    date = datetime.date.today() - datetime.timedelta(days=days)
+    return list(Questionnaire.objects.filter(date_end__lt=date, deleted_at__isnull=True,
+                                             pk__in=AnswerQuestionnaire.objects.values('questionnaire'))
+                .order_by('pk').values_list('pk', flat=True))
+
+
+def archive_closed(days=None, batch_size=1000, pause=0.0, progress=None):
+    """
+        Заархивировать все закрытые анкеты. Вызывается по расписанию командой archive_answers.
+        progress(questionnaire_pk, step, count). Возвращает {questionnaire_pk: {шаг: число}}
+    """
+    progress = progress or (lambda questionnaire_pk, step, count: None)
+    return {pk: archive_questionnaire(pk, batch_size, pause, lambda step, count, pk=pk: progress(pk, step, count))
+            for pk in get_closed(days)}
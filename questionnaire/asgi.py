@@ -0,0 +1,154 @@
+"""
+    Асинхронное чтение для респондента: список активных анкет, определение анкеты и свои пройденные анкеты
+    по адресам /api/v1/async/...
+
+    Запрос принимается и ответ отправляется в цикле событий, без потока на соединение. В Django 2.2 нет
+    асинхронного ORM, поэтому аутентификация, база и сериализация выполняются в ограниченном пуле потоков
+    теми же viewset, что и в синхронном API. Размер пула (ASYNC_READ_THREADS) ограничивает и число
+    соединений с базой, остальные запросы ждут своей очереди в пуле, не занимая потоков.
+
+    Запрос проходит через тот же MIDDLEWARE, что и синхронный: метрики и бюджет запросов, сжатие,
+    SecurityMiddleware, сессия, CSRF и пользователь. Адреса разрешаются по urlpatterns этого модуля
+    относительно PREFIX, остальные адреса под PREFIX отвечают 404.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.conf.urls import url
+from django.core.handlers.base import BaseHandler
+from django.db import close_old_connections
+from django.http import HttpRequest, HttpResponseServerError, QueryDict
+from django.http.cookie import parse_cookie
+from django.urls import set_urlconf
+
+from questionnaire import views
+
+logger = logging.getLogger(__name__)
+
+PREFIX = '/api/v1/async/'
+
+# Адреса относительно префикса, request.urlconf асинхронных запросов
+urlpatterns = [
+    url(r'^questionnaires/active/$', views.QuestionnaireViewSet.as_view({'get': 'active'})),
+    url(r'^questionnaires/(?P<pk>\d+)/$', views.QuestionnaireViewSet.as_view({'get': 'retrieve'})),
+    url(r'^answers/$', views.AnswerViewSet.as_view({'get': 'list'})),
+]
+
+
+class AsgiRequest(HttpRequest):
+    """
+        HttpRequest из scope ASGI. path - полный адрес (для ссылок пагинации), path_info - адрес
+        относительно prefix для разрешения по urlpatterns этого модуля
+    """
+    urlconf = __name__
+
+    def __init__(self, scope, body=b'', prefix=PREFIX):
+        super(AsgiRequest, self).__init__()
+        self.scope = scope
+        self.method = scope['method'].upper()
+        self.path_info = '/' + scope['path'][len(prefix):]
+        self.path = scope.get('root_path', '') + scope['path']
+        query_string = scope.get('query_string', b'').decode('latin-1')
+        self.META = {
+            'REQUEST_METHOD': self.method,
+            'QUERY_STRING': query_string,
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            'PATH_INFO': scope['path'],
+        }
+        if scope.get('client'):
+            self.META['REMOTE_ADDR'], self.META['REMOTE_PORT'] = scope['client']
+        if scope.get('server'):
+            self.META['SERVER_NAME'], self.META['SERVER_PORT'] = scope['server'][0], str(scope['server'][1])
+        for name, value in scope.get('headers', ()):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = 'HTTP_' + name
+            value = value.decode('latin-1')
+            self.META[name] = self.META[name] + ',' + value if name in self.META else value
+
+        self.GET = QueryDict(query_string)
+        self.COOKIES = parse_cookie(self.META.get('HTTP_COOKIE', ''))
+        self._body = body
+        self._stream = BytesIO(body)
+
+    def _get_scheme(self):
+        return self.scope.get('scheme', 'http')
+
+
+class AsyncReadApplication(object):
+    """
+        Приложение ASGI: запросы с префиксом PREFIX обслуживаются здесь, остальные - приложением Django
+    """
+
+    def __init__(self, application, prefix=PREFIX, threads=None):
+        self.application = application
+        self.prefix = prefix
+        self.handler = BaseHandler()
+        self.handler.load_middleware()
+        self.executor = ThreadPoolExecutor(max_workers=threads or settings.ASYNC_READ_THREADS,
+                                           thread_name_prefix='async-read')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http' and scope['path'].startswith(self.prefix):
+            body = await self.read_body(receive)
+            response, content = await asyncio.get_event_loop().run_in_executor(
+                self.executor, self.get_response, scope, body)
+            await self.send_response(response, content, send)
+        else:
+            await self.application(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        return b''.join(chunks)
+
+    def get_response(self, scope, body):
+        """
+            Выполняется в потоке пула. Соединения с базой закрываются по CONN_MAX_AGE,
+            как на сигналах request_started и request_finished. Исключения представлений превращает в
+            ответы сам BaseHandler, здесь ловятся только ошибки разбора запроса и чтения потокового ответа
+        """
+        close_old_connections()
+        try:
+            response = self.handler.get_response(AsgiRequest(scope, body, self.prefix))
+            if response.streaming:
+                content = b''.join(response.streaming_content)
+            else:
+                content = response.content
+            # Как в WSGI: request_finished и закрытие файлов ответа
+            response.close()
+            return response, content
+        except Exception:
+            logger.exception('Internal Server Error: %s', scope['path'])
+            return HttpResponseServerError(), b''
+        finally:
+            set_urlconf(None)
+            close_old_connections()
+
+    async def send_response(self, response, content, send):
+        headers = [(name.encode('latin-1'), str(value).encode('latin-1')) for name, value in response.items()]
+        for cookie in response.cookies.values():
+            headers.append((b'Set-Cookie', cookie.output(header='').strip().encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': content})
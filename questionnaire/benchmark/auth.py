@@ -0,0 +1,86 @@
+"""
+    Замер CPU на аутентификацию запроса: OptionViewSet.retrieve с BasicAuthentication DRF,
+    CachedBasicAuthentication (poll/authentication.py) и TokenAuthentication.
+
+    Клиент передает настоящий заголовок Authorization, время CPU считается отдельно для authenticate()
+    и для всего запроса. Первый запрос каждого профиля не учитывается: он заполняет кэш проверок.
+"""
+import base64
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from rest_framework.authentication import BasicAuthentication, TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from poll import authentication
+from questionnaire import views
+from questionnaire.benchmark.generator import PASSWORD, USERNAME, Generator
+from questionnaire.benchmark.runner import percentile
+from questionnaire.models import Option
+
+PROFILES = (
+    ('basic', BasicAuthentication),
+    ('cached_basic', authentication.CachedBasicAuthentication),
+    ('token', TokenAuthentication),
+)
+
+
+def _timed(cls, timings):
+    authenticate = cls.authenticate
+
+    def wrapper(self, request):
+        started = time.process_time()
+        try:
+            return authenticate(self, request)
+        finally:
+            timings.append(time.process_time() - started)
+    return wrapper
+
+
+def run_profile(cls, url, header, iterations):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=header)
+    auth_timings = []
+    request_timings = []
+    authentication.credentials.clear()
+    with mock.patch.object(views.OptionViewSet, 'authentication_classes', [cls]), \
+            mock.patch.object(cls, 'authenticate', _timed(cls, auth_timings)):
+        for i in range(iterations + 1):
+            started = time.process_time()
+            response = client.get(url)
+            request_timings.append(time.process_time() - started)
+            if response.status_code != 200:
+                raise AssertionError('{0}: {1} {2}'.format(cls.__name__, response.status_code, response.content))
+    auth_timings, request_timings = auth_timings[1:], request_timings[1:]
+    return {
+        'auth_cpu_ms': sum(auth_timings) / len(auth_timings) * 1000,
+        'auth_p99_ms': percentile(auth_timings, 99) * 1000,
+        'request_cpu_ms': sum(request_timings) / len(request_timings) * 1000,
+        'request_p99_ms': percentile(request_timings, 99) * 1000,
+    }
+
+
+def run(iterations=100, profiles=None, log=None, **generator_options):
+    """
+        Сгенерировать данные в текущей базе и прогнать профили. Возвращает отчет для сохранения в JSON
+    """
+    log = log or (lambda message: None)
+    counts = Generator(log=log, **generator_options).generate()
+    user = User.objects.filter(username__startswith=USERNAME.format('')).order_by('pk').first()
+    token = Token.objects.get_or_create(user=user)[0]
+    url = '/api/v1/options/{0}/'.format(Option.objects.order_by('pk').first().pk)
+    headers = {
+        'basic': 'Basic ' + base64.b64encode('{0}:{1}'.format(user.username, PASSWORD).encode()).decode(),
+        'token': 'Token ' + token.key,
+    }
+
+    report = {'meta': {'iterations': iterations, 'data': counts}, 'profiles': {}}
+    for name, cls in PROFILES:
+        if profiles and name not in profiles:
+            continue
+        log('Running {0}'.format(name))
+        header = headers['token'] if name == 'token' else headers['basic']
+        report['profiles'][name] = run_profile(cls, url, header, iterations)
+    return report
@@ -0,0 +1,165 @@
+"""
+    Нагрузочный прогон чтения: синхронное приложение poll/wsgi.py против асинхронного poll/asgi.py
+    при сотнях одновременных клиентов в одном процессе.
+
+    Клиенты - корутины, каждая отправляет следующий запрос после ответа на предыдущий. WSGI обслуживается
+    пулом из workers потоков, как потоковый сервер (gunicorn --threads), ASGI вызывается напрямую
+    в цикле событий. Время ответа включает ожидание в очереди сервера.
+"""
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import Client
+
+from questionnaire.benchmark.generator import USERNAME, Generator
+from questionnaire.benchmark.runner import percentile
+from questionnaire.models import *
+
+# Имя, адрес в WSGI приложении, адрес в ASGI приложении
+ENDPOINTS = (
+    ('active', '/api/v1/questionnaires/active/', '/api/v1/async/questionnaires/active/'),
+    ('retrieve', '/api/v1/questionnaires/{questionnaire}/', '/api/v1/async/questionnaires/{questionnaire}/'),
+    ('answers', '/api/v1/answers/', '/api/v1/async/answers/'),
+)
+
+HOST = 'testserver'
+
+
+def call_wsgi(application, url, headers):
+    path, _, query = url.partition('?')
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+        'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': BytesIO(), 'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    for name, value in headers:
+        environ['HTTP_' + name.upper().replace('-', '_')] = value
+    statuses = []
+
+    def start_response(status, response_headers, exc_info=None):
+        statuses.append(int(status.split(' ', 1)[0]))
+
+    result = application(environ, start_response)
+    try:
+        for chunk in result:
+            pass
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return statuses[0]
+
+
+async def call_asgi(application, url, headers):
+    path, _, query = url.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        'client': ('127.0.0.1', 0), 'server': (HOST, 80),
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    return messages[0]['status']
+
+
+async def drive(call, urls, clients, requests):
+    """
+        clients корутин выполняют requests запросов по кругу urls
+    """
+    timings = []
+    statuses = {}
+    numbers = iter(range(requests))
+
+    async def client():
+        for i in numbers:
+            started = time.perf_counter()
+            try:
+                status = await call(urls[i % len(urls)])
+            except Exception:
+                status = 'error'
+            timings.append(time.perf_counter() - started)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for i in range(clients)))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': requests,
+        'clients': clients,
+        'statuses': statuses,
+        'rps': requests / elapsed,
+        'p50_ms': percentile(timings, 50) * 1000,
+        'p95_ms': percentile(timings, 95) * 1000,
+        'p99_ms': percentile(timings, 99) * 1000,
+    }
+
+
+def run_wsgi(application, urls, headers, clients, requests, workers):
+    executor = ThreadPoolExecutor(max_workers=workers)
+
+    async def call(url):
+        return await asyncio.get_event_loop().run_in_executor(executor, call_wsgi, application, url, headers)
+
+    try:
+        return asyncio.run(drive(call, urls, clients, requests))
+    finally:
+        executor.shutdown()
+
+
+def run_asgi(application, urls, headers, clients, requests):
+    async def call(url):
+        return await call_asgi(application, url, headers)
+
+    return asyncio.run(drive(call, urls, clients, requests))
+
+
+def session_headers(user):
+    client = Client()
+    client.force_login(user)
+    return [('Host', HOST), ('Cookie', '{0}={1}'.format(settings.SESSION_COOKIE_NAME,
+                                                        client.cookies[settings.SESSION_COOKIE_NAME].value))]
+
+
+def run(endpoints=None, clients=500, requests=5000, workers=16, threads=None, log=None, **generator_options):
+    """
+        Сгенерировать данные в текущей базе и прогнать эндпоинты через оба приложения
+    """
+    from poll import asgi, wsgi
+    from questionnaire.asgi import AsyncReadApplication
+
+    log = log or (lambda message: None)
+    counts = Generator(log=log, **generator_options).generate()
+    respondent = User.objects.filter(username__startswith=USERNAME.format('')).order_by('pk').first()
+    headers = session_headers(respondent)
+    pks = {'questionnaire': AnswerQuestionnaire.objects.filter(user=respondent).order_by('pk').first().questionnaire_id}
+    threads = threads or settings.ASYNC_READ_THREADS
+
+    report = {'meta': {'clients': clients, 'requests': requests, 'wsgi_workers': workers, 'asgi_threads': threads,
+                       'data': counts},
+              'endpoints': {}}
+    for name, wsgi_url, asgi_url in ENDPOINTS:
+        if endpoints and name not in endpoints:
+            continue
+        log('Running {0}'.format(name))
+        application = AsyncReadApplication(asgi.django_application, threads=threads)
+        try:
+            report['endpoints'][name] = {
+                'wsgi': run_wsgi(wsgi.application, [wsgi_url.format(**pks)], headers, clients, requests, workers),
+                'asgi': run_asgi(application, [asgi_url.format(**pks)], headers, clients, requests),
+            }
+        finally:
+            application.executor.shutdown()
+    return report
@@ -0,0 +1,137 @@
+"""
+    Детерминированный генератор данных для замеров: N анкет x M вопросов x K вариантов x R респондентов.
+
+    Строки вставляются bulk_create с заранее назначенными pk, что бы не перечитывать их после вставки.
+"""
+import datetime
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from questionnaire import results
+from questionnaire.models import *
+
+USERNAME = 'bench_user_{0}'
+PASSWORD = 'bench_password'
+
+
+def _next_pk(model):
+    return (model.objects.aggregate(Max('pk'))['pk__max'] or 0) + 1
+
+
+class Generator(object):
+    def __init__(self, questionnaires=10, questions=10, options=4, respondents=100, seed=0, batch_size=5000,
+                 log=None):
+        self.questionnaires = questionnaires
+        self.questions = questions
+        self.options = options
+        self.respondents = respondents
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.pending = {}
+
+    def _add(self, obj):
+        model = type(obj)
+        batch = self.pending.setdefault(model, [])
+        batch.append(obj)
+        if len(batch) >= self.batch_size:
+            self._flush(model)
+
+    def _flush(self, model=None):
+        # Порядок сброса соответствует внешним ключам
+        for item in (AnswerQuestionnaire, AnswerQuestion, AnswerOption):
+            batch = self.pending.get(item)
+            if batch:
+                item.objects.bulk_create(batch)
+                self.pending[item] = []
+            if item is model:
+                break
+
+    def generate(self):
+        """
+            Создать данные и вернуть словарь с количеством созданных строк
+        """
+        with transaction.atomic():
+            counts = self._generate()
+            self._flush()
+            # Явно заданные pk не двигают последовательности PostgreSQL
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), [User, Questionnaire, Question, Option,
+                                                                          AnswerQuestionnaire, AnswerQuestion,
+                                                                          AnswerOption]):
+                    cursor.execute(sql)
+            results.rebuild()
+        return counts
+
+    def _generate(self):
+        password = make_password(PASSWORD)
+        user_pk = _next_pk(User)
+        users = [User(pk=user_pk + i, username=USERNAME.format(user_pk + i), password=password)
+                 for i in range(self.respondents)]
+        User.objects.bulk_create(users)
+
+        questionnaire_pk, question_pk, option_pk = _next_pk(Questionnaire), _next_pk(Question), _next_pk(Option)
+        date_end = datetime.date.today() + datetime.timedelta(days=365)
+        questionnaires = []
+        questions = []
+        options = []
+        for i in range(self.questionnaires):
+            questionnaire = Questionnaire(pk=questionnaire_pk + i, name='Анкета {0}'.format(questionnaire_pk + i),
+                                          date_end=date_end)
+            questionnaire.bench_questions = []
+            questionnaires.append(questionnaire)
+            for j in range(self.questions):
+                question_type = QT_TEXT if j % 10 == 9 else QT_MULTI_CHOICES if j % 3 == 2 else QT_CHOICES
+                question = Question(pk=question_pk, questionnaire=questionnaire, question_type=question_type,
+                                    name='Вопрос {0}'.format(question_pk))
+                question_pk += 1
+                question.bench_options = []
+                questionnaire.bench_questions.append(question)
+                questions.append(question)
+                if question_type == QT_TEXT:
+                    continue
+                for k in range(self.options):
+                    option = Option(pk=option_pk, question=question, option='Вариант {0}'.format(k))
+                    option_pk += 1
+                    question.bench_options.append(option)
+                    options.append(option)
+        Questionnaire.objects.bulk_create(questionnaires)
+        Question.objects.bulk_create(questions)
+        Option.objects.bulk_create(options)
+
+        answer_pk, answer_question_pk, answer_option_pk = (_next_pk(AnswerQuestionnaire), _next_pk(AnswerQuestion),
+                                                           _next_pk(AnswerOption))
+        counts = {'users': len(users), 'questionnaires': len(questionnaires), 'questions': len(questions),
+                  'options': len(options), 'answers': 0, 'answer_questions': 0, 'answer_options': 0}
+        for questionnaire in questionnaires:
+            for user in users:
+                self._add(AnswerQuestionnaire(pk=answer_pk, questionnaire_id=questionnaire.pk, user_id=user.pk))
+                for question in questionnaire.bench_questions:
+                    text = None
+                    chosen = []
+                    if question.question_type == QT_TEXT:
+                        text = 'Ответ {0}'.format(self.random.randrange(1000))
+                    elif question.question_type == QT_CHOICES:
+                        chosen = [self.random.choice(question.bench_options)]
+                    else:
+                        chosen = self.random.sample(question.bench_options,
+                                                    self.random.randint(1, len(question.bench_options)))
+                    self._add(AnswerQuestion(pk=answer_question_pk, answer_questionnaire_id=answer_pk,
+                                             question_id=question.pk, question_type=question.question_type,
+                                             text=text, user_id=user.pk, questionnaire_id=questionnaire.pk))
+                    for option in chosen:
+                        self._add(AnswerOption(pk=answer_option_pk, answer_question_id=answer_question_pk,
+                                               option_id=option.pk, user_id=user.pk,
+                                               questionnaire_id=questionnaire.pk))
+                        answer_option_pk += 1
+                        counts['answer_options'] += 1
+                    answer_question_pk += 1
+                    counts['answer_questions'] += 1
+                answer_pk += 1
+                counts['answers'] += 1
+            self.log('Questionnaire {0}: {1} answer options so far'.format(questionnaire.pk, counts['answer_options']))
+        return counts
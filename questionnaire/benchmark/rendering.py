@@ -0,0 +1,70 @@
+"""
+    Замер рендеринга и сжатия больших ответов: время CPU на рендер JSONRenderer DRF и FastJSONRenderer
+    (с orjson и на стандартном json) и размер ответа без сжатия, в gzip и в brotli.
+
+    Данные ответов берутся из настоящих запросов к API v1, рендер и сжатие повторяются iterations раз.
+"""
+import time
+from unittest import mock
+
+from rest_framework.renderers import JSONRenderer
+
+from poll import compression
+from questionnaire import renderers
+from questionnaire.benchmark.generator import Generator
+from questionnaire.benchmark.runner import Environment
+
+# Имя, адрес, пользователь
+PAYLOADS = (
+    ('questionnaire', '/api/v1/questionnaires/{questionnaire}/', 'user'),
+    ('answer', '/api/v1/answers/{answer}/', 'user'),
+    ('answers_page', '/api/v1/answers/?page_size=100', 'admin'),
+    ('results', '/api/v1/questionnaires/{questionnaire}/results/', 'admin'),
+)
+
+
+def _cpu_ms(func, iterations):
+    started = time.process_time()
+    for i in range(iterations):
+        result = func()
+    return (time.process_time() - started) / iterations * 1000, result
+
+
+def _renderers():
+    yield 'drf', JSONRenderer()
+    if renderers.orjson is not None:
+        yield 'orjson', renderers.FastJSONRenderer()
+    with mock.patch.object(renderers, 'orjson', None):
+        yield 'stdlib', renderers.FastJSONRenderer()
+
+
+def measure(data, iterations):
+    result = {'render': {}, 'wire': {}}
+    content = None
+    for name, renderer in _renderers():
+        cpu_ms, content = _cpu_ms(lambda: renderer.render(data), iterations)
+        result['render'][name] = {'cpu_ms': cpu_ms, 'bytes': len(content)}
+
+    result['wire']['identity'] = {'bytes': len(content), 'cpu_ms': 0.0}
+    encodings = ('gzip', 'br') if compression.brotli is not None else ('gzip',)
+    for encoding in encodings:
+        cpu_ms, compressed = _cpu_ms(lambda: compression.compress(encoding, content), iterations)
+        result['wire'][encoding] = {'bytes': len(compressed), 'cpu_ms': cpu_ms}
+    return result
+
+
+def run(iterations=50, log=None, **generator_options):
+    """
+        Сгенерировать данные в текущей базе и замерить ответы. Возвращает отчет для сохранения в JSON
+    """
+    log = log or (lambda message: None)
+    counts = Generator(log=log, **generator_options).generate()
+    env = Environment()
+    report = {'meta': {'iterations': iterations, 'data': counts, 'orjson': renderers.orjson is not None,
+                       'brotli': compression.brotli is not None},
+              'payloads': {}}
+    for name, url, actor in PAYLOADS:
+        log('Measuring {0}'.format(name))
+        response = env.clients[actor].get(url.format(**env.pks))
+        report['payloads'][name] = measure(response.data, iterations)
+    return report
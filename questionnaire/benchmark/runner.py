@@ -0,0 +1,174 @@
+"""
+    Прогон сценариев через тестовый клиент DRF в одном процессе.
+
+    Для каждого сценария считаются p50/p95/p99 времени ответа, число SQL запросов на запрос
+    и пик выделенной памяти на запрос (tracemalloc). Память и запросы замеряются отдельным
+    проходом, что бы трассировка не искажала время.
+"""
+import datetime
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from questionnaire.benchmark.generator import USERNAME, Generator
+from questionnaire.models import *
+
+
+def percentile(values, percent):
+    """
+        Перцентиль по ближайшему рангу
+    """
+    values = sorted(values)
+    if not values:
+        return None
+    rank = max(1, int(round(percent / 100.0 * len(values) + 0.5)))
+    return values[min(rank, len(values)) - 1]
+
+
+class Environment(object):
+    """
+        Данные для сценариев: клиенты под респондентом и администратором и pk объектов
+    """
+
+    def __init__(self):
+        respondent = User.objects.filter(username__startswith=USERNAME.format('')).order_by('pk').first()
+        answer = AnswerQuestionnaire.objects.filter(user=respondent).order_by('pk').first()
+        text_answer_question = AnswerQuestion.objects.filter(answer_questionnaire=answer, question_type=QT_TEXT).first()
+        choice_answer_question = (AnswerQuestion.objects.filter(answer_questionnaire=answer)
+                                  .exclude(question_type=QT_TEXT).order_by('pk').first())
+        self.pks = {
+            'questionnaire': answer.questionnaire_id,
+            'question': choice_answer_question.question_id,
+            'option': Option.objects.filter(question=choice_answer_question.question_id).first().pk,
+            'answer': answer.pk,
+            'text_answer_question': text_answer_question.pk if text_answer_question else choice_answer_question.pk,
+            'choice_answer_question': choice_answer_question.pk,
+            'choice_option': Option.objects.filter(question=choice_answer_question.question_id).first().pk,
+            'answer_option': AnswerOption.objects.filter(user=respondent).order_by('pk').first().pk,
+        }
+        self.clients = {'user': APIClient(), 'admin': APIClient()}
+        self.clients['user'].force_authenticate(respondent)
+        self.clients['admin'].force_authenticate(User.objects.filter(is_staff=True).order_by('pk').first())
+
+
+class ScenarioError(Exception):
+    pass
+
+
+def _call(env, scenario, i):
+    """
+        Запрос сценария. Исключение прерывает прогон: время упавшего запроса не должно попасть в отчет
+    """
+    method, url, data = scenario.request(env, i)
+    client = env.clients[scenario.actor]
+    try:
+        response = getattr(client, method)(url, data, format='json') if data is not None else getattr(client, method)(url)
+        if response.streaming:
+            for chunk in response.streaming_content:
+                pass
+    except Exception as e:
+        raise ScenarioError('{0}: {1} {2} failed: {3}: {4}'.format(scenario.name, method.upper(), url,
+                                                                   type(e).__name__, e)) from e
+    return response, response.status_code
+
+
+def run_scenario(env, scenario, iterations, warmup=5):
+    scenario.prepare(env)
+    for i in range(warmup):
+        scenario.before(env, i)
+        response, status = _call(env, scenario, i)
+        scenario.after(env, i, response)
+
+    timings = []
+    statuses = {}
+    for i in range(iterations):
+        scenario.before(env, i)
+        started = time.perf_counter()
+        response, status = _call(env, scenario, i)
+        timings.append(time.perf_counter() - started)
+        scenario.after(env, i, response)
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    queries = []
+    peaks = []
+    for i in range(max(1, iterations // 10)):
+        scenario.before(env, i)
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as context:
+                response, status = _call(env, scenario, i)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+        queries.append(len(context.captured_queries))
+        scenario.after(env, i, response)
+
+    return {
+        'iterations': iterations,
+        'statuses': statuses,
+        'p50_ms': percentile(timings, 50) * 1000,
+        'p95_ms': percentile(timings, 95) * 1000,
+        'p99_ms': percentile(timings, 99) * 1000,
+        'queries_per_request': sum(queries) / float(len(queries)),
+        'peak_alloc_kb_per_request': sum(peaks) / float(len(peaks)) / 1024,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scenarios, iterations=200, log=None, **generator_options):
+    """
+        Сгенерировать данные в текущей базе и прогнать сценарии. Возвращает отчет для сохранения в JSON
+    """
+    log = log or (lambda message: None)
+    counts = Generator(log=log, **generator_options).generate()
+    env = Environment()
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'created_at': datetime.datetime.utcnow().isoformat() + 'Z',
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': iterations,
+            'data': counts,
+        },
+        'scenarios': {},
+    }
+    for scenario in scenarios:
+        log('Running {0}'.format(scenario.name))
+        report['scenarios'][scenario.name] = run_scenario(env, scenario, iterations)
+    return report
+
+
+def compare(baseline, report):
+    """
+        Строки сравнения с прошлым отчетом: отношение p50/p95 и разница в числе запросов
+    """
+    lines = []
+    for name, current in sorted(report['scenarios'].items()):
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        lines.append('{0:32} p50 x{1:.2f}  p95 x{2:.2f}  queries {3:+.1f}'.format(
+            name, current['p50_ms'] / previous['p50_ms'], current['p95_ms'] / previous['p95_ms'],
+            current['queries_per_request'] - previous['queries_per_request']))
+    return lines
+
+
+def save(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
@@ -0,0 +1,133 @@
+"""
+    Сценарии замеров. Каждый сценарий описывает один вид запроса к API v1:
+    prepare вызывается один раз, request возвращает (метод, url, данные) для i-й итерации,
+    before и after выполняются вне замера.
+"""
+from django.core.cache import cache
+
+from questionnaire.models import *
+
+
+class Scenario(object):
+    name = None
+    method = 'get'
+    # Пользователь запроса: 'user' - респондент, 'admin' - администратор
+    actor = 'user'
+
+    def prepare(self, env):
+        pass
+
+    def before(self, env, i):
+        pass
+
+    def request(self, env, i):
+        raise NotImplementedError
+
+    def after(self, env, i, response):
+        pass
+
+
+class Get(Scenario):
+    def __init__(self, name, url, actor='user'):
+        self.name = name
+        self.url = url
+        self.actor = actor
+
+    def request(self, env, i):
+        return 'get', self.url.format(**env.pks), None
+
+
+class RetrieveCold(Get):
+    """
+        Определение анкеты без кэша: сериализация каждый раз заново
+    """
+
+    def before(self, env, i):
+        cache.clear()
+
+
+class AnswerStart(Scenario):
+    name = 'answer_start'
+    method = 'post'
+
+    def request(self, env, i):
+        return 'post', '/api/v1/answers/', {'questionnaire': env.pks['questionnaire']}
+
+
+class AnswerSubmit(Scenario):
+    name = 'answer_submit'
+    method = 'post'
+
+    def prepare(self, env):
+        self.answers = []
+        for question in Question.objects.filter(questionnaire=env.pks['questionnaire']).prefetch_related('options'):
+            options = [option.pk for option in question.options.all()]
+            if question.question_type == QT_TEXT:
+                self.answers.append({'question': question.pk, 'text': 'Ответ'})
+            elif question.question_type == QT_CHOICES:
+                self.answers.append({'question': question.pk, 'options': options[:1]})
+            else:
+                self.answers.append({'question': question.pk, 'options': options})
+
+    def request(self, env, i):
+        return 'post', '/api/v1/answers/submit/', {'questionnaire': env.pks['questionnaire'], 'answers': self.answers}
+
+
+class AnswerQuestionUpdate(Scenario):
+    name = 'answer_question_update'
+    method = 'patch'
+
+    def request(self, env, i):
+        return 'patch', '/api/v1/answer_questions/{0}/'.format(env.pks['text_answer_question']), {
+            'text': 'Ответ {0}'.format(i)}
+
+
+class AnswerOptionCreate(Scenario):
+    name = 'answer_option_create'
+    method = 'post'
+
+    def before(self, env, i):
+        AnswerOption.objects.filter(answer_question=env.pks['choice_answer_question']).delete()
+
+    def request(self, env, i):
+        return 'post', '/api/v1/answer_options/', {'answer_question': env.pks['choice_answer_question'],
+                                                   'option': env.pks['choice_option']}
+
+
+class AnswerOptionDestroy(Scenario):
+    name = 'answer_option_destroy'
+    method = 'delete'
+
+    def before(self, env, i):
+        AnswerOption.objects.filter(answer_question=env.pks['choice_answer_question']).delete()
+        self.pk = AnswerOption.objects.create(answer_question_id=env.pks['choice_answer_question'],
+                                              option_id=env.pks['choice_option']).pk
+
+    def request(self, env, i):
+        return 'delete', '/api/v1/answer_options/{0}/'.format(self.pk), None
+
+
+def get_scenarios():
+    return [
+        Get('questionnaire_list', '/api/v1/questionnaires/'),
+        Get('questionnaire_active', '/api/v1/questionnaires/active/'),
+        Get('questionnaire_retrieve', '/api/v1/questionnaires/{questionnaire}/'),
+        RetrieveCold('questionnaire_retrieve_cold', '/api/v1/questionnaires/{questionnaire}/'),
+        Get('questionnaire_results', '/api/v1/questionnaires/{questionnaire}/results/', actor='admin'),
+        Get('questionnaire_export', '/api/v1/questionnaires/{questionnaire}/export/?format=csv', actor='admin'),
+        Get('question_list', '/api/v1/questions/'),
+        Get('question_retrieve', '/api/v1/questions/{question}/'),
+        Get('option_list', '/api/v1/options/'),
+        Get('option_retrieve', '/api/v1/options/{option}/'),
+        Get('answer_list', '/api/v1/answers/'),
+        Get('answer_retrieve', '/api/v1/answers/{answer}/'),
+        AnswerStart(),
+        AnswerSubmit(),
+        Get('answer_question_list', '/api/v1/answer_questions/'),
+        Get('answer_question_retrieve', '/api/v1/answer_questions/{choice_answer_question}/'),
+        AnswerQuestionUpdate(),
+        Get('answer_option_list', '/api/v1/answer_options/'),
+        Get('answer_option_retrieve', '/api/v1/answer_options/{answer_option}/'),
+        AnswerOptionCreate(),
+        AnswerOptionDestroy(),
+    ]
@@ -0,0 +1,79 @@
+"""
+    Замер хранения сессий на пути респондента с SessionAuthentication: список активных анкет,
+    анкета, свои прохождения, начало прохождения и ответ на вопрос.
+
+    Для каждого режима poll/sessions.py клиент входит через логин (cookie сессии), затем путь
+    проходится iterations раз. Считаются время запроса, SQL запросы и запросы к django_session.
+    Замер идет в одном процессе, поэтому cached_db здесь допустим и с кэшем sessions в памяти процесса.
+"""
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from poll import sessions
+from questionnaire.benchmark.generator import PASSWORD, USERNAME, Generator
+from questionnaire.benchmark.runner import percentile
+from questionnaire.models import *
+
+MODES = ('db', 'cached_db', 'signed_cookies')
+
+
+def _flow(client, questionnaire, question):
+    yield client.get('/api/v1/questionnaires/active/')
+    yield client.get('/api/v1/questionnaires/{0}/'.format(questionnaire.pk))
+    yield client.get('/api/v1/answers/')
+    response = client.post('/api/v1/answers/', {'questionnaire': questionnaire.pk}, format='json')
+    yield response
+    yield client.post('/api/v1/answers/{0}/answer/'.format(response.data['pk']),
+                      {'question': question.pk, 'text': 'Ответ'}, format='json')
+
+
+def run_mode(mode, user, questionnaire, question, iterations):
+    with override_settings(SESSION_ENGINE=sessions.get_engine(mode)):
+        caches['sessions'].clear()
+        client = APIClient()
+        if not client.login(username=user.username, password=PASSWORD):
+            raise AssertionError('Login failed')
+        timings = []
+        queries = 0
+        session_queries = 0
+        for i in range(iterations):
+            flow = _flow(client, questionnaire, question)
+            while True:
+                with CaptureQueriesContext(connection) as context:
+                    started = time.perf_counter()
+                    response = next(flow, None)
+                    elapsed = time.perf_counter() - started
+                if response is None:
+                    break
+                if response.status_code >= 400:
+                    raise AssertionError('{0}: {1} {2}'.format(mode, response.status_code, response.content))
+                timings.append(elapsed)
+                queries += len(context.captured_queries)
+                session_queries += sum('django_session' in query['sql'] for query in context.captured_queries)
+    return {
+        'requests': len(timings),
+        'p50_ms': percentile(timings, 50) * 1000,
+        'p95_ms': percentile(timings, 95) * 1000,
+        'queries_per_request': queries / len(timings),
+        'session_queries_per_request': session_queries / len(timings),
+    }
+
+
+def run(iterations=50, modes=MODES, log=None, **generator_options):
+    """
+        Сгенерировать данные в текущей базе и прогнать режимы. Возвращает отчет для сохранения в JSON
+    """
+    log = log or (lambda message: None)
+    counts = Generator(log=log, **generator_options).generate()
+    user = User.objects.filter(username__startswith=USERNAME.format('')).order_by('pk').first()
+    question = Question.objects.filter(question_type=QT_TEXT).order_by('pk').first()
+    report = {'meta': {'iterations': iterations, 'data': counts}, 'modes': {}}
+    for mode in modes:
+        log('Running {0}'.format(mode))
+        report['modes'][mode] = run_mode(mode, user, question.questionnaire, question, iterations)
+    return report
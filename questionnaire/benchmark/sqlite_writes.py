@@ -0,0 +1,140 @@
+"""
+    Нагрузочный прогон записи ответов в файл SQLite из нескольких процессов.
+
+    Каждый профиль получает свою копию базы: настройки SQLite по умолчанию без повторов записи
+    и профиль из SQLITE_PRAGMAS с retry_on_locked. Процессы стартуют одновременно и по кругу
+    удаляют и снова добавляют вариант в своем ответе (AnswerOptionViewSet) и меняют текст ответа
+    (AnswerQuestionViewSet.update). Ошибки "database is locked" считаются отдельно.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+PROFILES = ('default', 'tuned')
+
+
+def _setup(path):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'poll.settings')
+    import django
+    django.setup()
+    from django.conf import settings
+    settings.ALLOWED_HOSTS = ['testserver']
+    settings.DEBUG = False
+    settings.METRICS_ENABLED = False
+
+
+def _apply_profile(profile):
+    from django.conf import settings
+    if profile == 'default':
+        settings.SQLITE_PRAGMAS = None
+        settings.SQLITE_WRITE_RETRIES = 0
+
+
+def _prepare(path, profile, generator_options):
+    _setup(path)
+    _apply_profile(profile)
+    from django.core.management import call_command
+    from questionnaire.benchmark.generator import Generator
+    call_command('migrate', verbosity=0)
+    return Generator(**generator_options).generate()
+
+
+def _worker(path, profile, number, requests, barrier, results):
+    _setup(path)
+    _apply_profile(profile)
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from rest_framework.test import APIClient
+
+    from questionnaire.benchmark.generator import USERNAME
+    from questionnaire.models import AnswerOption, AnswerQuestion, QT_TEXT
+
+    user = User.objects.filter(username__startswith=USERNAME.format('')).order_by('pk')[number]
+    client = APIClient()
+    client.force_authenticate(user)
+    answer_option = AnswerOption.objects.filter(user=user).order_by('pk').first()
+    text_answer_question = (AnswerQuestion.objects.filter(user=user, question_type=QT_TEXT).order_by('pk').first()
+                            or answer_option.answer_question)
+    connection.close()
+
+    timings = []
+    statuses = {}
+    barrier.wait()
+    started = time.perf_counter()
+    for i in range(requests):
+        request_started = time.perf_counter()
+        try:
+            if i % 3 == 0:
+                response = client.delete('/api/v1/answer_options/{0}/'.format(answer_option.pk))
+            elif i % 3 == 1:
+                response = client.post('/api/v1/answer_options/', {'answer_question': answer_option.answer_question_id,
+                                                                   'option': answer_option.option_id}, format='json')
+                if response.status_code == 201:
+                    answer_option.pk = response.data['pk']
+            else:
+                response = client.patch('/api/v1/answer_questions/{0}/'.format(text_answer_question.pk),
+                                        {'text': 'Ответ {0}'.format(i)}, format='json')
+            status = str(response.status_code)
+        except Exception as e:
+            status = 'locked' if 'locked' in str(e) else 'error'
+        timings.append(time.perf_counter() - request_started)
+        statuses[status] = statuses.get(status, 0) + 1
+    results.put({'timings': timings, 'statuses': statuses, 'elapsed': time.perf_counter() - started})
+
+
+def run_profile(profile, processes=4, requests=200, log=None, **generator_options):
+    # Модуль импортируется в новых процессах до django.setup(), модели в нем загружать нельзя
+    from questionnaire.benchmark.runner import percentile
+
+    log = log or (lambda message: None)
+    directory = tempfile.mkdtemp(prefix='poll_sqlite_')
+    path = os.path.join(directory, 'db.sqlite3')
+    # Отдельные процессы: настройки Django и соединения не наследуются от текущего
+    context = multiprocessing.get_context('spawn')
+    try:
+        log('Preparing {0}'.format(profile))
+        with context.Pool(1) as pool:
+            counts = pool.apply(_prepare, (path, profile, dict(generator_options, respondents=max(
+                processes, generator_options.get('respondents', 0)))))
+        log('Running {0}'.format(profile))
+        barrier = context.Barrier(processes)
+        results = context.Queue()
+        workers = [context.Process(target=_worker, args=(path, profile, i, requests, barrier, results))
+                   for i in range(processes)]
+        for worker in workers:
+            worker.start()
+        reports = [results.get() for worker in workers]
+        for worker in workers:
+            worker.join()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    timings = [timing for report in reports for timing in report['timings']]
+    statuses = {}
+    for report in reports:
+        for status, count in report['statuses'].items():
+            statuses[status] = statuses.get(status, 0) + count
+    return {
+        'processes': processes,
+        'requests': len(timings),
+        'statuses': statuses,
+        'errors': sum(count for status, count in statuses.items() if not status.startswith('2')),
+        'rps': len(timings) / max(report['elapsed'] for report in reports),
+        'p50_ms': percentile(timings, 50) * 1000,
+        'p95_ms': percentile(timings, 95) * 1000,
+        'p99_ms': percentile(timings, 99) * 1000,
+        'data': counts,
+    }
+
+
+def run(profiles=PROFILES, processes=4, requests=200, log=None, **generator_options):
+    """
+        Прогнать профили и вернуть отчет для сохранения в JSON
+    """
+    report = {'meta': {'processes': processes, 'requests_per_process': requests}, 'profiles': {}}
+    for profile in profiles:
+        report['profiles'][profile] = run_profile(profile, processes, requests, log, **generator_options)
+    return report
@@ -0,0 +1,104 @@
+"""
+    Кэш определений анкет (анкета + вопросы + варианты в сериализованном виде)
+    и метаданных для проверки ответов.
+
+    Ключ содержит pk и номер версии. Версия меняется сигналами при любом изменении анкеты,
+    вопроса или варианта, старые записи просто перестают читаться и вытесняются по таймауту.
+    Версия тоже живет QUESTIONNAIRE_CACHE_TIMEOUT и создается только для существующей анкеты:
+    перебор pk не заполняет кэш ключами.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from poll import db
+from questionnaire.models import Questionnaire
+
+
+def get_cache():
+    return caches[getattr(settings, 'QUESTIONNAIRE_CACHE', 'default')]
+
+
+def _version_key(pk):
+    return 'questionnaire:{0}:version'.format(pk)
+
+
+def _timeout():
+    return getattr(settings, 'QUESTIONNAIRE_CACHE_TIMEOUT', 3600)
+
+
+def _new_version():
+    # Версия после вытеснения из кэша не должна совпасть ни с одной из прежних
+    return int(time.time() * 1000000)
+
+
+def get_version(pk, create=True):
+    """
+        Текущая версия анкеты. Без версии в кэше create=False возвращает None, иначе версия создается,
+        если анкета есть в базе
+    """
+    cache = get_cache()
+    version = cache.get(_version_key(pk))
+    if version is None and create:
+        with db.use_replica(False):
+            if not Questionnaire.objects.filter(pk=pk, deleted_at__isnull=True).exists():
+                return None
+        cache.add(_version_key(pk), _new_version(), _timeout())
+        version = cache.get(_version_key(pk))
+    return version
+
+
+def _bump(pk):
+    cache = get_cache()
+    try:
+        cache.incr(_version_key(pk))
+    except ValueError:
+        cache.set(_version_key(pk), _new_version(), _timeout())
+
+
+def invalidate(pk):
+    """
+        Сбросить определение анкеты. Версия меняется сразу и еще раз после коммита,
+        чтобы параллельный запрос не закэшировал данные, прочитанные до коммита
+    """
+    _bump(pk)
+    transaction.on_commit(lambda: _bump(pk))
+
+
+def get_etag(pk, version):
+    return '"{0}-{1}"'.format(pk, version)
+
+
+def _get(key, build):
+    cache = get_cache()
+    data = cache.get(key)
+    if data is None:
+        # Отставшая реплика не должна попасть в кэш под новой версией
+        with db.use_replica(False):
+            data = build()
+        cache.set(key, data, _timeout())
+    return data
+
+
+def get_definition(pk, build):
+    """
+        Определение анкеты из кэша или построенное build(). Возвращает (data, etag),
+        для анкеты, которой нет, - результат build() без кэша и etag None
+    """
+    version = get_version(pk)
+    if version is None:
+        return build(), None
+    return _get('questionnaire:{0}:{1}'.format(pk, version), build), get_etag(pk, version)
+
+
+def get_metadata(pk, build):
+    """
+        Вопросы и варианты анкеты для проверки ответов из кэша или построенные build().
+        Сбрасываются вместе с определением
+    """
+    version = get_version(pk)
+    if version is None:
+        return build()
+    return _get('questionnaire:{0}:{1}:metadata'.format(pk, version), build)
@@ -0,0 +1,115 @@
+"""
+    Документы пройденных анкет: answer_questions одной строкой JSON на AnswerQuestionnaire.
+
+    При ANSWER_DOCUMENTS_ENABLED документ переписывается по ответам в базе в той же транзакции, что и сами
+    ответы, а retrieve пройденной анкеты читает его одним запросом по pk вместо ответов и вариантов.
+    Вопросы без ответа добавляются при чтении, как и без документов. Документы, разошедшиеся с ответами
+    (запись в обход API, режим включен на старых данных), находит и переписывает check_answer_documents.
+"""
+import json
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework.generics import get_object_or_404
+
+from questionnaire import readers, serializers
+from questionnaire.models import *
+
+# Ограничение SQLite на число параметров запроса
+CHUNK_SIZE = 500
+
+
+def is_enabled():
+    return getattr(settings, 'ANSWER_DOCUMENTS_ENABLED', False)
+
+
+def build(answer_questionnaire_pks):
+    """
+        answer_questions по ответам в базе: {pk пройденной анкеты: [ответ на вопрос]}
+    """
+    plan = readers.get_plan(serializers.AnswerQuestionSerializer, noparent=True)
+    return plan.load('answer_questionnaire_id', list(answer_questionnaire_pks))
+
+
+def _encode(answer_questions):
+    return json.dumps(answer_questions, ensure_ascii=False, separators=(',', ':'))
+
+
+def _canonical(answer_questions):
+    # Порядок строк без ORDER BY не определен, сравниваются отсортированные ответы
+    return sorted((answer_question['question'], answer_question['pk'], answer_question['text'],
+                   answer_question['question_type'],
+                   sorted(answer_option['option'] for answer_option in answer_question['answer_options']))
+                  for answer_question in answer_questions)
+
+
+def _write(documents):
+    pks = sorted(documents)
+    existing = set(AnswerDocument.objects.filter(pk__in=pks).values_list('pk', flat=True))
+    AnswerDocument.objects.bulk_create([AnswerDocument(answer_questionnaire_id=pk, data=_encode(documents[pk]))
+                                        for pk in pks if pk not in existing])
+    for pk in pks:
+        if pk in existing:
+            AnswerDocument.objects.filter(pk=pk).update(data=_encode(documents[pk]))
+
+
+def save(answer_questionnaire_pks):
+    """
+        Переписать документы пройденных анкет по ответам в базе. Вызывается в транзакции записи ответов
+    """
+    if not is_enabled():
+        return
+    pks = sorted(set(answer_questionnaire_pks))
+    for i in range(0, len(pks), CHUNK_SIZE):
+        _write(build(pks[i:i + CHUNK_SIZE]))
+
+
+def save_questionnaire(questionnaire_id):
+    """
+        Переписать документы всех прохождений анкеты: после каскадного удаления ответов вместе с вопросом
+    """
+    if is_enabled():
+        save(AnswerQuestionnaire.objects.filter(questionnaire=questionnaire_id).values_list('pk', flat=True))
+
+
+def retrieve(queryset, pk):
+    """
+        Пройденная анкета из документа одним запросом. Возвращает (строка, данные),
+        данные None, если документа нет
+    """
+    row = get_object_or_404(readers.rows(queryset, 'document__data'), pk=pk)
+    if row.document__data is None:
+        return row, None
+    data = readers.get_plan(serializers.AnswerQuestionnaireSerializer, noexpand=True).represent([row])[0]
+    data['answer_questions'] = serializers.merge_unanswered(row.questionnaire_id, json.loads(row.document__data))
+    return row, data
+
+
+def check(answer_questionnaires, fix=False):
+    """
+        Сверить документы с ответами в базе. answer_questionnaires - queryset пройденных анкет.
+        Возвращает [(pk, 'missing' или 'drifted')], с fix=True такие документы переписываются
+    """
+    problems = []
+    last_pk = 0
+    while True:
+        pks = list(answer_questionnaires.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)
+                   [:CHUNK_SIZE])
+        if not pks:
+            return problems
+        last_pk = pks[-1]
+        expected = build(pks)
+        stored = dict(AnswerDocument.objects.filter(pk__in=pks).values_list('pk', 'data'))
+        bad = []
+        for pk in pks:
+            if pk not in stored:
+                problems.append((pk, 'missing'))
+            elif _canonical(json.loads(stored[pk])) != _canonical(expected[pk]):
+                problems.append((pk, 'drifted'))
+            else:
+                continue
+            bad.append(pk)
+        if fix and bad:
+            # Ответы могли измениться после сверки, документ строится заново в транзакции записи
+            with transaction.atomic():
+                _write(build(bad))
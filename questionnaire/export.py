@@ -0,0 +1,61 @@
+"""
+    Потоковая выгрузка ответов анкеты.
+
+    Строки читаются через values_list().iterator() порциями, экземпляры моделей не создаются,
+    поэтому расход памяти не зависит от числа ответов. Ответы заархивированных пройденных анкет
+    читаются из архива построчно, см. archive.py.
+"""
+import csv
+import json
+
+from questionnaire import archive
+from questionnaire.models import AnswerQuestion
+
+FIELDS = ('answer', 'user', 'created_at', 'question', 'question_type', 'text', 'option')
+FORMATS = ('csv', 'ndjson')
+CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+CHUNK_SIZE = 2000
+
+
+def iter_rows(questionnaire, chunk_size=CHUNK_SIZE):
+    """
+        Одна строка на вариант ответа, для текстовых вопросов и вопросов без вариантов option пустой
+    """
+    queryset = AnswerQuestion.objects.filter(questionnaire=questionnaire)
+    watermark = archive.get_watermark(questionnaire.pk)
+    if watermark:
+        yield from archive.iter_answers(questionnaire.pk)
+        queryset = queryset.filter(answer_questionnaire__gt=watermark)
+    queryset = (queryset.order_by('answer_questionnaire', 'question', 'answer_options__option')
+                .values_list('answer_questionnaire', 'user', 'answer_questionnaire__created_at',
+                             'question', 'question_type', 'text', 'answer_options__option'))
+    for row in queryset.iterator(chunk_size=chunk_size):
+        yield row[:2] + (row[2].isoformat(),) + row[3:]
+
+
+class Echo(object):
+    """
+        Псевдо-буфер для csv.writer: write возвращает строку, а не копит ее
+    """
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows, header=True):
+    writer = csv.writer(Echo())
+    if header:
+        yield writer.writerow(FIELDS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False) + '\n'
+
+
+def iter_export(questionnaire, export_format):
+    rows = iter_rows(questionnaire)
+    if export_format == 'csv':
+        return iter_csv(rows)
+    return iter_ndjson(rows)
@@ -0,0 +1,257 @@
+"""
+    Очередь записи пройденных анкет (write-behind).
+
+    Отправка проверяется по кэшу вопросов анкеты и добавляется одной вставкой в отдельный файл SQLite
+    в режиме WAL (ANSWER_QUEUE_PATH), основная база при этом не блокируется. Обработчик flush_answer_queue
+    переносит отправки в AnswerQuestionnaire/AnswerQuestion/AnswerOption пачками.
+
+    Доставка не меньше одного раза: отправка отмечается обработанной после коммита в основной базе.
+    Если отметка не успела записаться, при повторе анкета находится по (user, submission_key)
+    и второй раз не создается. Обработчик должен быть один.
+
+    Если запись пачки не удалась, отправки записываются по одной, и отклоняется только та, на которой
+    запись падает, иначе одна плохая отправка останавливала бы всю очередь. Ошибки соединения с базой
+    (OperationalError, InterfaceError) отправку не отклоняют: она остается в очереди до следующего запуска.
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import InterfaceError, OperationalError
+
+from questionnaire.models import *
+from questionnaire.serializers import AnswerSubmitSerializer
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS submission (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    submission_key TEXT NOT NULL,
+    questionnaire_id INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    enqueued_at REAL NOT NULL,
+    flushed_at REAL,
+    answer_id INTEGER,
+    error TEXT,
+    UNIQUE (user_id, submission_key)
+);
+CREATE INDEX IF NOT EXISTS submission_status_idx ON submission (status, id);
+'''
+
+Submission = namedtuple('Submission', ['id', 'user_id', 'submission_key', 'questionnaire_id', 'payload', 'status',
+                                       'enqueued_at', 'flushed_at', 'answer_id', 'error'])
+
+COLUMNS = ', '.join(Submission._fields)
+
+
+class AnswerQueue(object):
+    """
+        Очередь в файле SQLite. Соединение свое у каждого потока
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    @property
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            # Отправка на диске до ответа клиенту
+            connection.execute('PRAGMA synchronous=FULL')
+            connection.executescript(SCHEMA)
+            self.local.connection = connection
+        return connection
+
+    def _submission(self, row):
+        if row is None:
+            return None
+        row = list(row)
+        row[4] = json.loads(row[4])
+        return Submission(*row)
+
+    def get(self, user_id, submission_key):
+        return self._submission(self.connection.execute(
+            'SELECT {0} FROM submission WHERE user_id = ? AND submission_key = ?'.format(COLUMNS),
+            (user_id, submission_key)).fetchone())
+
+    def enqueue(self, user_id, submission_key, payload):
+        """
+            Добавить отправку. Возвращает (submission, created), повтор ключа возвращает прежнюю отправку
+        """
+        cursor = self.connection.execute(
+            'INSERT OR IGNORE INTO submission (user_id, submission_key, questionnaire_id, payload, enqueued_at) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (user_id, submission_key, payload['questionnaire'], json.dumps(payload, sort_keys=True), time.time()))
+        return self.get(user_id, submission_key), cursor.rowcount == 1
+
+    def pending(self, limit):
+        return [self._submission(row) for row in self.connection.execute(
+            'SELECT {0} FROM submission WHERE status = ? ORDER BY id LIMIT ?'.format(COLUMNS), (PENDING, limit))]
+
+    def _mark(self, sql, params):
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(sql, params)
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def mark_done(self, items):
+        """
+            items - пары (id отправки, pk AnswerQuestionnaire)
+        """
+        now = time.time()
+        self._mark('UPDATE submission SET status = ?, answer_id = ?, flushed_at = ? WHERE id = ?',
+                   [(DONE, answer_id, now, pk) for pk, answer_id in items])
+
+    def mark_failed(self, items):
+        """
+            items - пары (id отправки, ошибки проверки)
+        """
+        now = time.time()
+        self._mark('UPDATE submission SET status = ?, error = ?, flushed_at = ? WHERE id = ?',
+                   [(FAILED, json.dumps(error), now, pk) for pk, error in items])
+
+    def purge(self, before):
+        """
+            Удалить обработанные отправки старше before (unix time). Ключи удаленных можно использовать снова
+        """
+        return self.connection.execute('DELETE FROM submission WHERE status != ? AND flushed_at < ?',
+                                       (PENDING, before)).rowcount
+
+    def stats(self):
+        """
+            Отставание очереди: число отправок по статусам и возраст самой старой необработанной
+        """
+        now = time.time()
+        counts = {PENDING: 0, DONE: 0, FAILED: 0}
+        counts.update(self.connection.execute('SELECT status, COUNT(*) FROM submission GROUP BY status'))
+        oldest, last_flushed = self.connection.execute(
+            'SELECT (SELECT MIN(enqueued_at) FROM submission WHERE status = ?), MAX(flushed_at) FROM submission',
+            (PENDING,)).fetchone()
+        return {
+            'pending': counts[PENDING],
+            'done': counts[DONE],
+            'failed': counts[FAILED],
+            'lag_seconds': round(now - oldest, 3) if oldest is not None else 0,
+            'last_flushed_seconds_ago': round(now - last_flushed, 3) if last_flushed is not None else None,
+        }
+
+
+_queues = {}
+
+
+def get_queue():
+    path = settings.ANSWER_QUEUE_PATH
+    if path not in _queues:
+        _queues[path] = AnswerQueue(path)
+    return _queues[path]
+
+
+def enqueue(user, validated_data):
+    """
+        Поставить проверенную AnswerEnqueueSerializer отправку в очередь. Возвращает (submission, created)
+    """
+    payload = {
+        'questionnaire': validated_data['questionnaire'],
+        'answers': [{'question': answer['question'], 'text': answer.get('text'),
+                     'options': answer.get('options') or []} for answer in validated_data['answers']],
+    }
+    submission_key = validated_data.get('submission_key') or uuid.uuid4().hex
+    return get_queue().enqueue(user.pk, submission_key, payload)
+
+
+def to_representation(submission):
+    return {
+        'submission_key': submission.submission_key,
+        'questionnaire': submission.questionnaire_id,
+        'status': submission.status,
+        'answer': submission.answer_id,
+        'errors': json.loads(submission.error) if submission.error else None,
+    }
+
+
+def flush(queue=None, batch_size=500):
+    """
+        Перенести пачку отправок в основную базу. Возвращает (записано, отклонено)
+    """
+    queue = queue or get_queue()
+    submissions = queue.pending(batch_size)
+    if not submissions:
+        return 0, 0
+
+    # Повторная доставка: анкета записана, но отметка в очереди не успела сохраниться
+    keys = sorted({item.submission_key for item in submissions})
+    written = {}
+    for i in range(0, len(keys), 500):  # Ограничение SQLite на число параметров запроса
+        written.update(((user_id, submission_key), pk) for user_id, submission_key, pk in
+                       AnswerQuestionnaire.objects.filter(submission_key__in=keys[i:i + 500])
+                       .values_list('user', 'submission_key', 'pk'))
+    users = User.objects.in_bulk({item.user_id for item in submissions})
+
+    done = []
+    failed = []
+    valid = []
+    context = {'questions': {}}
+    for item in submissions:
+        if (item.user_id, item.submission_key) in written:
+            done.append((item.id, written[(item.user_id, item.submission_key)]))
+        elif item.user_id not in users:
+            failed.append((item.id, {'user': ['User pk {0} does not exist.'.format(item.user_id)]}))
+        else:
+            # Анкета могла измениться после постановки в очередь, поэтому проверка повторяется по базе
+            serializer = AnswerSubmitSerializer(data=item.payload, context=context)
+            if serializer.is_valid():
+                valid.append((item, dict(serializer.validated_data, user=users[item.user_id],
+                                         submission_key=item.submission_key)))
+            else:
+                failed.append((item.id, serializer.errors))
+
+    try:
+        _save(valid, done, failed)
+    finally:
+        queue.mark_done(done)
+        queue.mark_failed(failed)
+    return len(done), len(failed)
+
+
+def _save(valid, done, failed):
+    """
+        Записать пачку valid одной транзакцией, при ошибке - по одной. Дополняет done и failed
+    """
+    if not valid:
+        return
+    try:
+        answer_questionnaires = AnswerSubmitSerializer.save_answers([data for item, data in valid])
+    except (OperationalError, InterfaceError):
+        raise
+    except Exception:
+        for item, data in valid:
+            _save_one(item, data, done, failed)
+    else:
+        done += [(item.id, answer_questionnaire.pk)
+                 for (item, data), answer_questionnaire in zip(valid, answer_questionnaires)]
+
+
+def _save_one(item, data, done, failed):
+    try:
+        done.append((item.id, AnswerSubmitSerializer.save_answers([data])[0].pk))
+    except (OperationalError, InterfaceError):
+        raise
+    except Exception as e:
+        failed.append((item.id, {'non_field_errors': ['{0}: {1}'.format(type(e).__name__, e)]}))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from questionnaire import archive
+
+
+class Command(BaseCommand):
+    help = ('Перенести ответы анкет, закрытых больше --days дней назад, в архив ARCHIVE_PATH и удалить их '
+            'из базы пачками. Для запуска по расписанию: прерванный запуск можно повторить')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Дней после date_end, по умолчанию ARCHIVE_AFTER_DAYS')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Строк в одном DELETE')
+        parser.add_argument('--pause', type=float, default=0.0, help='Пауза между пачками в секундах')
+
+    def handle(self, *args, **options):
+        def progress(questionnaire_pk, step, count):
+            self.stderr.write('Questionnaire {0}: {1} {2}'.format(questionnaire_pk, step, count))
+
+        archived = archive.archive_closed(options['days'], options['batch_size'], options['pause'], progress)
+        for questionnaire_pk, counts in archived.items():
+            self.stdout.write('Archived questionnaire {0}: {1} rows in {2}'.format(
+                questionnaire_pk, counts.get('archived', 0), archive.get_path(questionnaire_pk)))
+        self.stdout.write('Archived {0} questionnaires'.format(len(archived)))
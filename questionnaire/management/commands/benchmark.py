@@ -0,0 +1,58 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from questionnaire.benchmark import runner
+from questionnaire.benchmark.scenarios import get_scenarios
+
+
+class Command(BaseCommand):
+    help = ('Прогнать сценарии API v1 на сгенерированных данных в отдельной тестовой базе '
+            'и сохранить p50/p95/p99, число запросов и память на запрос в JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questionnaires', type=int, default=5)
+        parser.add_argument('--questions', type=int, default=20)
+        parser.add_argument('--options', type=int, default=4)
+        parser.add_argument('--respondents', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--scenario', action='append', dest='scenarios', help='Только указанные сценарии')
+        parser.add_argument('-o', '--output', default='benchmark.json', help='Файл отчета')
+        parser.add_argument('--compare', help='Отчет прошлого прогона для сравнения')
+
+    def handle(self, *args, **options):
+        scenarios = get_scenarios()
+        if options['scenarios']:
+            unknown = set(options['scenarios']) - {scenario.name for scenario in scenarios}
+            if unknown:
+                raise CommandError('Unknown scenarios: {0}'.format(', '.join(sorted(unknown))))
+            scenarios = [scenario for scenario in scenarios if scenario.name in options['scenarios']]
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            report = runner.run(scenarios, iterations=options['iterations'], log=self.stderr.write,
+                                questionnaires=options['questionnaires'], questions=options['questions'],
+                                options=options['options'], respondents=options['respondents'],
+                                seed=options['seed'])
+        except runner.ScenarioError as e:
+            raise CommandError(str(e))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        runner.save(report, options['output'])
+        self.stdout.write('{0:32} {1:>9} {2:>9} {3:>9} {4:>8} {5:>10}'.format(
+            'scenario', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'alloc KB'))
+        for name, result in report['scenarios'].items():
+            self.stdout.write('{0:32} {1:9.2f} {2:9.2f} {3:9.2f} {4:8.1f} {5:10.1f}'.format(
+                name, result['p50_ms'], result['p95_ms'], result['p99_ms'], result['queries_per_request'],
+                result['peak_alloc_kb_per_request']))
+        if options['compare']:
+            with open(options['compare']) as f:
+                for line in runner.compare(json.load(f), report):
+                    self.stdout.write(line)
+        self.stdout.write('Report saved to {0}'.format(options['output']))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from questionnaire.benchmark import concurrency, runner
+
+
+class Command(BaseCommand):
+    help = ('Сравнить запросы в секунду и p50/p95/p99 чтения через poll/wsgi.py и асинхронный poll/asgi.py '
+            'при большом числе одновременных клиентов, в отдельной тестовой базе')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questionnaires', type=int, default=5)
+        parser.add_argument('--questions', type=int, default=20)
+        parser.add_argument('--options', type=int, default=4)
+        parser.add_argument('--respondents', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clients', type=int, default=500, help='Одновременных клиентов')
+        parser.add_argument('--requests', type=int, default=5000, help='Запросов на эндпоинт')
+        parser.add_argument('--workers', type=int, default=16, help='Потоков WSGI сервера')
+        parser.add_argument('--threads', type=int, help='Потоков ASGI для базы, по умолчанию ASYNC_READ_THREADS')
+        parser.add_argument('--endpoint', action='append', dest='endpoints', help='Только указанные эндпоинты')
+        parser.add_argument('-o', '--output', default='benchmark_asgi.json', help='Файл отчета')
+
+    def handle(self, *args, **options):
+        names = [name for name, wsgi_url, asgi_url in concurrency.ENDPOINTS]
+        unknown = set(options['endpoints'] or ()) - set(names)
+        if unknown:
+            raise CommandError('Unknown endpoints: {0}'.format(', '.join(sorted(unknown))))
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            report = concurrency.run(options['endpoints'], clients=options['clients'],
+                                     requests=options['requests'], workers=options['workers'],
+                                     threads=options['threads'], log=self.stderr.write,
+                                     questionnaires=options['questionnaires'], questions=options['questions'],
+                                     options=options['options'], respondents=options['respondents'],
+                                     seed=options['seed'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        runner.save(report, options['output'])
+        self.stdout.write('{0:10} {1:5} {2:>9} {3:>9} {4:>9} {5:>9}'.format(
+            'endpoint', 'app', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms'))
+        for name, result in report['endpoints'].items():
+            for app in ('wsgi', 'asgi'):
+                self.stdout.write('{0:10} {1:5} {2:9.1f} {3:9.2f} {4:9.2f} {5:9.2f}'.format(
+                    name, app, result[app]['rps'], result[app]['p50_ms'], result[app]['p95_ms'],
+                    result[app]['p99_ms']))
+        self.stdout.write('Report saved to {0}'.format(options['output']))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from questionnaire.benchmark import auth, runner
+
+
+class Command(BaseCommand):
+    help = ('Сравнить время CPU на аутентификацию запроса: BasicAuthentication, '
+            'CachedBasicAuthentication и TokenAuthentication, в отдельной тестовой базе')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100)
+        parser.add_argument('--profile', action='append', dest='profiles', help='Только указанные профили')
+        parser.add_argument('-o', '--output', default='benchmark_auth.json', help='Файл отчета')
+
+    def handle(self, *args, **options):
+        names = [name for name, cls in auth.PROFILES]
+        unknown = set(options['profiles'] or ()) - set(names)
+        if unknown:
+            raise CommandError('Unknown profiles: {0}'.format(', '.join(sorted(unknown))))
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            report = auth.run(iterations=options['iterations'], profiles=options['profiles'], log=self.stderr.write,
+                              questionnaires=1, questions=5, options=4, respondents=1)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        runner.save(report, options['output'])
+        self.stdout.write('{0:14} {1:>12} {2:>12} {3:>14} {4:>14}'.format(
+            'profile', 'auth ms', 'auth p99 ms', 'request ms', 'request p99 ms'))
+        for name, result in report['profiles'].items():
+            self.stdout.write('{0:14} {1:12.3f} {2:12.3f} {3:14.3f} {4:14.3f}'.format(
+                name, result['auth_cpu_ms'], result['auth_p99_ms'], result['request_cpu_ms'],
+                result['request_p99_ms']))
+        self.stdout.write('Report saved to {0}'.format(options['output']))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from questionnaire.benchmark import rendering, runner
+
+
+class Command(BaseCommand):
+    help = ('Сравнить время рендера больших ответов JSONRenderer и FastJSONRenderer и их размер '
+            'без сжатия, в gzip и brotli, в отдельной тестовой базе')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questionnaires', type=int, default=5)
+        parser.add_argument('--questions', type=int, default=50)
+        parser.add_argument('--options', type=int, default=6)
+        parser.add_argument('--respondents', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('-o', '--output', default='benchmark_render.json', help='Файл отчета')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            report = rendering.run(iterations=options['iterations'], log=self.stderr.write,
+                                   questionnaires=options['questionnaires'], questions=options['questions'],
+                                   options=options['options'], respondents=options['respondents'],
+                                   seed=options['seed'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        runner.save(report, options['output'])
+        self.stdout.write('{0:14} {1:14} {2:>10} {3:>10}'.format('payload', 'step', 'cpu ms', 'bytes'))
+        for name, result in report['payloads'].items():
+            for step, values in (sorted(('render ' + key, value) for key, value in result['render'].items()) +
+                                 sorted(('wire ' + key, value) for key, value in result['wire'].items())):
+                self.stdout.write('{0:14} {1:14} {2:10.3f} {3:10}'.format(name, step, values['cpu_ms'],
+                                                                         values['bytes']))
+        self.stdout.write('Report saved to {0}'.format(options['output']))
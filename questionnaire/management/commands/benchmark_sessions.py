@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from questionnaire.benchmark import runner, sessions
+
+
+class Command(BaseCommand):
+    help = ('Сравнить режимы хранения сессий db, cached_db и signed_cookies на пути респондента '
+            'с SessionAuthentication: время, SQL запросы и запросы к django_session на запрос')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questionnaires', type=int, default=2)
+        parser.add_argument('--questions', type=int, default=20)
+        parser.add_argument('--options', type=int, default=4)
+        parser.add_argument('--respondents', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--iterations', type=int, default=50, help='Проходов пути респондента')
+        parser.add_argument('--mode', action='append', dest='modes', help='Только указанные режимы')
+        parser.add_argument('-o', '--output', default='benchmark_sessions.json', help='Файл отчета')
+
+    def handle(self, *args, **options):
+        modes = options['modes'] or sessions.MODES
+        unknown = set(modes) - set(sessions.MODES)
+        if unknown:
+            raise CommandError('Unknown modes: {0}'.format(', '.join(sorted(unknown))))
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            report = sessions.run(iterations=options['iterations'], modes=modes, log=self.stderr.write,
+                                  questionnaires=options['questionnaires'], questions=options['questions'],
+                                  options=options['options'], respondents=options['respondents'],
+                                  seed=options['seed'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        runner.save(report, options['output'])
+        self.stdout.write('{0:16} {1:>9} {2:>9} {3:>9} {4:>16}'.format(
+            'mode', 'p50 ms', 'p95 ms', 'queries', 'session queries'))
+        for name, result in report['modes'].items():
+            self.stdout.write('{0:16} {1:9.2f} {2:9.2f} {3:9.2f} {4:16.2f}'.format(
+                name, result['p50_ms'], result['p95_ms'], result['queries_per_request'],
+                result['session_queries_per_request']))
+        self.stdout.write('Report saved to {0}'.format(options['output']))
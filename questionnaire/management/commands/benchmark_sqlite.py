@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from questionnaire.benchmark import runner, sqlite_writes
+
+
+class Command(BaseCommand):
+    help = ('Сравнить одновременную запись ответов из нескольких процессов в файл SQLite '
+            'с настройками по умолчанию и с профилем SQLITE_PRAGMAS и повторами записи')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questionnaires', type=int, default=2)
+        parser.add_argument('--questions', type=int, default=10)
+        parser.add_argument('--options', type=int, default=4)
+        parser.add_argument('--respondents', type=int, default=8)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--processes', type=int, default=4, help='Одновременно пишущих процессов')
+        parser.add_argument('--requests', type=int, default=200, help='Запросов на процесс')
+        parser.add_argument('--profile', action='append', dest='profiles', help='Только указанные профили')
+        parser.add_argument('-o', '--output', default='benchmark_sqlite.json', help='Файл отчета')
+
+    def handle(self, *args, **options):
+        profiles = options['profiles'] or sqlite_writes.PROFILES
+        unknown = set(profiles) - set(sqlite_writes.PROFILES)
+        if unknown:
+            raise CommandError('Unknown profiles: {0}'.format(', '.join(sorted(unknown))))
+
+        report = sqlite_writes.run(profiles, processes=options['processes'], requests=options['requests'],
+                                   log=self.stderr.write, questionnaires=options['questionnaires'],
+                                   questions=options['questions'], options=options['options'],
+                                   respondents=options['respondents'], seed=options['seed'])
+
+        runner.save(report, options['output'])
+        self.stdout.write('{0:8} {1:>9} {2:>9} {3:>9} {4:>9} {5:>7}'.format(
+            'profile', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'errors'))
+        for name, result in report['profiles'].items():
+            self.stdout.write('{0:8} {1:9.1f} {2:9.2f} {3:9.2f} {4:9.2f} {5:7}'.format(
+                name, result['rps'], result['p50_ms'], result['p95_ms'], result['p99_ms'], result['errors']))
+        self.stdout.write('Report saved to {0}'.format(options['output']))
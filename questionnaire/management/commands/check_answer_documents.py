@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from questionnaire import documents
+from questionnaire.models import AnswerQuestionnaire
+
+
+class Command(BaseCommand):
+    help = 'Сверить документы пройденных анкет с ответами в базе и переписать разошедшиеся'
+
+    def add_arguments(self, parser):
+        parser.add_argument('questionnaire', nargs='*', type=int, help='pk анкет, по умолчанию все')
+        parser.add_argument('--fix', action='store_true', help='Переписать отсутствующие и разошедшиеся документы')
+
+    def handle(self, *args, **options):
+        answer_questionnaires = AnswerQuestionnaire.objects.all()
+        if options['questionnaire']:
+            answer_questionnaires = answer_questionnaires.filter(questionnaire__in=options['questionnaire'])
+
+        problems = documents.check(answer_questionnaires, fix=options['fix'])
+        for pk, problem in problems:
+            self.stderr.write('AnswerQuestionnaire pk {0}: document {1}'.format(pk, problem))
+        if problems and not options['fix']:
+            raise CommandError('{0} documents differ from the answers'.format(len(problems)))
+        if problems:
+            self.stdout.write(self.style.SUCCESS('Rewrote {0} documents'.format(len(problems))))
+        else:
+            self.stdout.write(self.style.SUCCESS('Documents match the answers'))
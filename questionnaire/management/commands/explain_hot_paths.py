@@ -0,0 +1,88 @@
+import datetime
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from questionnaire.benchmark.generator import Generator
+from questionnaire.models import *
+
+# Индексы, добавленные для горячих запросов. Для плана "до" они временно удаляются в откатываемой транзакции
+HOT_PATH_INDEXES = (Questionnaire, AnswerQuestionnaire, AnswerQuestion, AnswerOption)
+
+
+class Command(BaseCommand):
+    help = ('Показать планы (EXPLAIN) и время горячих запросов к ответам: до (join, без новых индексов) '
+            'и после (денормализованные колонки и составные индексы)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed-answers', type=int, default=0,
+                            help='Предварительно сгенерировать примерно столько вариантов в ответах')
+        parser.add_argument('--questionnaires', type=int, default=10)
+        parser.add_argument('--questions', type=int, default=20)
+        parser.add_argument('--options', type=int, default=4)
+        parser.add_argument('--repeat', type=int, default=5, help='Повторов замера каждого запроса')
+
+    def handle(self, *args, **options):
+        if options['seed_answers']:
+            self.seed(options)
+
+        answer = AnswerQuestionnaire.objects.order_by('-pk').first()
+        if answer is None:
+            raise CommandError('No answers in the database, use --seed-answers')
+        user, questionnaire = answer.user_id, answer.questionnaire_id
+        self.stdout.write('Rows: {0} answers, {1} answer questions, {2} answer options; user pk {3}'.format(
+            AnswerQuestionnaire.objects.count(), AnswerQuestion.objects.count(), AnswerOption.objects.count(), user))
+
+        today = datetime.date.today()
+        paths = (
+            ('AnswerQuestionnaire(user, questionnaire)',
+             AnswerQuestionnaire.objects.filter(user=user, questionnaire=questionnaire),
+             AnswerQuestionnaire.objects.filter(user=user, questionnaire=questionnaire)),
+            ('AnswerQuestion(user)',
+             AnswerQuestion.objects.filter(answer_questionnaire__user=user),
+             AnswerQuestion.objects.filter(user=user)),
+            ('AnswerOption(user)',
+             AnswerOption.objects.filter(answer_question__answer_questionnaire__user=user),
+             AnswerOption.objects.filter(user=user)),
+            ('Questionnaire(date_end__gte)',
+             Questionnaire.objects.filter(date_end__gte=today),
+             Questionnaire.objects.filter(date_end__gte=today)),
+        )
+
+        before = {}
+        schema_editor = connection.schema_editor()
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for model in HOT_PATH_INDEXES:
+                    for index in model._meta.indexes:
+                        cursor.execute(str(index.remove_sql(model, schema_editor)))
+            for name, old, new in paths:
+                before[name] = self.measure(old, options['repeat'])
+            transaction.set_rollback(True)
+
+        for name, old, new in paths:
+            after = self.measure(new, options['repeat'])
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for label, (plan, elapsed) in (('before', before[name]), ('after', after)):
+                self.stdout.write('  {0}: {1:.2f} ms'.format(label, elapsed * 1000))
+                for line in plan.splitlines():
+                    self.stdout.write('    ' + line)
+
+    def seed(self, options):
+        per_answer = options['questions'] * 1.3
+        respondents = max(1, int(options['seed_answers'] / (options['questionnaires'] * per_answer)))
+        counts = Generator(questionnaires=options['questionnaires'], questions=options['questions'],
+                           options=options['options'], respondents=respondents,
+                           log=self.stdout.write).generate()
+        self.stdout.write('Seeded: ' + ', '.join('{0} {1}'.format(value, key) for key, value in counts.items()))
+
+    def measure(self, queryset, repeat):
+        plan = queryset.explain()
+        timings = []
+        for i in range(repeat):
+            started = time.perf_counter()
+            list(queryset.values_list('pk'))
+            timings.append(time.perf_counter() - started)
+        return plan, statistics.median(timings)
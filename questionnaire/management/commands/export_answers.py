@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from questionnaire import export
+from questionnaire.models import Questionnaire
+
+
+class Command(BaseCommand):
+    help = 'Выгрузить все ответы анкеты в файл csv или ndjson'
+
+    def add_arguments(self, parser):
+        parser.add_argument('questionnaire', type=int, help='pk анкеты')
+        parser.add_argument('--format', choices=export.FORMATS, default='csv', dest='export_format')
+        parser.add_argument('-o', '--output', help='Имя файла, по умолчанию questionnaire_<pk>.<format>')
+
+    def handle(self, *args, **options):
+        try:
+            questionnaire = Questionnaire.objects.get(pk=options['questionnaire'])
+        except Questionnaire.DoesNotExist:
+            raise CommandError('No Questionnaire pk {0}'.format(options['questionnaire']))
+
+        export_format = options['export_format']
+        output = options['output'] or 'questionnaire_{0}.{1}'.format(questionnaire.pk, export_format)
+        lines = 0
+        with open(output, 'w', encoding='utf-8', newline='') as f:
+            for line in export.iter_export(questionnaire, export_format):
+                f.write(line)
+                lines += 1
+        self.stdout.write('Written {0} lines to {1}'.format(lines, output))
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from questionnaire import ingest
+
+
+class Command(BaseCommand):
+    help = 'Перенести отправки из очереди записи в базу пачками. С --loop работает постоянно'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Отправок в одной транзакции')
+        parser.add_argument('--loop', action='store_true', help='Не завершаться, ждать новые отправки')
+        parser.add_argument('--interval', type=float, default=1.0, help='Пауза в секундах, когда очередь пуста')
+        parser.add_argument('--purge-days', type=float, default=7,
+                            help='Удалять обработанные отправки старше стольких дней')
+
+    def handle(self, *args, **options):
+        queue = ingest.get_queue()
+        while True:
+            try:
+                done, failed = ingest.flush(queue, options['batch_size'])
+            except Exception as e:
+                if not options['loop']:
+                    raise
+                # Ошибка базы: отправки остаются в очереди и будут повторены, плохие отправки отклоняет flush
+                self.stderr.write('Flush failed: {0}'.format(e))
+                close_old_connections()
+                time.sleep(options['interval'])
+                continue
+            if done or failed:
+                self.stdout.write('Flushed {0}, rejected {1}'.format(done, failed))
+            elif not options['loop']:
+                break
+            else:
+                queue.purge(time.time() - options['purge_days'] * 24 * 60 * 60)
+                time.sleep(options['interval'])
+
+        queue.purge(time.time() - options['purge_days'] * 24 * 60 * 60)
+        stats = queue.stats()
+        self.stdout.write(self.style.SUCCESS('Queue: {pending} pending, {done} done, {failed} failed'.format(**stats)))
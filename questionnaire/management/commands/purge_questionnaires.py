@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from questionnaire import purge
+
+
+class Command(BaseCommand):
+    help = ('Удалить строки удаленных через API анкет пачками, от ответов к самой анкете. '
+            'Прерванный запуск можно повторить: удаляется только то, что осталось')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Строк в одном DELETE')
+        parser.add_argument('--pause', type=float, default=0.0, help='Пауза между пачками в секундах')
+
+    def handle(self, *args, **options):
+        def progress(questionnaire_pk, step, deleted):
+            self.stderr.write('Questionnaire {0}: {1} {2}'.format(questionnaire_pk, step, deleted))
+
+        purged = purge.purge_pending(options['batch_size'], options['pause'], progress)
+        for questionnaire_pk, counts in purged.items():
+            self.stdout.write('Purged questionnaire {0}: {1} rows'.format(questionnaire_pk, sum(counts.values())))
+        self.stdout.write('Purged {0} questionnaires'.format(len(purged)))
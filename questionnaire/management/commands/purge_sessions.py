@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from poll import sessions
+
+
+class Command(BaseCommand):
+    help = ('Удалить истекшие сессии из базы пачками. В отличие от clearsessions не удаляет все одним '
+            'запросом и не держит базу заблокированной для записи ответов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Сессий в одном DELETE')
+        parser.add_argument('--pause', type=float, default=0.0, help='Пауза между пачками в секундах')
+
+    def handle(self, *args, **options):
+        deleted = sessions.purge_expired(options['batch_size'], options['pause'])
+        self.stdout.write('Deleted {0} expired sessions'.format(deleted))
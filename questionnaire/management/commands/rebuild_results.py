@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from questionnaire import results
+from questionnaire.models import Questionnaire
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать счетчики итогов анкет с нуля и сверить их с полным пересчетом ответов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('questionnaire', nargs='*', type=int, help='pk анкет, по умолчанию все')
+        parser.add_argument('--check', action='store_true', help='Только сверить счетчики, ничего не меняя')
+
+    def handle(self, *args, **options):
+        if options['questionnaire']:
+            questionnaires = list(Questionnaire.objects.filter(pk__in=options['questionnaire']))
+            missing = set(options['questionnaire']) - {questionnaire.pk for questionnaire in questionnaires}
+            if missing:
+                raise CommandError('No Questionnaire pk {0}'.format(', '.join(str(pk) for pk in sorted(missing))))
+        else:
+            questionnaires = [None]
+
+        mismatches = 0
+        for questionnaire in questionnaires:
+            if not options['check']:
+                with transaction.atomic():
+                    results.rebuild(questionnaire)
+            mismatches += self.compare(questionnaire)
+
+        if mismatches:
+            raise CommandError('{0} counters differ from the full recount'.format(mismatches))
+        self.stdout.write(self.style.SUCCESS('Counters match the full recount'))
+
+    def compare(self, questionnaire):
+        expected_options, expected_questions = results.recount(questionnaire)
+        stored_options, stored_questions = results.stored(questionnaire)
+        mismatches = 0
+        for name, expected, stored in (('Option', expected_options, stored_options),
+                                       ('Question', expected_questions, stored_questions)):
+            for pk in sorted(set(expected) | set(stored)):
+                if expected.get(pk) != stored.get(pk):
+                    mismatches += 1
+                    self.stderr.write('{0} pk {1}: stored {2}, recount {3}'.format(
+                        name, pk, stored.get(pk), expected.get(pk)))
+        return mismatches
@@ -0,0 +1,35 @@
+# Generated by Django 2.2.10 on 2026-10-18 19:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questionnaire', '0002_create_models'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OptionResult',
+            fields=[
+                ('option', models.OneToOneField(help_text='Вариант', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='result', serialize=False, to='questionnaire.Option')),
+                ('answer_count', models.PositiveIntegerField(default=0, help_text='Выбран раз')),
+            ],
+            options={
+                'verbose_name': 'Итоги по варианту',
+            },
+        ),
+        migrations.CreateModel(
+            name='QuestionResult',
+            fields=[
+                ('question', models.OneToOneField(help_text='Вопрос', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='result', serialize=False, to='questionnaire.Question')),
+                ('answer_count', models.PositiveIntegerField(default=0, help_text='Выбрано вариантов')),
+                ('respondent_count', models.PositiveIntegerField(default=0, help_text='Ответивших на вопрос')),
+            ],
+            options={
+                'verbose_name': 'Итоги по вопросу',
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 2.2.10 on 2026-10-18 19:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questionnaire', '0003_optionresult_questionresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answerquestionnaire',
+            name='snapshot_version',
+            field=models.PositiveIntegerField(editable=False, help_text='Версия опубликованной анкеты', null=True),
+        ),
+        migrations.CreateModel(
+            name='QuestionnaireSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(help_text='Версия')),
+                ('content_hash', models.CharField(help_text='sha256 несжатого JSON', max_length=64)),
+                ('data', models.BinaryField(help_text='JSON, сжатый gzip')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Дата публикации')),
+                ('questionnaire', models.ForeignKey(help_text='Анкета', on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='questionnaire.Questionnaire')),
+            ],
+            options={
+                'verbose_name': 'Опубликованная анкета',
+                'unique_together': {('questionnaire', 'version')},
+            },
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 2.2.10 on 2026-10-18 19:51
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def fill_denormalized(apps, schema_editor):
+    AnswerQuestionnaire = apps.get_model('questionnaire', 'AnswerQuestionnaire')
+    AnswerQuestion = apps.get_model('questionnaire', 'AnswerQuestion')
+    AnswerOption = apps.get_model('questionnaire', 'AnswerOption')
+
+    answer_questionnaire = AnswerQuestionnaire.objects.filter(pk=OuterRef('answer_questionnaire'))
+    AnswerQuestion.objects.update(user=Subquery(answer_questionnaire.values('user')[:1]),
+                                  questionnaire=Subquery(answer_questionnaire.values('questionnaire')[:1]))
+    answer_question = AnswerQuestion.objects.filter(pk=OuterRef('answer_question'))
+    AnswerOption.objects.update(user=Subquery(answer_question.values('user')[:1]),
+                                questionnaire=Subquery(answer_question.values('questionnaire')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('questionnaire', '0004_questionnairesnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answeroption',
+            name='questionnaire',
+            field=models.ForeignKey(editable=False, help_text='Анкета', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='questionnaire.Questionnaire'),
+        ),
+        migrations.AddField(
+            model_name='answeroption',
+            name='user',
+            field=models.ForeignKey(db_index=False, editable=False, help_text='Пользователь', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='answerquestion',
+            name='questionnaire',
+            field=models.ForeignKey(editable=False, help_text='Анкета', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='questionnaire.Questionnaire'),
+        ),
+        migrations.AddField(
+            model_name='answerquestion',
+            name='user',
+            field=models.ForeignKey(db_index=False, editable=False, help_text='Пользователь', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(fill_denormalized, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='answeroption',
+            name='questionnaire',
+            field=models.ForeignKey(editable=False, help_text='Анкета', on_delete=django.db.models.deletion.CASCADE, related_name='+', to='questionnaire.Questionnaire'),
+        ),
+        migrations.AlterField(
+            model_name='answeroption',
+            name='user',
+            field=models.ForeignKey(db_index=False, editable=False, help_text='Пользователь', on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='answerquestion',
+            name='questionnaire',
+            field=models.ForeignKey(editable=False, help_text='Анкета', on_delete=django.db.models.deletion.CASCADE, related_name='+', to='questionnaire.Questionnaire'),
+        ),
+        migrations.AlterField(
+            model_name='answerquestion',
+            name='user',
+            field=models.ForeignKey(db_index=False, editable=False, help_text='Пользователь', on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='answeroption',
+            index=models.Index(fields=['user', 'answer_question'], name='answeroption_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='answerquestion',
+            index=models.Index(fields=['user', 'answer_questionnaire'], name='answerquestion_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='answerquestionnaire',
+            index=models.Index(fields=['user', 'questionnaire'], name='answer_user_questionnaire_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questionnaire',
+            index=models.Index(fields=['date_end'], name='questionnaire_date_end_idx'),
+        ),
+    ]
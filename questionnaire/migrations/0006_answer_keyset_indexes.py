@@ -0,0 +1,21 @@
+# Generated by Django 2.2.10 on 2026-10-18 20:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questionnaire', '0005_answer_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='answerquestionnaire',
+            index=models.Index(fields=['created_at', 'id'], name='answer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='answerquestionnaire',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='answer_user_created_idx'),
+        ),
+    ]
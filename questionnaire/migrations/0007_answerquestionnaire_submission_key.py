@@ -0,0 +1,24 @@
+# Generated by Django 2.2.10 on 2026-10-18 20:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('questionnaire', '0006_answer_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answerquestionnaire',
+            name='submission_key',
+            field=models.CharField(blank=True, editable=False, help_text='Ключ идемпотентности отправки через очередь', max_length=64, null=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='answerquestionnaire',
+            unique_together={('user', 'submission_key')},
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 2.2.10 on 2026-10-18 20:20
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_progress(apps, schema_editor):
+    Question = apps.get_model('questionnaire', 'Question')
+    AnswerQuestion = apps.get_model('questionnaire', 'AnswerQuestion')
+    QuestionnaireProgress = apps.get_model('questionnaire', 'QuestionnaireProgress')
+
+    question_counts = dict(Question.objects.values_list('questionnaire').annotate(Count('pk')).order_by())
+    answered = {}
+    for user_id, questionnaire_id, answer_questionnaire_id, count in (
+            AnswerQuestion.objects.values_list('user', 'questionnaire', 'answer_questionnaire')
+            .annotate(Count('pk')).order_by()):
+        answered[(user_id, questionnaire_id)] = max(answered.get((user_id, questionnaire_id), 0), count)
+    QuestionnaireProgress.objects.bulk_create(
+        [QuestionnaireProgress(user_id=user_id, questionnaire_id=questionnaire_id, answered_count=count,
+                               question_count=question_counts.get(questionnaire_id, 0))
+         for (user_id, questionnaire_id), count in answered.items()], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('questionnaire', '0007_answerquestionnaire_submission_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionnaireProgress',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answered_count', models.PositiveIntegerField(default=0, help_text='Отвечено вопросов')),
+                ('question_count', models.PositiveIntegerField(default=0, help_text='Вопросов в анкете')),
+                ('questionnaire', models.ForeignKey(help_text='Анкета', on_delete=django.db.models.deletion.CASCADE, related_name='+', to='questionnaire.Questionnaire')),
+                ('user', models.ForeignKey(help_text='Пользователь', on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Прогресс прохождения анкеты',
+                'unique_together': {('user', 'questionnaire')},
+            },
+        ),
+        migrations.RunPython(fill_progress, migrations.RunPython.noop),
+    ]
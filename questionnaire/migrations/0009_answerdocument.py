@@ -0,0 +1,24 @@
+# Generated by Django 2.2.10 on 2026-10-18 20:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questionnaire', '0008_questionnaireprogress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnswerDocument',
+            fields=[
+                ('answer_questionnaire', models.OneToOneField(help_text='Пройденная анкета', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='questionnaire.AnswerQuestionnaire')),
+                ('data', models.TextField(help_text='JSON ответов на вопросы')),
+            ],
+            options={
+                'verbose_name': 'Документ пройденной анкеты',
+            },
+        ),
+    ]
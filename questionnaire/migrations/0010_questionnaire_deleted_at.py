@@ -0,0 +1,18 @@
+# Generated by Django 2.2.10 on 2026-10-18 20:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questionnaire', '0009_answerdocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionnaire',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Дата удаления', null=True),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questionnaire', '0010_questionnaire_deleted_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionnaire',
+            name='answer_deletions',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Число удалений ответов'),
+        ),
+    ]
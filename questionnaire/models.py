@@ -15,10 +15,15 @@ class Questionnaire(models.Model):
     date_begin = models.DateField(help_text='Дата начала', auto_now_add=True, editable=False)
     date_end = models.DateField(help_text='Дата окончания')
     description = models.TextField(blank=True, null=True, help_text='Описание')
+    # Удаленная анкета скрыта из API, строки удаляет пачками команда purge_questionnaires, см. purge.py
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False, help_text='Дата удаления')
+    # Растет при каждом удалении ответов, по нему перестраиваются массивы перекрестных таблиц, см. analytics.py
+    answer_deletions = models.PositiveIntegerField(default=0, editable=False, help_text='Число удалений ответов')
 
-    # class Meta:
-    #     verbose_name = 'Опросник'
-    #     verbose_name_plural = 'Опросники'
+    class Meta:
+        # verbose_name = 'Опросник'
+        # verbose_name_plural = 'Опросники'
+        indexes = [models.Index(fields=['date_end'], name='questionnaire_date_end_idx')]
 
     def __str__(self):
         return self.name
@@ -58,12 +63,21 @@ class AnswerQuestionnaire(models.Model):
     questionnaire = models.ForeignKey(Questionnaire, help_text='Опросник', on_delete=models.CASCADE)
     created_at = models.DateTimeField(help_text='Дата прохождения', auto_now_add=True, editable=False, )
     user = models.ForeignKey(User, editable=False, help_text='Пользователь', on_delete=models.CASCADE)
+    snapshot_version = models.PositiveIntegerField(null=True, editable=False,
+                                                   help_text='Версия опубликованной анкеты')
+    submission_key = models.CharField(max_length=64, null=True, blank=True, editable=False,
+                                      help_text='Ключ идемпотентности отправки через очередь')
 
     def __str__(self):
         return self.questionnaire.name + ' от ' + self.created_at.__str__() + '(' + self.user.__str__() + ')'
 
     class Meta:
         verbose_name = 'Пройденная анкета'
+        unique_together = ('user', 'submission_key')
+        indexes = [models.Index(fields=['user', 'questionnaire'], name='answer_user_questionnaire_idx'),
+                   # Ключ постраничного списка (created_at, pk), для админа и для своих анкет
+                   models.Index(fields=['created_at', 'id'], name='answer_created_idx'),
+                   models.Index(fields=['user', 'created_at', 'id'], name='answer_user_created_idx')]
 
 
 class AnswerQuestion(models.Model):
@@ -76,15 +90,26 @@ class AnswerQuestion(models.Model):
     question = models.ForeignKey(Question, related_name='questions', help_text='Вопрос', on_delete=models.CASCADE)
     text = models.CharField(max_length=256, blank=True, null=True, help_text='Ответ', default=None)
     question_type = models.IntegerField(choices=((0, 'Text'), (1, 'Choices'), (2, 'Multi choices')))
-    # questionnaire = models.PositiveIntegerField(help_text='Анкета')
+    # Копии answer_questionnaire.user и answer_questionnaire.questionnaire, что бы фильтровать без join
+    user = models.ForeignKey(User, editable=False, related_name='+', help_text='Пользователь', db_index=False,
+                             on_delete=models.CASCADE)
+    questionnaire = models.ForeignKey(Questionnaire, editable=False, related_name='+', help_text='Анкета',
+                                      on_delete=models.CASCADE)
     # TODO Возможно нужен составной ForeignKey на Question(question = Question.pk, questionnaire = Question.questionnaire), что бы отслеживать целостность на уровене базы
 
     def __str__(self):
         return self.question.name +'/'+ self.answer_questionnaire.__str__()+'/'+self.answer_questionnaire_id.__str__()
 
+    def save(self, *args, **kwargs):
+        if self.user_id is None or self.questionnaire_id is None:
+            self.user_id = self.answer_questionnaire.user_id
+            self.questionnaire_id = self.answer_questionnaire.questionnaire_id
+        super(AnswerQuestion, self).save(*args, **kwargs)
+
     class Meta:
         unique_together = ('answer_questionnaire', 'question')
         verbose_name = 'Ответ на вопрос'
+        indexes = [models.Index(fields=['user', 'answer_questionnaire'], name='answerquestion_user_idx')]
 
 
 class AnswerOption(models.Model):
@@ -94,10 +119,90 @@ class AnswerOption(models.Model):
     answer_question = models.ForeignKey(AnswerQuestion, help_text='Пройденный вопрос', related_name='answer_options',
                                         on_delete=models.CASCADE)
     option = models.ForeignKey(Option, help_text='Вариант', on_delete=models.CASCADE)
+    # Копии answer_question.user и answer_question.questionnaire, что бы фильтровать без двух join
+    user = models.ForeignKey(User, editable=False, related_name='+', help_text='Пользователь', db_index=False,
+                             on_delete=models.CASCADE)
+    questionnaire = models.ForeignKey(Questionnaire, editable=False, related_name='+', help_text='Анкета',
+                                      on_delete=models.CASCADE)
 
     # question = models.PositiveIntegerField(help_text='Вопрос')
     # TODO Возможно нужен составной ForeignKey на Option(option = Option.pk, question = Option.question), что бы отслеживать целостность на уровене базы
 
+    def save(self, *args, **kwargs):
+        if self.user_id is None or self.questionnaire_id is None:
+            self.user_id = self.answer_question.user_id
+            self.questionnaire_id = self.answer_question.questionnaire_id
+        super(AnswerOption, self).save(*args, **kwargs)
+
     class Meta:
         unique_together = ('answer_question', 'option')
         verbose_name = 'Ответ на вопрос с вариантами'
+        indexes = [models.Index(fields=['user', 'answer_question'], name='answeroption_user_idx')]
+
+
+class QuestionResult(models.Model):
+    """
+        Счетчики ответов на вопрос
+    """
+    question = models.OneToOneField(Question, primary_key=True, related_name='result', help_text='Вопрос',
+                                    on_delete=models.CASCADE)
+    answer_count = models.PositiveIntegerField(default=0, help_text='Выбрано вариантов')
+    respondent_count = models.PositiveIntegerField(default=0, help_text='Ответивших на вопрос')
+
+    class Meta:
+        verbose_name = 'Итоги по вопросу'
+
+
+class OptionResult(models.Model):
+    """
+        Счетчики ответов по варианту. Вариант в ответе уникален, поэтому число ответов равно числу ответивших
+    """
+    option = models.OneToOneField(Option, primary_key=True, related_name='result', help_text='Вариант',
+                                  on_delete=models.CASCADE)
+    answer_count = models.PositiveIntegerField(default=0, help_text='Выбран раз')
+
+    class Meta:
+        verbose_name = 'Итоги по варианту'
+
+
+class QuestionnaireProgress(models.Model):
+    """
+        Прогресс пользователя по анкете: наибольшее число отвеченных вопросов среди его прохождений
+    """
+    user = models.ForeignKey(User, related_name='+', help_text='Пользователь', on_delete=models.CASCADE)
+    questionnaire = models.ForeignKey(Questionnaire, related_name='+', help_text='Анкета', on_delete=models.CASCADE)
+    answered_count = models.PositiveIntegerField(default=0, help_text='Отвечено вопросов')
+    question_count = models.PositiveIntegerField(default=0, help_text='Вопросов в анкете')
+
+    class Meta:
+        unique_together = ('user', 'questionnaire')
+        verbose_name = 'Прогресс прохождения анкеты'
+
+
+class QuestionnaireSnapshot(models.Model):
+    """
+        Опубликованная версия анкеты: готовый JSON определения, сжатый gzip
+    """
+    questionnaire = models.ForeignKey(Questionnaire, related_name='snapshots', help_text='Анкета',
+                                      on_delete=models.CASCADE)
+    version = models.PositiveIntegerField(help_text='Версия')
+    content_hash = models.CharField(max_length=64, help_text='sha256 несжатого JSON')
+    data = models.BinaryField(help_text='JSON, сжатый gzip')
+    created_at = models.DateTimeField(help_text='Дата публикации', auto_now_add=True, editable=False)
+
+    class Meta:
+        unique_together = ('questionnaire', 'version')
+        verbose_name = 'Опубликованная анкета'
+
+
+class AnswerDocument(models.Model):
+    """
+        Пройденная анкета одним JSON: ответы на вопросы с типом и выбранными вариантами, как answer_questions
+        в AnswerQuestionnaireSerializer. Ведется вместе с ответами при ANSWER_DOCUMENTS_ENABLED, см. documents.py
+    """
+    answer_questionnaire = models.OneToOneField(AnswerQuestionnaire, primary_key=True, related_name='document',
+                                                help_text='Пройденная анкета', on_delete=models.CASCADE)
+    data = models.TextField(help_text='JSON ответов на вопросы')
+
+    class Meta:
+        verbose_name = 'Документ пройденной анкеты'
@@ -0,0 +1,144 @@
+"""
+    Пагинация по ключу (keyset): страница выбирается условием по полям сортировки,
+    а не OFFSET, и отдается без COUNT(*).
+
+    Курсор - непрозрачная строка с значениями ключа последней (первой) записи страницы.
+    К сортировке всегда добавляется pk, поэтому ключ уникален и записи не теряются
+    и не повторяются при совпадающих значениях остальных полей.
+"""
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict, namedtuple
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+Cursor = namedtuple('Cursor', ['position', 'reverse'])
+
+
+def _reverse_ordering(ordering):
+    return tuple(name[1:] if name.startswith('-') else '-' + name for name in ordering)
+
+
+class KeysetPagination(CursorPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = ('pk',)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super(KeysetPagination, self).get_ordering(request, queryset, view)
+        names = [name.lstrip('-') for name in ordering]
+        if 'pk' not in names and queryset.model._meta.pk.name not in names:
+            # Уникальный хвост ключа идет в том же направлении, что и последнее поле
+            ordering = tuple(ordering) + ('-pk' if ordering[-1].startswith('-') else 'pk',)
+        return tuple(ordering)
+
+    def get_fields(self, model):
+        fields = []
+        for name in self.ordering:
+            name = name.lstrip('-')
+            try:
+                fields.append(model._meta.pk if name == 'pk' else model._meta.get_field(name))
+            except FieldDoesNotExist:
+                raise NotFound(self.invalid_cursor_message)
+        return fields
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.fields = self.get_fields(queryset.model)
+        self.cursor = self.decode_cursor(request)
+
+        reverse = self.cursor is not None and self.cursor.reverse
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            queryset = queryset.filter(self.get_keyset_filter(ordering, self.cursor.position))
+
+        # Лишняя запись показывает, есть ли следующая страница
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+
+        if self.page:
+            self.next_position = self.get_position(self.page[-1])
+            self.previous_position = self.get_position(self.page[0])
+        elif self.cursor is not None:
+            # Пустая страница: обе ссылки ведут от позиции курсора
+            self.next_position = self.previous_position = self.cursor.position
+
+        self.display_page_controls = self.has_next or self.has_previous
+        return self.page
+
+    def get_keyset_filter(self, ordering, position):
+        """
+            Записи строго после позиции: (a > x) or (a = x and b > y) or ...
+        """
+        condition = Q()
+        equal = {}
+        for field, name, value in zip(self.fields, ordering, position):
+            lookup = '{0}__{1}'.format(field.attname, 'lt' if name.startswith('-') else 'gt')
+            condition |= Q(**equal) & Q(**{lookup: value})
+            equal[field.attname] = value
+        return condition
+
+    def get_position(self, instance):
+        return [getattr(instance, field.attname) for field in self.fields]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(Cursor(position=self.next_position, reverse=False))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(Cursor(position=self.previous_position, reverse=True))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            data = json.loads(b64decode(encoded.encode('ascii'), altchars=b'-_').decode('utf-8'))
+            position = data['p']
+            if data.get('o') != list(self.ordering) or len(position) != len(self.fields):
+                raise ValueError
+            position = [field.to_python(value) for field, value in zip(self.fields, position)]
+            if None in position:
+                raise ValueError
+            return Cursor(position=position, reverse=bool(data.get('r')))
+        except (TypeError, ValueError, KeyError, UnicodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor):
+        # Сортировка сохраняется в курсоре: курсор от другой сортировки не применим.
+        # Время пишется с микросекундами, иначе записи с той же миллисекундой выпадут
+        position = [value.isoformat() if hasattr(value, 'isoformat') else value for value in cursor.position]
+        data = {'p': position, 'o': list(self.ordering)}
+        if cursor.reverse:
+            data['r'] = 1
+        encoded = b64encode(json.dumps(data, separators=(',', ':')).encode('utf-8'),
+                            altchars=b'-_').decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
@@ -0,0 +1,87 @@
+"""
+    Прогресс прохождения анкет: строка (user, questionnaire) с числом отвеченных и всех вопросов.
+
+    Строки обновляются в той же транзакции, что и запись ответов, поэтому список неотвеченных
+    активных анкет - один запрос по индексу (user, questionnaire). Отвеченный вопрос - это строка
+    AnswerQuestion, из прохождений пользователя берется самое полное.
+"""
+from django.db.models import Count, F
+
+from questionnaire.models import *
+
+# Ограничение SQLite на число параметров запроса
+CHUNK_SIZE = 500
+
+
+def _answered_counts(questionnaire_id, user_ids=None):
+    answer_questions = AnswerQuestion.objects.filter(questionnaire=questionnaire_id)
+    if user_ids is not None:
+        answer_questions = answer_questions.filter(user__in=user_ids)
+    counts = {}
+    for user_id, answer_questionnaire_id, count in (answer_questions.values_list('user', 'answer_questionnaire')
+                                                    .annotate(Count('pk')).order_by()):
+        counts[user_id] = max(counts.get(user_id, 0), count)
+    return counts
+
+
+def _save(questionnaire_id, answered, replace):
+    """
+        answered - {user_id: число отвеченных}. replace=False - значение только увеличивается
+    """
+    question_count = Question.objects.filter(questionnaire=questionnaire_id).count()
+    user_ids = sorted(answered)
+    for i in range(0, len(user_ids), CHUNK_SIZE):
+        chunk = user_ids[i:i + CHUNK_SIZE]
+        existing = {user_id: (answered_count, stored_question_count)
+                    for user_id, answered_count, stored_question_count in
+                    QuestionnaireProgress.objects.filter(questionnaire=questionnaire_id, user__in=chunk)
+                    .values_list('user', 'answered_count', 'question_count')}
+        QuestionnaireProgress.objects.bulk_create(
+            [QuestionnaireProgress(user_id=user_id, questionnaire_id=questionnaire_id,
+                                   answered_count=answered[user_id], question_count=question_count)
+             for user_id in chunk if user_id not in existing], ignore_conflicts=True)
+        # Один UPDATE на каждое значение, у большинства пользователей оно одинаковое
+        updates = {}
+        for user_id in chunk:
+            if user_id not in existing:
+                continue
+            answered_count = answered[user_id] if replace else max(answered[user_id], existing[user_id][0])
+            if (answered_count, question_count) != existing[user_id]:
+                updates.setdefault(answered_count, []).append(user_id)
+        for answered_count, pks in updates.items():
+            QuestionnaireProgress.objects.filter(questionnaire=questionnaire_id, user__in=pks).update(
+                answered_count=answered_count, question_count=question_count)
+
+
+def count_answers(items):
+    """
+        Учесть новые прохождения. items - (user_id, questionnaire_id, число отвеченных вопросов)
+    """
+    by_questionnaire = {}
+    for user_id, questionnaire_id, answered_count in items:
+        answered = by_questionnaire.setdefault(questionnaire_id, {})
+        answered[user_id] = max(answered.get(user_id, 0), answered_count)
+    for questionnaire_id, answered in by_questionnaire.items():
+        _save(questionnaire_id, answered, replace=False)
+
+
+def refresh(questionnaire_id, user_ids=None):
+    """
+        Пересчитать прогресс по ответам: после удаления или добавления ответов на вопросы и изменения
+        числа вопросов. Без user_ids - для всех, у кого уже есть строка прогресса
+    """
+    if user_ids is None:
+        user_ids = list(QuestionnaireProgress.objects.filter(questionnaire=questionnaire_id)
+                        .values_list('user', flat=True))
+    answered = dict.fromkeys(user_ids, 0)
+    for i in range(0, len(user_ids), CHUNK_SIZE):
+        answered.update(_answered_counts(questionnaire_id, user_ids[i:i + CHUNK_SIZE]))
+    _save(questionnaire_id, answered, replace=True)
+
+
+def completed(user):
+    """
+        Анкеты, на все вопросы которых пользователь ответил, подзапросом для filter/exclude
+    """
+    return (QuestionnaireProgress.objects.filter(user=user, answered_count__gte=F('question_count'))
+            .values('questionnaire'))
@@ -0,0 +1,135 @@
+"""
+    Удаление анкет и пройденных анкет без каскада Django.
+
+    delete() модели собирает все зависимые строки в память и удаляет их одной транзакцией, на популярной
+    анкете это держит блокировку записи SQLite все время удаления. Поэтому QuestionnaireViewSet только
+    отмечает анкету deleted_at, и она сразу скрыта из всех представлений. Строки удаляет purge_questionnaire:
+    таблицы проходятся от зависимых к самой анкете, каждая пачка - отдельный DELETE ... WHERE pk IN
+    (SELECT pk ... LIMIT batch_size) в своей короткой транзакции. Шаг удаляет только то, что осталось,
+    поэтому после сбоя purge_pending просто продолжает с тех строк, что еще есть.
+"""
+import os
+import time
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from poll import db
+from questionnaire.models import *
+
+
+def _steps(questionnaire_pk):
+    """
+        (имя, queryset) в порядке удаления: сначала строки, которые ссылаются на следующие
+    """
+    return (
+        ('answer_options', AnswerOption.objects.filter(questionnaire=questionnaire_pk)),
+        ('answer_documents', AnswerDocument.objects.filter(answer_questionnaire__questionnaire=questionnaire_pk)),
+        ('answer_questions', AnswerQuestion.objects.filter(questionnaire=questionnaire_pk)),
+        ('progress', QuestionnaireProgress.objects.filter(questionnaire=questionnaire_pk)),
+        ('answer_questionnaires', AnswerQuestionnaire.objects.filter(questionnaire=questionnaire_pk)),
+        ('option_results', OptionResult.objects.filter(option__question__questionnaire=questionnaire_pk)),
+        ('question_results', QuestionResult.objects.filter(question__questionnaire=questionnaire_pk)),
+        ('options', Option.objects.filter(question__questionnaire=questionnaire_pk)),
+        ('questions', Question.objects.filter(questionnaire=questionnaire_pk)),
+        ('snapshots', QuestionnaireSnapshot.objects.filter(questionnaire=questionnaire_pk)),
+        ('questionnaire', Questionnaire.objects.filter(pk=questionnaire_pk)),
+    )
+
+
+def delete_rows(queryset, limit=None):
+    """
+        Удалить строки queryset одним DELETE по подзапросу pk, не больше limit. Без сигналов и каскада:
+        зависимые строки должны быть удалены раньше. Возвращает число удаленных
+    """
+    model = queryset.model
+    using = router.db_for_write(model)
+    connection = connections[using]
+    queryset = queryset.using(using).order_by().values('pk')
+    if limit is not None:
+        queryset = queryset[:limit]
+    sql, params = queryset.query.sql_with_params()
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {0} WHERE {1} IN ({2})'.format(
+            quote(model._meta.db_table), quote(model._meta.pk.column), sql), params)
+        return cursor.rowcount
+
+
+@db.retry_on_locked
+def _delete_batch(queryset, batch_size):
+    with transaction.atomic(using=router.db_for_write(queryset.model)):
+        return delete_rows(queryset, batch_size)
+
+
+def delete_in_batches(queryset, batch_size=1000, pause=0.0, progress=None):
+    """
+        Удалить строки queryset пачками по batch_size, каждая в своей транзакции, с паузой pause секунд
+        между ними. progress(deleted) вызывается после каждой непустой пачки. Возвращает число удаленных
+    """
+    total = 0
+    while True:
+        deleted = _delete_batch(queryset, batch_size)
+        total += deleted
+        if deleted and progress is not None:
+            progress(total)
+        if deleted < batch_size:
+            return total
+        if pause:
+            time.sleep(pause)
+
+
+def delete_answer_questionnaires(pks):
+    """
+        Удалить пройденные анкеты pks с ответами. Выполняется внутри транзакции вызывающего, итоги
+        results нужно вычесть до удаления
+    """
+    delete_rows(AnswerOption.objects.filter(answer_question__answer_questionnaire__in=pks))
+    delete_rows(AnswerDocument.objects.filter(answer_questionnaire__in=pks))
+    delete_rows(AnswerQuestion.objects.filter(answer_questionnaire__in=pks))
+    return delete_rows(AnswerQuestionnaire.objects.filter(pk__in=pks))
+
+
+def mark_deleted(questionnaire):
+    """
+        Скрыть анкету из API. Сохранение сбрасывает кэш определения и метаданных, см. signals.py
+    """
+    questionnaire.deleted_at = timezone.now()
+    questionnaire.save(update_fields=['deleted_at'])
+
+
+def purge_questionnaire(questionnaire_pk, batch_size=1000, pause=0.0, progress=None):
+    """
+        Удалить строки анкеты пачками по batch_size с паузой pause секунд между ними.
+        progress(step, deleted) вызывается после каждой пачки с числом удаленных на шаге строк.
+        Возвращает {шаг: удалено}
+    """
+    from questionnaire import analytics, archive
+
+    progress = progress or (lambda step, deleted: None)
+    counts = {}
+    for step, queryset in _steps(questionnaire_pk):
+        counts[step] = delete_in_batches(queryset, batch_size, pause,
+                                         lambda deleted, step=step: progress(step, deleted))
+    for path in (analytics.get_path(questionnaire_pk), archive.get_path(questionnaire_pk)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return counts
+
+
+def get_pending():
+    return list(Questionnaire.objects.filter(deleted_at__isnull=False).order_by('deleted_at', 'pk')
+                .values_list('pk', flat=True))
+
+
+def purge_pending(batch_size=1000, pause=0.0, progress=None):
+    """
+        Удалить все отмеченные анкеты, в том числе недоудаленные прошлым запуском.
+        progress(questionnaire_pk, step, deleted). Возвращает {questionnaire_pk: {шаг: удалено}}
+    """
+    progress = progress or (lambda questionnaire_pk, step, deleted: None)
+    return {pk: purge_questionnaire(pk, batch_size, pause,
+                                    lambda step, deleted, pk=pk: progress(pk, step, deleted))
+            for pk in get_pending()}
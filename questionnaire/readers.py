@@ -0,0 +1,127 @@
+"""
+    Быстрое чтение для GET: вывод собирается из строк values_list(named=True) по плану полей,
+    без моделей и без ModelSerializer на каждый объект и каждый вложенный список.
+
+    План строится один раз на класс сериализатора и его флаги (noexpand, noparent) по полям настоящего
+    сериализатора, поэтому вывод совпадает с ним байт в байт. Вложенные списки читаются тем же
+    запросом, что и prefetch_related: все поля модели с отбором по ключу родителя, порядок строк тот же.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import QuerySet
+from rest_framework import fields, relations, serializers
+
+_plans = {}
+
+
+def rows(queryset, *extra):
+    """
+        Строки queryset со всеми полями модели по attname и полями extra.
+        Строка читается как модель: row.pk_attname, row.user_id
+    """
+    columns = [field.attname for field in queryset.model._meta.concrete_fields]
+    return queryset.prefetch_related(None).values_list(*columns, *extra, named=True)
+
+
+def _is_plain(field):
+    # Поля, у которых to_representation возвращает значение из базы без изменений
+    if type(field) in (fields.IntegerField, fields.CharField, relations.PrimaryKeyRelatedField):
+        return True
+    return type(field) is fields.ChoiceField and all(type(key) is int for key in field.choices)
+
+
+class Plan(object):
+    """
+        Поля сериализатора: (имя, номер колонки в строке, to_representation или None) и вложенные списки
+    """
+
+    def __init__(self, serializer):
+        model = serializer.Meta.model
+        opts = model._meta
+        self.model = model
+        self.columns = [field.attname for field in opts.concrete_fields]
+        self.pk_index = self.columns.index(opts.pk.attname)
+        self.complete = None
+        if type(serializer).to_representation is not serializers.ModelSerializer.to_representation:
+            # Доработку вывода сериализатор должен уметь делать и для строки
+            self.complete = getattr(serializer, 'complete', None)
+            if self.complete is None:
+                raise ImproperlyConfigured('{0} overrides to_representation without complete()'.format(
+                    type(serializer).__name__))
+
+        self.fields = []
+        self.nested = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                relation = opts.get_field(field.source)
+                self.nested.append((name, Plan(field.child), relation.field.attname))
+                self.fields.append((name, None, None))
+                continue
+            if isinstance(field, (serializers.BaseSerializer, relations.RelatedField)) and \
+                    not isinstance(field, relations.PrimaryKeyRelatedField):
+                raise ImproperlyConfigured('Field {0}.{1} is not supported'.format(type(serializer).__name__, name))
+            attname = opts.pk.attname if field.source == 'pk' else opts.get_field(field.source).attname
+            to_representation = None if _is_plain(field) else field.to_representation
+            self.fields.append((name, self.columns.index(attname), to_representation))
+
+    def load(self, fk, pks):
+        """
+            Вывод по строкам модели плана с ключом родителя fk: {pk родителя: [dict]}
+        """
+        grouped = {pk: [] for pk in pks}
+        if pks:
+            for row in rows(self.model.objects.filter(**{fk + '__in': pks})):
+                grouped[getattr(row, fk)].append(row)
+        data = iter(self.represent([row for group in grouped.values() for row in group]))
+        return {pk: [next(data) for row in group] for pk, group in grouped.items()}
+
+    def represent(self, rows_list):
+        nested = {}
+        if self.nested:
+            pks = [row[self.pk_index] for row in rows_list]
+            for name, plan, fk in self.nested:
+                nested[name] = plan.load(fk, pks)
+
+        result = []
+        for row in rows_list:
+            data = {}
+            for name, index, to_representation in self.fields:
+                if index is None:
+                    data[name] = nested[name][row[self.pk_index]]
+                    continue
+                value = row[index]
+                data[name] = value if to_representation is None or value is None else to_representation(value)
+            if self.complete is not None:
+                data = self.complete(row, data)
+            result.append(data)
+        return result
+
+
+def get_plan(serializer_class, **kwargs):
+    """
+        План для serializer_class(**kwargs), строится один раз
+    """
+    key = (serializer_class, tuple(sorted(kwargs.items())))
+    plan = _plans.get(key)
+    if plan is None:
+        plan = _plans[key] = Plan(serializer_class(**kwargs))
+    return plan
+
+
+class ReadSerializer(object):
+    """
+        Замена сериализатора для чтения: .data по плану для строки, списка строк или queryset
+    """
+
+    def __init__(self, plan, instance, many=False):
+        self.plan = plan
+        self.instance = instance
+        self.many = many
+
+    @property
+    def data(self):
+        if not self.many:
+            return self.plan.represent([self.instance])[0]
+        instance = rows(self.instance) if isinstance(self.instance, QuerySet) else self.instance
+        return self.plan.represent(list(instance))
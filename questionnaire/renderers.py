@@ -0,0 +1,84 @@
+import csv
+import io
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+def _load_orjson():
+    """
+        orjson с опциями, которые нужны FastJSONRenderer: OPT_PASSTHROUGH_DATETIME (3.3) и OPT_NON_STR_KEYS (3.4).
+        Без orjson или со старой версией кодирует стандартный json
+    """
+    try:
+        import orjson
+    except ImportError:
+        return None
+    if not all(hasattr(orjson, name) for name in ('OPT_PASSTHROUGH_DATETIME', 'OPT_NON_STR_KEYS')):
+        return None
+    return orjson
+
+
+orjson = _load_orjson()
+
+
+class CSVRenderer(BaseRenderer):
+    """
+        Формат ?format=csv. Выгрузка отдается потоком, сюда попадают только ответы с ошибками
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, dict):
+            data = [data]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if data:
+            writer.writerow(data[0].keys())
+            for item in data:
+                writer.writerow(item.values())
+        return buffer.getvalue().encode(self.charset)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+        Формат ?format=ndjson: по одному JSON объекту на строку
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, dict):
+            data = [data]
+        return ''.join(json.dumps(item, ensure_ascii=False) + '\n' for item in data).encode(self.charset)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+        JSON по умолчанию: orjson, если установлен, иначе json с компактными разделителями.
+        Вывод совпадает с JSONRenderer, отступы (?indent, браузерный API) рендерит JSONRenderer
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super(FastJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+        if orjson is not None:
+            # Даты, время и ключи не-строки кодируются так же, как в JSONEncoder DRF
+            ret = orjson.dumps(data, default=self.encoder_class().default,
+                               option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+        else:
+            ret = json.dumps(data, cls=self.encoder_class, ensure_ascii=False, allow_nan=not self.strict,
+                             separators=(',', ':')).encode()
+        # Как в JSONRenderer: U+2028 и U+2029 недопустимы в JavaScript строках
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
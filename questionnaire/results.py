@@ -0,0 +1,207 @@
+"""
+    Итоги анкет: счетчики ответов по вариантам и вопросам.
+
+    Счетчики обновляются инкрементально в той же транзакции, что и запись ответов.
+    Строка ответа передается кортежем (question_id, answer_question_id, option_id).
+    Перенос ответов в архив счетчики не меняет, полный пересчет читает и архив, см. archive.py.
+    Счетчики ведутся только для вопросов с вариантами: у текстовых вопросов в итогах нет answer_count
+    и respondent_count, а не нули.
+
+    Кроме представлений API счетчики ведут: удаление пройденной анкеты через ORM (админка, каскад от
+    пользователя) - сигнал pre_delete в signals.py, удаление ответов и вариантов в админке - admin.py.
+    Вариант с ответами нельзя перенести в другой вопрос, см. OptionSerializer. Изменения в обход ORM
+    (SQL, QuerySet.update строк ответов) счетчики не видят, после них нужен rebuild_results.
+
+    Вычитание удаленных ответов также увеличивает Questionnaire.answer_deletions, см. analytics.py.
+"""
+from collections import Counter
+
+from django.db.models import Count, F
+
+from questionnaire import archive
+from questionnaire.models import *
+
+
+def _update(model, field, deltas):
+    # Один UPDATE на каждое значение приращения, обычно это 1 или -1
+    pks_by_delta = {}
+    for pk, delta in deltas.items():
+        if delta:
+            pks_by_delta.setdefault(delta, []).append(pk)
+    for delta, pks in pks_by_delta.items():
+        model.objects.filter(pk__in=pks).update(**{field: F(field) + delta})
+
+
+def _apply(rows, sign, respondent_deltas):
+    option_deltas = Counter()
+    question_deltas = Counter()
+    for question_id, answer_question_id, option_id in rows:
+        option_deltas[option_id] += sign
+        question_deltas[question_id] += sign
+
+    if sign > 0:
+        # При вычитании строк счетчиков может уже не быть: они удалены каскадом вместе с вариантом или вопросом
+        OptionResult.objects.bulk_create([OptionResult(option_id=pk) for pk in option_deltas], ignore_conflicts=True)
+        QuestionResult.objects.bulk_create([QuestionResult(question_id=pk) for pk in question_deltas],
+                                           ignore_conflicts=True)
+    _update(OptionResult, 'answer_count', option_deltas)
+    _update(QuestionResult, 'answer_count', question_deltas)
+    _update(QuestionResult, 'respondent_count', respondent_deltas)
+
+
+def _option_counts(answer_question_ids):
+    return dict(AnswerOption.objects.filter(answer_question__in=answer_question_ids)
+                .values_list('answer_question').annotate(Count('pk')).order_by())
+
+
+def count_answer_options(rows, new_answer_questions=False):
+    """
+        Учесть добавленные варианты ответа. Вызывается после вставки.
+        new_answer_questions - ответы на вопросы созданы вместе с вариантами, других вариантов у них нет
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    added = Counter(answer_question_id for question_id, answer_question_id, option_id in rows)
+    counts = added if new_answer_questions else _option_counts(added)
+    # Вопрос получил ответившего, если все его варианты добавлены сейчас
+    respondent_deltas = Counter()
+    for question_id, answer_question_id in {(row[0], row[1]) for row in rows}:
+        if counts.get(answer_question_id, 0) == added[answer_question_id]:
+            respondent_deltas[question_id] += 1
+    _apply(rows, 1, respondent_deltas)
+
+
+def discount_answer_options(rows):
+    """
+        Вычесть удаленные варианты ответа. Вызывается после удаления
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    counts = _option_counts({answer_question_id for question_id, answer_question_id, option_id in rows})
+    respondent_deltas = Counter()
+    for question_id, answer_question_id in {(row[0], row[1]) for row in rows}:
+        if not counts.get(answer_question_id):
+            respondent_deltas[question_id] -= 1
+    _apply(rows, -1, respondent_deltas)
+    _count_deletion(Questionnaire.objects.filter(questions__in={row[0] for row in rows}))
+
+
+def discount_answer_questionnaire(answer_questionnaire):
+    """
+        Вычесть все ответы пройденной анкеты. Вызывается до каскадного удаления
+    """
+    rows = list(AnswerOption.objects.filter(answer_question__answer_questionnaire=answer_questionnaire)
+                .values_list('answer_question__question', 'answer_question', 'option'))
+    respondent_deltas = Counter({question_id: -1 for question_id, answer_question_id in
+                                 {(row[0], row[1]) for row in rows}})
+    _apply(rows, -1, respondent_deltas)
+    _count_deletion(Questionnaire.objects.filter(pk=answer_questionnaire.questionnaire_id))
+
+
+def _count_deletion(questionnaires):
+    questionnaires.update(answer_deletions=F('answer_deletions') + 1)
+
+
+def recount(questionnaire=None):
+    """
+        Полный пересчет по таблице ответов. Возвращает словари {option_pk: answer_count}
+        и {question_pk: (answer_count, respondent_count)} с нулями для вопросов и вариантов без ответов
+    """
+    options = Option.objects.filter(question__question_type__in=(QT_CHOICES, QT_MULTI_CHOICES))
+    answer_options = AnswerOption.objects.all()
+    if questionnaire is not None:
+        options = options.filter(question__questionnaire=questionnaire)
+        answer_options = answer_options.filter(questionnaire=questionnaire)
+    watermarks = archive.get_watermarks(questionnaire)
+    for questionnaire_pk, watermark in watermarks.items():
+        # Строки, которые уже в архиве, но еще не удалены из базы
+        answer_options = answer_options.exclude(questionnaire=questionnaire_pk,
+                                                answer_question__answer_questionnaire__lte=watermark)
+
+    option_counts = dict.fromkeys(options.values_list('pk', flat=True), 0)
+    question_counts = dict.fromkeys(options.values_list('question', flat=True).distinct(), (0, 0))
+    option_counts.update(answer_options.values_list('option').annotate(Count('pk')).order_by())
+    question_counts.update(
+        (question_id, (answer_count, respondent_count)) for question_id, answer_count, respondent_count in
+        answer_options.values_list('answer_question__question').order_by()
+        .annotate(Count('pk'), Count('answer_question', distinct=True)))
+    for questionnaire_pk in watermarks:
+        _add_archived(questionnaire_pk, option_counts, question_counts)
+    return option_counts, question_counts
+
+
+def _add_archived(questionnaire_pk, option_counts, question_counts):
+    answer_counts = Counter()
+    respondents = {}
+    for row in archive.iter_rows(questionnaire_pk):
+        answer, question_id, option_id = row[0], row[3], row[6]
+        if option_id in option_counts:
+            option_counts[option_id] += 1
+            answer_counts[question_id] += 1
+            respondents.setdefault(question_id, set()).add(answer)
+    for question_id, answer_count in answer_counts.items():
+        # Вопрос с ответами только в архиве может не иметь строки в question_counts
+        stored_count, stored_respondents = question_counts.get(question_id, (0, 0))
+        question_counts[question_id] = (stored_count + answer_count, stored_respondents + len(respondents[question_id]))
+
+
+def stored(questionnaire=None):
+    """
+        Текущие значения счетчиков в том же виде, что и recount
+    """
+    options = Option.objects.filter(question__question_type__in=(QT_CHOICES, QT_MULTI_CHOICES))
+    if questionnaire is not None:
+        options = options.filter(question__questionnaire=questionnaire)
+    option_counts = {pk: answer_count or 0 for pk, answer_count in
+                     options.values_list('pk', 'result__answer_count')}
+    question_counts = {pk: (answer_count or 0, respondent_count or 0) for pk, answer_count, respondent_count in
+                       Question.objects.filter(pk__in=options.values('question'))
+                           .values_list('pk', 'result__answer_count', 'result__respondent_count')}
+    return option_counts, question_counts
+
+
+def rebuild(questionnaire=None):
+    """
+        Пересоздать счетчики по полному пересчету
+    """
+    option_counts, question_counts = recount(questionnaire)
+    option_results = OptionResult.objects.all()
+    question_results = QuestionResult.objects.all()
+    if questionnaire is not None:
+        option_results = option_results.filter(option__question__questionnaire=questionnaire)
+        question_results = question_results.filter(question__questionnaire=questionnaire)
+    option_results.delete()
+    question_results.delete()
+    OptionResult.objects.bulk_create([OptionResult(option_id=pk, answer_count=answer_count)
+                                      for pk, answer_count in option_counts.items()], batch_size=500)
+    QuestionResult.objects.bulk_create([QuestionResult(question_id=pk, answer_count=answer_count,
+                                                       respondent_count=respondent_count)
+                                        for pk, (answer_count, respondent_count) in question_counts.items()],
+                                       batch_size=500)
+
+
+def get_results(questionnaire):
+    """
+        Итоги анкеты: два запроса, время пропорционально числу вариантов, а не ответов
+    """
+    questions = []
+    by_pk = {}
+    for pk, name, question_type, answer_count, respondent_count in (
+            Question.objects.filter(questionnaire=questionnaire).order_by('pk')
+            .values_list('pk', 'name', 'question_type', 'result__answer_count', 'result__respondent_count')):
+        question = {'pk': pk, 'name': name, 'question_type': question_type}
+        # Текстовые ответы не считаются, см. описание модуля
+        if question_type != QT_TEXT:
+            question.update(answer_count=answer_count or 0, respondent_count=respondent_count or 0, options=[])
+        by_pk[pk] = question
+        questions.append(question)
+
+    for pk, question_id, option, answer_count in (
+            Option.objects.filter(question__questionnaire=questionnaire).order_by('pk')
+            .values_list('pk', 'question', 'option', 'result__answer_count')):
+        if 'options' in by_pk[question_id]:
+            by_pk[question_id]['options'].append({'pk': pk, 'option': option, 'answer_count': answer_count or 0})
+
+    return {'pk': questionnaire.pk, 'name': questionnaire.name, 'questions': questions}
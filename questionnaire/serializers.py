@@ -1,6 +1,9 @@
+import datetime
+
 from rest_framework import serializers
 # from .models import *
 from .models import *
+from . import cache, documents, progress, results, snapshots
 from django.db import transaction
 
 class OptionSerializer(serializers.ModelSerializer):
@@ -15,12 +18,18 @@ class OptionSerializer(serializers.ModelSerializer):
     def validate(self, data):
         if data['question'].question_type == QT_TEXT:
             raise serializers.ValidationError("Question type not for options. Only text.")
+        # Ответы с вариантом остались бы у ответов на прежний вопрос, итоги обоих вопросов разошлись бы
+        if (self.instance is not None and data['question'].pk != self.instance.question_id and
+                AnswerOption.objects.filter(option=self.instance).exists()):
+            raise serializers.ValidationError("Option pk {0} has answers and cannot be moved to another "
+                                              "Question".format(self.instance.pk))
 
         return data
 
     class Meta:
         model = Option
         fields = ('pk', 'option', 'question')
+        extra_kwargs = {'question': {'queryset': Question.objects.filter(questionnaire__deleted_at__isnull=True)}}
 
 
 class QuestionSerializer(serializers.ModelSerializer):
@@ -40,6 +49,7 @@ class QuestionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Question
         fields = ('pk', 'name', 'question_type', 'questionnaire', 'options')
+        extra_kwargs = {'questionnaire': {'queryset': Questionnaire.objects.filter(deleted_at__isnull=True)}}
 
 
 class QuestionnaireSerializer(serializers.ModelSerializer):
@@ -57,6 +67,16 @@ class QuestionnaireSerializer(serializers.ModelSerializer):
         fields = ('pk', 'name', 'date_begin', 'date_end', 'description', 'questions')
 
 
+def check_open(questionnaire):
+    """
+        Ответы принимаются до date_end анкеты включительно. Ответы закрытой анкеты переносит в архив
+        archive.py, запись в них после закрытия разошлась бы с архивом и счетчиками итогов
+    """
+    if questionnaire.date_end < datetime.date.today():
+        raise serializers.ValidationError("Questionnaire pk {0} is closed since {1}".format(
+            questionnaire.pk, questionnaire.date_end))
+
+
 class AnswerOptionSerializer(serializers.ModelSerializer):
     def __init__(self, *args, **kwargs):
         noparent = kwargs.pop('noparent', None)
@@ -68,20 +88,23 @@ class AnswerOptionSerializer(serializers.ModelSerializer):
         if data['answer_question'].question_type == QT_TEXT:
             raise serializers.ValidationError("Question type not for Option. Only Text.")
 
-        if not AnswerQuestionnaire.objects.filter(pk=data['answer_question'].answer_questionnaire.pk, user=self.context['request'].user).exists():
-            raise serializers.ValidationError("No AnswerQuestionnaire pk {0} for this User".format(data['answer_question'].answer_questionnaire.pk))
+        if data['answer_question'].user_id != self.context['request'].user.pk:
+            raise serializers.ValidationError("No AnswerQuestionnaire pk {0} for this User".format(data['answer_question'].answer_questionnaire_id))
 
-        if not Option.objects.filter(question=data['answer_question'].question.pk, pk=data['option'].pk).exists():
-            raise serializers.ValidationError("Invalid Option pk {0} for Question pk {1}".format(data['option'].pk,data['answer_question'].question.pk ))
+        if data['option'].question_id != data['answer_question'].question_id:
+            raise serializers.ValidationError("Invalid Option pk {0} for Question pk {1}".format(data['option'].pk,data['answer_question'].question_id ))
 
         if data['answer_question'].question_type == QT_CHOICES:
             if AnswerOption.objects.filter(answer_question=data['answer_question'].pk).exists():
                 raise serializers.ValidationError("Question type for only 1 options")
+        check_open(data['answer_question'].questionnaire)
         return data
 
     class Meta:
         model = AnswerOption
         fields = ('pk', 'answer_question', 'option')
+        extra_kwargs = {'answer_question': {
+            'queryset': AnswerQuestion.objects.filter(questionnaire__deleted_at__isnull=True)}}
 
 
 # Общий Serializer для AnswerQuestion
@@ -124,6 +147,21 @@ class AnswerQuestionOptionSerializer(serializers.ModelSerializer):
 
 
 
+def merge_unanswered(questionnaire_pk, answer_questions):
+    """
+        Добавить к ответам вопросы анкеты без ответа с pk None, в порядке вопросов анкеты.
+        Вопросы берутся из кэша метаданных анкеты
+    """
+    questions = get_metadata(questionnaire_pk) or {}
+    answered = {answer_question['question'] for answer_question in answer_questions}
+    merged = list(answer_questions)
+    merged.extend({'pk': None, 'question': question_pk, 'text': None, 'question_type': question_type,
+                   'answer_options': []}
+                  for question_pk, (question_type, option_pks) in questions.items() if question_pk not in answered)
+    merged.sort(key=lambda answer_question: answer_question['question'])
+    return merged
+
+
 class AnswerQuestionnaireSerializer(serializers.ModelSerializer):
     answer_questions = AnswerQuestionSerializer(many=True, noparent=True, read_only=True)
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
@@ -134,21 +172,259 @@ class AnswerQuestionnaireSerializer(serializers.ModelSerializer):
         if noexpand:
             self.fields.pop('answer_questions')
 
+    def validate_questionnaire(self, value):
+        check_open(value)
+        return value
+
     def create(self, validated_data):
+        # Создается только сама анкета, ответы на вопросы появляются при первом ответе, см. AnswerUpsertSerializer
+        validated_data['snapshot_version'] = snapshots.get_latest_version(validated_data['questionnaire'])
         with transaction.atomic():
-            answer_questionnaire = super(AnswerQuestionnaireSerializer, self).create(validated_data)
-            questions = Question.objects.filter(questionnaire=answer_questionnaire.questionnaire)
-            AnswerQuestion.objects.bulk_create([AnswerQuestion(answer_questionnaire=answer_questionnaire, question=question,
-                                                               question_type=question.question_type) for question in
-                                                questions])
-            AnswerOption.objects.bulk_create([AnswerOption(answer_questionnaire=answer_questionnaire, question=question,
-                                                           question_type=question.question_type) for question in
-                                              questions])
-        return answer_questionnaire
+            instance = super(AnswerQuestionnaireSerializer, self).create(validated_data)
+            documents.save([instance.pk])
+        return instance
+
+    def to_representation(self, instance):
+        return self.complete(instance, super(AnswerQuestionnaireSerializer, self).to_representation(instance))
+
+    def complete(self, instance, data):
+        # instance - модель или строка values_list быстрого чтения, см. readers.py
+        if 'answer_questions' in data:
+            data['answer_questions'] = merge_unanswered(instance.questionnaire_id, data['answer_questions'])
+        return data
 
     class Meta:
         model = AnswerQuestionnaire
-        fields = ('pk', 'questionnaire', 'created_at', 'user', 'answer_questions')
+        fields = ('pk', 'questionnaire', 'created_at', 'user', 'snapshot_version', 'answer_questions')
+        extra_kwargs = {'questionnaire': {'queryset': Questionnaire.objects.filter(deleted_at__isnull=True)}}
+
+
+class AnswerSubmitItemSerializer(serializers.Serializer):
+    question = serializers.IntegerField(help_text='Вопрос')
+    text = serializers.CharField(max_length=256, required=False, allow_null=True, allow_blank=True, help_text='Ответ')
+    options = serializers.ListField(child=serializers.IntegerField(), required=False, default=[],
+                                    help_text='Выбранные варианты')
+
+
+def load_questions(questionnaire_pk):
+    """
+        Вопросы анкеты для проверки ответов: {question_pk: (question_type, {option_pk})}
+    """
+    questions = {pk: (question_type, set()) for pk, question_type in
+                 Question.objects.filter(questionnaire=questionnaire_pk).values_list('pk', 'question_type')}
+    options = Option.objects.filter(question__questionnaire=questionnaire_pk).values_list('pk', 'question')
+    for pk, question_id in options:
+        questions[question_id][1].add(pk)
+    return questions
+
+
+def load_metadata(questionnaire_pk):
+    """
+        load_questions для кэша cache.get_metadata. False, а не None: отсутствие анкеты тоже кэшируется
+    """
+    if not Questionnaire.objects.filter(pk=questionnaire_pk, deleted_at__isnull=True).exists():
+        return False
+    return load_questions(questionnaire_pk)
+
+
+def get_metadata(questionnaire_pk):
+    return cache.get_metadata(questionnaire_pk, lambda: load_metadata(questionnaire_pk))
+
+
+def check_answer(answer, question_type, valid_pks):
+    """
+        Ошибка в ответе на вопрос типа question_type с вариантами valid_pks или None
+    """
+    option_pks = answer.get('options') or []
+    if question_type == QT_TEXT and option_pks:
+        return "Question type not for options. Only text."
+    if question_type != QT_TEXT and answer.get('text'):
+        return "Question type not for text. Only Option."
+    if question_type == QT_CHOICES and len(option_pks) > 1:
+        return "Question type for only 1 options."
+    if len(set(option_pks)) != len(option_pks):
+        return "Duplicate options for Question pk {0}".format(answer['question'])
+    invalid_pks = [pk for pk in option_pks if pk not in valid_pks]
+    if invalid_pks:
+        return "Invalid Option pk {0} for Question pk {1}".format(', '.join(str(pk) for pk in invalid_pks),
+                                                                  answer['question'])
+    # Ответ на вопрос считается в прогрессе, поэтому пустой ответ не создается
+    if not answer.get('text') and not option_pks:
+        return "Empty answer for Question pk {0}. Send text or options.".format(answer['question'])
+    return None
+
+
+# Serializer для прохождения всей анкеты одним запросом
+class AnswerSubmitSerializer(serializers.Serializer):
+    questionnaire = serializers.PrimaryKeyRelatedField(queryset=Questionnaire.objects.filter(deleted_at__isnull=True),
+                                                       help_text='Анкета')
+    answers = AnswerSubmitItemSerializer(many=True)
+
+    def get_questions(self, questionnaire):
+        # При записи пачкой из очереди вопросы каждой анкеты читаются из базы один раз через context['questions'],
+        # иначе берутся из кэша метаданных, который сбрасывается при изменении анкеты
+        loaded = self.context.get('questions')
+        if loaded is None:
+            return get_metadata(questionnaire.pk)
+        if questionnaire.pk not in loaded:
+            loaded[questionnaire.pk] = load_questions(questionnaire.pk)
+        return loaded[questionnaire.pk]
+
+    def check_questionnaire(self, questionnaire):
+        check_open(questionnaire)
+
+    def validate(self, data):
+        self.check_questionnaire(data['questionnaire'])
+        # Все вопросы и варианты анкеты загружаются один раз, проверка ответов идет в памяти
+        questionnaire_pk = getattr(data['questionnaire'], 'pk', data['questionnaire'])
+        questions = self.get_questions(data['questionnaire'])
+        errors = {}
+        seen = set()
+        for answer in data['answers']:
+            question_type, valid_pks = questions.get(answer['question'], (None, None))
+            if question_type is None:
+                error = "Invalid Question pk {0} for Questionnaire pk {1}".format(answer['question'], questionnaire_pk)
+            elif answer['question'] in seen:
+                error = "Duplicate answer for Question pk {0}".format(answer['question'])
+            else:
+                error = check_answer(answer, question_type, valid_pks)
+            if error:
+                errors.setdefault(str(answer['question']), []).append(error)
+            else:
+                seen.add(answer['question'])
+                answer['question_type'] = question_type
+
+        if errors:
+            raise serializers.ValidationError({'answers': errors})
+        return data
+
+    def create(self, validated_data):
+        return self.save_answers([validated_data])[0]
+
+    @staticmethod
+    def save_answers(submissions):
+        """
+            Записать пройденные анкеты одной транзакцией: INSERT на каждую анкету и общие bulk_create
+            ответов и вариантов. submissions - проверенные данные с user и необязательным submission_key
+        """
+        versions = {}
+        answer_questionnaires = []
+        with transaction.atomic():
+            for data in submissions:
+                questionnaire = data['questionnaire']
+                if questionnaire.pk not in versions:
+                    versions[questionnaire.pk] = snapshots.get_latest_version(questionnaire)
+                answer_questionnaires.append(AnswerQuestionnaire.objects.create(
+                    questionnaire=questionnaire, user=data['user'], submission_key=data.get('submission_key'),
+                    snapshot_version=versions[questionnaire.pk]))
+            AnswerQuestion.objects.bulk_create([AnswerQuestion(answer_questionnaire=answer_questionnaire,
+                                                               question_id=answer['question'],
+                                                               question_type=answer['question_type'],
+                                                               text=answer.get('text') or None,
+                                                               user_id=answer_questionnaire.user_id,
+                                                               questionnaire_id=answer_questionnaire.questionnaire_id)
+                                                for answer_questionnaire, data in zip(answer_questionnaires,
+                                                                                      submissions)
+                                                for answer in data['answers']])
+            # bulk_create на SQLite не возвращает pk, поэтому их приходится перечитать
+            # Диапазоном, а не списком pk: в пачке может быть больше анкет, чем параметров в запросе SQLite
+            answer_question_pks = {(answer_questionnaire_id, question_id): pk
+                                   for answer_questionnaire_id, question_id, pk in
+                                   AnswerQuestion.objects.filter(answer_questionnaire__gte=answer_questionnaires[0],
+                                                                 answer_questionnaire__lte=answer_questionnaires[-1])
+                                   .values_list('answer_questionnaire', 'question', 'pk')}
+            rows = []
+            answer_options = []
+            for answer_questionnaire, data in zip(answer_questionnaires, submissions):
+                for answer in data['answers']:
+                    answer_question_id = answer_question_pks[(answer_questionnaire.pk, answer['question'])]
+                    for option_pk in answer.get('options') or []:
+                        rows.append((answer['question'], answer_question_id, option_pk))
+                        answer_options.append(AnswerOption(answer_question_id=answer_question_id, option_id=option_pk,
+                                                           user_id=answer_questionnaire.user_id,
+                                                           questionnaire_id=answer_questionnaire.questionnaire_id))
+            AnswerOption.objects.bulk_create(answer_options)
+            results.count_answer_options(rows, new_answer_questions=True)
+            progress.count_answers([(answer_questionnaire.user_id, answer_questionnaire.questionnaire_id,
+                                     len(data['answers']))
+                                    for answer_questionnaire, data in zip(answer_questionnaires, submissions)])
+            documents.save([answer_questionnaire.pk for answer_questionnaire in answer_questionnaires])
+        return answer_questionnaires
+
+
+# Прохождение анкеты в очередь на запись: проверка по кэшу определения анкеты, без запросов к базе
+class AnswerEnqueueSerializer(AnswerSubmitSerializer):
+    questionnaire = serializers.IntegerField(help_text='Анкета')
+    submission_key = serializers.CharField(max_length=64, required=False,
+                                           help_text='Ключ идемпотентности, повтор с тем же ключом не создает дубль')
+
+    def get_questions(self, questionnaire_pk):
+        return get_metadata(questionnaire_pk)
+
+    def check_questionnaire(self, questionnaire_pk):
+        # Без запроса к базе: закрытую анкету отклонит проверка при записи из очереди, см. ingest.py
+        pass
+
+    def validate_questionnaire(self, value):
+        if self.get_questions(value) is False:
+            raise serializers.ValidationError('Invalid pk "{0}" - object does not exist.'.format(value))
+        return value
+
+
+# Ответ на один вопрос пройденной анкеты: ответ на вопрос создается при первом ответе и заменяется при следующих
+class AnswerUpsertSerializer(AnswerSubmitItemSerializer):
+    def validate(self, data):
+        answer_questionnaire = self.context['answer_questionnaire']
+        if answer_questionnaire.user_id != self.context['request'].user.pk:
+            raise serializers.ValidationError(
+                "No AnswerQuestionnaire pk {0} for this User".format(answer_questionnaire.pk))
+        check_open(answer_questionnaire.questionnaire)
+        questions = get_metadata(answer_questionnaire.questionnaire_id) or {}
+        question_type, valid_pks = questions.get(data['question'], (None, None))
+        if question_type is None:
+            raise serializers.ValidationError("Invalid Question pk {0} for Questionnaire pk {1}".format(
+                data['question'], answer_questionnaire.questionnaire_id))
+        error = check_answer(data, question_type, valid_pks)
+        if error:
+            raise serializers.ValidationError(error)
+        data['question_type'] = question_type
+        return data
+
+    def create(self, validated_data):
+        answer_questionnaire = self.context['answer_questionnaire']
+        question_id = validated_data['question']
+        text = validated_data.get('text') or None
+        option_pks = validated_data.get('options') or []
+        with transaction.atomic():
+            answer_question, created = AnswerQuestion.objects.get_or_create(
+                answer_questionnaire=answer_questionnaire, question_id=question_id,
+                defaults={'question_type': validated_data['question_type'], 'text': text,
+                          'user_id': answer_questionnaire.user_id,
+                          'questionnaire_id': answer_questionnaire.questionnaire_id})
+            existing = set()
+            if not created:
+                if answer_question.text != text:
+                    answer_question.text = text
+                    answer_question.save(update_fields=['text'])
+                existing = set(answer_question.answer_options.values_list('option', flat=True))
+
+            removed = existing - set(option_pks)
+            if removed:
+                answer_question.answer_options.filter(option__in=removed).delete()
+                results.discount_answer_options([(question_id, answer_question.pk, pk) for pk in removed])
+            added = [pk for pk in option_pks if pk not in existing]
+            if added:
+                AnswerOption.objects.bulk_create([AnswerOption(answer_question=answer_question, option_id=pk,
+                                                               user_id=answer_questionnaire.user_id,
+                                                               questionnaire_id=answer_questionnaire.questionnaire_id)
+                                                  for pk in added])
+                results.count_answer_options([(question_id, answer_question.pk, pk) for pk in added],
+                                             new_answer_questions=not existing - removed)
+            if created:
+                progress.refresh(answer_questionnaire.questionnaire_id, [answer_questionnaire.user_id])
+            documents.save([answer_questionnaire.pk])
+        self.created = created
+        return answer_question
 
 
 # Не используется в текущей редакции
@@ -0,0 +1,56 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from poll import db
+from questionnaire import cache, documents, progress, results, snapshots
+from questionnaire.models import *
+
+
+@receiver([post_save, post_delete], sender=Questionnaire)
+def questionnaire_changed(sender, instance, **kwargs):
+    cache.invalidate(instance.pk)
+    snapshots.republish(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, **kwargs):
+    cache.invalidate(instance.questionnaire_id)
+    snapshots.republish(instance.questionnaire_id)
+
+
+@receiver(post_save, sender=Question)
+def question_created(sender, instance, created, **kwargs):
+    if created:
+        progress.refresh(instance.questionnaire_id)
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    # Ответы на вопрос удалены каскадом, отвеченных могло стать меньше
+    progress.refresh(instance.questionnaire_id)
+    documents.save_questionnaire(instance.questionnaire_id)
+
+
+@receiver([post_save, post_delete], sender=Option)
+def option_changed(sender, instance, **kwargs):
+    questionnaire_id = Question.objects.filter(pk=instance.question_id).values_list('questionnaire', flat=True).first()
+    if questionnaire_id is not None:
+        cache.invalidate(questionnaire_id)
+        snapshots.republish(questionnaire_id)
+
+
+@receiver(pre_delete, sender=AnswerQuestionnaire)
+def answer_questionnaire_deleting(sender, instance, **kwargs):
+    # Удаление через ORM: админка, каскад от пользователя. API удаляет без каскада и вычитает итоги само
+    results.discount_answer_questionnaire(instance)
+
+
+@receiver(post_save, sender=QuestionnaireSnapshot)
+def snapshot_published(sender, instance, created, **kwargs):
+    cache.invalidate(instance.questionnaire_id)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    db.configure_sqlite(connection)
@@ -0,0 +1,83 @@
+"""
+    Публикация анкет: определение анкеты один раз сериализуется в JSON, сжимается и сохраняется.
+    Чтение опубликованной анкеты отдает готовые байты без сериализатора и рендерера.
+"""
+import collections
+import gzip
+import hashlib
+
+from django.db import transaction
+from django.db.models import Max
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+from poll import compression
+from questionnaire.models import *
+
+Snapshot = collections.namedtuple('Snapshot', ('version', 'content_hash', 'data'))
+
+
+def render(questionnaire):
+    from questionnaire.serializers import QuestionnaireSerializer
+
+    questionnaire = Questionnaire.objects.prefetch_related('questions__options').get(pk=questionnaire.pk)
+    return JSONRenderer().render(QuestionnaireSerializer(questionnaire).data)
+
+
+def get_latest(questionnaire_pk):
+    row = (QuestionnaireSnapshot.objects.filter(questionnaire=questionnaire_pk, questionnaire__deleted_at=None)
+           .order_by('-version')
+           .values_list('version', 'content_hash', 'data').first())
+    if row is None:
+        return None
+    return Snapshot(row[0], row[1], bytes(row[2]))
+
+
+def get_latest_version(questionnaire_pk):
+    return QuestionnaireSnapshot.objects.filter(questionnaire=questionnaire_pk).aggregate(Max('version'))['version__max']
+
+
+def publish(questionnaire):
+    """
+        Сохранить новую версию, если определение изменилось с прошлой публикации
+    """
+    content = render(questionnaire)
+    content_hash = hashlib.sha256(content).hexdigest()
+    with transaction.atomic():
+        latest = (QuestionnaireSnapshot.objects.select_for_update().filter(questionnaire=questionnaire)
+                  .order_by('-version').values_list('version', 'content_hash').first())
+        if latest is not None and latest[1] == content_hash:
+            return latest[0], content_hash, False
+        version = latest[0] + 1 if latest is not None else 1
+        QuestionnaireSnapshot.objects.create(questionnaire=questionnaire, version=version, content_hash=content_hash,
+                                             data=gzip.compress(content, mtime=0))
+    return version, content_hash, True
+
+
+def republish(questionnaire_pk):
+    """
+        Переопубликовать измененную анкету после коммита. Несколько изменений в одной транзакции
+        дают одинаковый хеш и одну новую версию
+    """
+    def run():
+        questionnaire = Questionnaire.objects.filter(pk=questionnaire_pk, deleted_at=None).first()
+        if questionnaire is not None and QuestionnaireSnapshot.objects.filter(questionnaire=questionnaire).exists():
+            publish(questionnaire)
+
+    transaction.on_commit(run)
+
+
+def to_response(request, snapshot, etag=None):
+    # Сохраненные байты сжаты gzip, отдаются как есть, только если клиент принимает gzip с q > 0
+    if compression.get_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), ('gzip',)) == 'gzip':
+        response = HttpResponse(snapshot.data, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+        if etag:
+            response['ETag'] = 'W/' + etag
+    else:
+        response = HttpResponse(gzip.decompress(snapshot.data), content_type='application/json')
+        if etag:
+            response['ETag'] = etag
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -1,14 +1,24 @@
 import datetime
+import gzip
+import json
 
+from django.conf import settings
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.utils.decorators import method_decorator
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import viewsets, mixins
+from rest_framework import viewsets, mixins, status
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.filters import OrderingFilter
+from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
-from questionnaire import serializers
+from poll import compression, db
+from questionnaire import (analytics, cache, documents, export, ingest, progress, purge, readers, renderers,
+                           results, serializers, snapshots)
+from questionnaire.pagination import KeysetPagination
 from questionnaire.models import *
 from drf_yasg import openapi
 from drf_yasg.app_settings import swagger_settings
@@ -54,10 +64,82 @@ class NoPagingAutoSchema(NoTitleAutoSchema):
         return False
 
 
+class ExpandQuerysetMixin(object):
+    """
+        Queryset строится по полям, которые отрисует сериализатор:
+        вложенные связи подгружаются через prefetch_related, только если ответ не noexpand
+    """
+    expand_prefetch = ()
+    # Действия, которые не отдают вложенные данные сериализатора
+    plain_actions = ()
+
+    def is_expanded(self):
+        if self.action in self.plain_actions:
+            return False
+        # list без пагинации отдается с noexpand
+        return not (self.action == 'list' and self.paginator is None)
+
+    def get_queryset(self):
+        queryset = super(ExpandQuerysetMixin, self).get_queryset()
+        if self.is_expanded():
+            queryset = queryset.prefetch_related(*self.expand_prefetch)
+        return queryset
+
+
+class ReplicaReadMixin(object):
+    """
+        Действия только на чтение читают из реплик базы, если они настроены, см. poll/db.py
+    """
+    replica_actions = ('list', 'retrieve')
+
+    def dispatch(self, request, *args, **kwargs):
+        action = getattr(self, 'action_map', {}).get(request.method.lower())
+        with db.use_replica(action in self.replica_actions):
+            return super(ReplicaReadMixin, self).dispatch(request, *args, **kwargs)
+
+
+class FastReadMixin(object):
+    """
+        GET-действия fast_read_actions читают строки values_list вместо моделей и отдают их
+        по плану полей сериализатора, см. readers.py. Вывод тот же, что у сериализатора
+    """
+    fast_read_actions = ('list', 'retrieve')
+
+    def is_fast_read(self):
+        return (self.request.method == 'GET' and self.action in self.fast_read_actions and
+                not getattr(self, 'swagger_fake_view', False) and getattr(settings, 'FAST_READ_ENABLED', True))
+
+    def get_read_queryset(self):
+        queryset = self.get_queryset()
+        return readers.rows(queryset) if self.is_fast_read() else queryset
+
+    def get_object(self):
+        if not self.is_fast_read():
+            return super(FastReadMixin, self).get_object()
+        queryset = readers.rows(self.filter_queryset(self.get_queryset()))
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        obj = get_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    def paginate_queryset(self, queryset):
+        if self.is_fast_read():
+            queryset = readers.rows(queryset)
+        return super(FastReadMixin, self).paginate_queryset(queryset)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer_class = kwargs.pop('serializer_class', None) or self.get_serializer_class()
+        if args and self.is_fast_read():
+            many = kwargs.pop('many', False)
+            return readers.ReadSerializer(readers.get_plan(serializer_class, **kwargs), args[0], many)
+        kwargs['context'] = self.get_serializer_context()
+        return serializer_class(*args, **kwargs)
+
+
 @method_decorator(name='list', decorator=swagger_auto_schema(
     operation_description="Получить список анкет",
     filter_inspectors=[DjangoFilterDescriptionInspector], ))
-class QuestionnaireViewSet(viewsets.ModelViewSet):
+class QuestionnaireViewSet(ReplicaReadMixin, FastReadMixin, ExpandQuerysetMixin, viewsets.ModelViewSet):
     """
     create:
     Создать анкету
@@ -72,26 +154,139 @@ class QuestionnaireViewSet(viewsets.ModelViewSet):
     Изменить анкету
 
     destroy:
-    Удалить анкету
+    Удалить анкету: сразу скрывается, строки удаляет purge_questionnaires
+
+    results:
+    Получить итоги анкеты
+
+    export:
+    Выгрузить ответы анкеты
+
+    publish:
+    Опубликовать анкету
+
+    crosstab:
+    Получить перекрестную таблицу ответов на два вопроса
     """
-    queryset = Questionnaire.objects.all()
+    queryset = Questionnaire.objects.filter(deleted_at__isnull=True)
     serializer_class = serializers.QuestionnaireSerializer
+    expand_prefetch = ('questions__options',)
+    plain_actions = ('results', 'export', 'publish', 'crosstab')
+    fast_read_actions = ('list', 'retrieve', 'active')
     filter_backends = (DjangoFilterBackend, OrderingFilter)
     filterset_fields = ('name',)
     ordering_fields = ('date_begin', 'date_end')
     ordering = ('date_begin',)
+    lookup_value_regex = r'\d+'
 
     swagger_schema = NoTitleAutoSchema
 
+    def retrieve(self, request, pk=None):
+        # Определение анкеты читается из кэша, при совпадении If-None-Match база не запрашивается.
+        # Версия в кэше есть только у существующей анкеты, см. cache.get_version
+        version = cache.get_version(pk, create=False)
+        if version is not None:
+            etag = cache.get_etag(pk, version)
+            matched = compression.etag_matches(etag, request.META.get('HTTP_IF_NONE_MATCH', ''))
+            if matched:
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': matched})
+
+        definition, etag = cache.get_definition(pk, lambda: self.build_definition(pk))
+        if isinstance(definition, snapshots.Snapshot):
+            if request.accepted_renderer.format == 'json':
+                # Опубликованная анкета отдается готовыми байтами, минуя сериализатор и рендерер
+                return snapshots.to_response(request, definition, etag)
+            definition = json.loads(gzip.decompress(definition.data).decode())
+        return Response(definition, headers={'ETag': etag})
+
+    def build_definition(self, pk):
+        snapshot = snapshots.get_latest(pk)
+        if snapshot is not None:
+            return snapshot
+        return self.get_serializer(self.get_object()).data
+
+    @swagger_auto_schema(operation_description="Опубликовать анкету: сохранить готовый JSON определения",
+                         request_body=no_body)
+    @action(detail=True, methods=['post'])
+    def publish(self, request, pk=None):
+        version, content_hash, created = snapshots.publish(self.get_object())
+        return Response({'version': version, 'content_hash': content_hash},
+                        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
     @swagger_auto_schema(auto_schema=NoPagingAutoSchema, operation_description="Получить список активных анкет",
-                         filter_inspectors=[DjangoFilterDescriptionInspector])
+                         filter_inspectors=[DjangoFilterDescriptionInspector],
+                         manual_parameters=[openapi.Parameter('pending', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN,
+                                                              description='Только анкеты, на которые текущий '
+                                                                          'пользователь ответил не полностью')])
     @action(detail=False, methods=['get'])
     def active(self, request):
         date = datetime.datetime.now()
         questionnaires = self.get_queryset().filter(date_end__gte=date).all()
-        serializer = self.serializer_class(questionnaires, many=True)
+        if request.query_params.get('pending') in ('true', 'True', '1'):
+            questionnaires = questionnaires.exclude(pk__in=progress.completed(request.user))
+        serializer = self.get_serializer(questionnaires, many=True)
         return Response(serializer.data)
 
+    @swagger_auto_schema(operation_description="Выгрузить все ответы анкеты потоком в csv или ndjson",
+                         manual_parameters=[openapi.Parameter('format', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                                                              enum=list(export.FORMATS))])
+    @action(detail=True, methods=['get'], renderer_classes=[renderers.CSVRenderer, renderers.NDJSONRenderer])
+    def export(self, request, pk=None):
+        questionnaire = self.get_object()
+        export_format = request.accepted_renderer.format
+        response = StreamingHttpResponse(export.iter_export(questionnaire, export_format),
+                                         content_type=export.CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = 'attachment; filename="questionnaire_{0}.{1}"'.format(questionnaire.pk,
+                                                                                               export_format)
+        return response
+
+    @swagger_auto_schema(operation_description="Получить итоги анкеты по вопросам и вариантам. "
+                                               "У текстовых вопросов счетчиков нет")
+    @action(detail=True, methods=['get'])
+    def results(self, request, pk=None):
+        return Response(results.get_results(self.get_object()))
+
+    @swagger_auto_schema(
+        operation_description="Получить число респондентов по вариантам вопроса row или по парам вариантов "
+                              "row x col среди прошедших анкету, с отбором по выбранным вариантам",
+        manual_parameters=[
+            openapi.Parameter('row', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=True,
+                              description='Вопрос строк'),
+            openapi.Parameter('col', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description='Вопрос столбцов'),
+            openapi.Parameter('filter', openapi.IN_QUERY, type=openapi.TYPE_ARRAY,
+                              items=openapi.Items(type=openapi.TYPE_STRING), collection_format='multi',
+                              description='<вопрос>:<вариант>,<вариант> - выбран один из вариантов, '
+                                          'несколько отборов через И'),
+        ])
+    @action(detail=True, methods=['get'])
+    def crosstab(self, request, pk=None):
+        questionnaire = self.get_object()
+        errors = {}
+        row = col = None
+        try:
+            row = int(request.query_params['row'])
+        except (KeyError, ValueError):
+            errors['row'] = ['A valid Question pk is required.']
+        if request.query_params.get('col'):
+            try:
+                col = int(request.query_params['col'])
+            except ValueError:
+                errors['col'] = ['A valid Question pk is required.']
+        filters = []
+        for value in request.query_params.getlist('filter'):
+            try:
+                question_pk, option_pks = value.split(':')
+                filters.append((int(question_pk), [int(option_pk) for option_pk in option_pks.split(',')]))
+            except ValueError:
+                errors.setdefault('filter', []).append(
+                    'Invalid filter "{0}", expected <question>:<option>[,<option>...]'.format(value))
+        if errors:
+            raise ValidationError(errors)
+        try:
+            return Response(analytics.crosstab(questionnaire.pk, row, col, filters))
+        except analytics.ColumnsError as e:
+            raise ValidationError({'non_field_errors': [str(e)]})
+
     def list(self, request):
         queryset = self.filter_queryset(self.get_queryset())
 
@@ -103,6 +298,9 @@ class QuestionnaireViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True, noexpand=True)
         return Response(serializer.data)
 
+    def perform_destroy(self, instance):
+        purge.mark_deleted(instance)
+
     def get_permissions(self):
         if self.action in ('list', 'retrieve', 'active'):
             permission_classes = [IsAuthenticated]
@@ -113,7 +311,7 @@ class QuestionnaireViewSet(viewsets.ModelViewSet):
 
 @method_decorator(name='list', decorator=swagger_auto_schema(operation_description="Получить список вопросов",
                                                              filter_inspectors=[DjangoFilterDescriptionInspector], ))
-class QuestionViewSet(viewsets.ModelViewSet):
+class QuestionViewSet(ReplicaReadMixin, FastReadMixin, ExpandQuerysetMixin, viewsets.ModelViewSet):
     """
         create:
         Создать вопрос
@@ -130,8 +328,9 @@ class QuestionViewSet(viewsets.ModelViewSet):
         destroy:
         Удалить вопрос
     """
-    queryset = Question.objects.all()
+    queryset = Question.objects.filter(questionnaire__deleted_at__isnull=True)
     serializer_class = serializers.QuestionSerializer
+    expand_prefetch = ('options',)
     filter_backends = (DjangoFilterBackend, OrderingFilter)
     filterset_fields = ('name', 'questionnaire')
     # ordering_fields = ('date_begin', 'date_end')
@@ -161,7 +360,7 @@ class QuestionViewSet(viewsets.ModelViewSet):
 
 @method_decorator(name='list', decorator=swagger_auto_schema(operation_description="Получить список вариантов",
                                                              filter_inspectors=[DjangoFilterDescriptionInspector], ))
-class OptionViewSet(viewsets.ModelViewSet):
+class OptionViewSet(ReplicaReadMixin, FastReadMixin, viewsets.ModelViewSet):
     """
         create:
         Создать вариант
@@ -178,7 +377,7 @@ class OptionViewSet(viewsets.ModelViewSet):
         destroy:
         Удалить вариант
     """
-    queryset = Option.objects.all()
+    queryset = Option.objects.filter(question__questionnaire__deleted_at__isnull=True)
     serializer_class = serializers.OptionSerializer
     filter_backends = (DjangoFilterBackend, OrderingFilter)
     filterset_fields = ('question',)
@@ -187,6 +386,18 @@ class OptionViewSet(viewsets.ModelViewSet):
 
     swagger_schema = NoTitleAutoSchema
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            rows = list(AnswerOption.objects.filter(option=instance)
+                        .values_list('answer_question__question', 'answer_question', 'option'))
+            answer_questionnaire_pks = []
+            if documents.is_enabled():
+                answer_questionnaire_pks = (AnswerQuestion.objects.filter(pk__in={row[1] for row in rows})
+                                            .values_list('answer_questionnaire', flat=True))
+            instance.delete()
+            results.discount_answer_options(rows)
+            documents.save(answer_questionnaire_pks)
+
     @swagger_auto_schema()
     def get_permissions(self):
         if self.action in ('list', 'retrieve'):
@@ -198,7 +409,10 @@ class OptionViewSet(viewsets.ModelViewSet):
 
 @method_decorator(name='list', decorator=swagger_auto_schema(operation_description="Список пройденных анкет",
                                                              filter_inspectors=[DjangoFilterDescriptionInspector], ))
-class AnswerViewSet(mixins.CreateModelMixin,
+class AnswerViewSet(ReplicaReadMixin,
+                    FastReadMixin,
+                    ExpandQuerysetMixin,
+                    mixins.CreateModelMixin,
                     mixins.RetrieveModelMixin,
                     # mixins.UpdateModelMixin,
                     mixins.DestroyModelMixin,
@@ -206,26 +420,42 @@ class AnswerViewSet(mixins.CreateModelMixin,
                     GenericViewSet):
     """
         create:
-        Создать пройденную анкету со всем вопросами
+        Начать прохождение анкеты. Ответы на вопросы создаются при первом ответе, у вопросов без ответа pk null
+
+        answer:
+        Ответить на вопрос: создать или заменить ответ. Первый ответ на вопрос - только здесь,
+        /answer_questions/ и /answer_options/ изменяют уже созданные ответы
 
         retrieve:
         Получить пройденную анкету
 
         destroy:
         Удалить пройденную анкету
+
+        submit:
+        Пройти анкету целиком одним запросом
+
+        enqueue:
+        Поставить прохождение анкеты в очередь на запись
+
+        queue:
+        Состояние очереди записи (администратор) или своей отправки по ключу
     """
 
-    queryset = AnswerQuestionnaire.objects.all()
+    queryset = AnswerQuestionnaire.objects.filter(questionnaire__deleted_at__isnull=True)
     serializer_class = serializers.AnswerQuestionnaireSerializer
+    expand_prefetch = ('answer_questions__answer_options',)
+    plain_actions = ('answer', 'enqueue', 'queue')
+    pagination_class = KeysetPagination
     filter_backends = (DjangoFilterBackend, OrderingFilter)
     filterset_fields = ('questionnaire', 'user')
-    ordering_fields = ('created_at')
-    ordering = ('created_at',)
+    ordering_fields = ('created_at',)
+    ordering = ('created_at',)  # Ключ страницы (created_at, pk)
 
     swagger_schema = NoTitleAutoSchema
 
     def get_queryset(self):
-        queryset = self.queryset
+        queryset = super(AnswerViewSet, self).get_queryset()
         if not self.request.user.is_staff:  # Не админ видит только свои пройденные анкеты
             queryset = queryset.filter(user=self.request.user)
         return queryset
@@ -241,6 +471,76 @@ class AnswerViewSet(mixins.CreateModelMixin,
         serializer = self.get_serializer(queryset, many=True, noexpand=True)
         return Response(serializer.data)
 
+    def retrieve(self, request, *args, **kwargs):
+        if documents.is_enabled():
+            # Ответы читаются из документа тем же запросом по pk, что и сама пройденная анкета
+            row, data = documents.retrieve(self.filter_queryset(self.get_queryset()),
+                                           self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+            self.check_object_permissions(request, row)
+            if data is not None:
+                return Response(data)
+        return super(AnswerViewSet, self).retrieve(request, *args, **kwargs)
+
+    @swagger_auto_schema(operation_description="Пройти анкету целиком одним запросом",
+                         request_body=serializers.AnswerSubmitSerializer,
+                         responses={201: serializers.AnswerQuestionnaireSerializer})
+    @action(detail=False, methods=['post'])
+    def submit(self, request):
+        serializer = serializers.AnswerSubmitSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        answer_questionnaire = serializer.save(user=request.user)
+        answer_questionnaire = self.get_queryset().get(pk=answer_questionnaire.pk)
+        return Response(self.get_serializer(answer_questionnaire).data, status=status.HTTP_201_CREATED)
+
+    @swagger_auto_schema(operation_description="Ответить на вопрос анкеты: создать или заменить ответ и варианты",
+                         request_body=serializers.AnswerUpsertSerializer,
+                         responses={200: serializers.AnswerQuestionSerializer,
+                                    201: serializers.AnswerQuestionSerializer})
+    @action(detail=True, methods=['post'])
+    def answer(self, request, pk=None):
+        context = dict(self.get_serializer_context(), answer_questionnaire=self.get_object())
+        serializer = serializers.AnswerUpsertSerializer(data=request.data, context=context)
+        serializer.is_valid(raise_exception=True)
+        answer_question = serializer.save()
+        return Response(serializers.AnswerQuestionSerializer(answer_question).data,
+                        status=status.HTTP_201_CREATED if serializer.created else status.HTTP_200_OK)
+
+    @swagger_auto_schema(operation_description="Поставить прохождение анкеты в очередь на запись. "
+                                               "Ответы проверяются по кэшу анкеты, запись в базу идет пачками",
+                         request_body=serializers.AnswerEnqueueSerializer)
+    @action(detail=False, methods=['post'])
+    def enqueue(self, request):
+        serializer = serializers.AnswerEnqueueSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        submission, created = ingest.enqueue(request.user, serializer.validated_data)
+        return Response(ingest.to_representation(submission),
+                        status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK)
+
+    @swagger_auto_schema(operation_description="Отставание очереди записи (администратор), "
+                                               "с submission_key - состояние своей отправки",
+                         manual_parameters=[openapi.Parameter('submission_key', openapi.IN_QUERY,
+                                                              type=openapi.TYPE_STRING)])
+    @action(detail=False, methods=['get'])
+    def queue(self, request):
+        submission_key = request.query_params.get('submission_key')
+        if submission_key is None:
+            # Общее состояние очереди - только администратору, свою отправку по ключу видит каждый
+            if not IsAdminUser().has_permission(request, self):
+                self.permission_denied(request)
+            return Response(ingest.get_queue().stats())
+        submission = ingest.get_queue().get(request.user.pk, submission_key)
+        if submission is None:
+            raise NotFound('No submission with key {0}'.format(submission_key))
+        return Response(ingest.to_representation(submission))
+
+    def perform_destroy(self, instance):
+        serializers.check_open(instance.questionnaire)
+        with transaction.atomic():
+            results.discount_answer_questionnaire(instance)
+            # Без каскада Django: ответы не загружаются в память, см. purge.py
+            purge.delete_answer_questionnaires([instance.pk])
+            progress.refresh(instance.questionnaire_id, [instance.user_id])
+
     @swagger_auto_schema()
     def get_permissions(self):
         permission_classes = [IsAuthenticated]
@@ -250,7 +550,10 @@ class AnswerViewSet(mixins.CreateModelMixin,
 @method_decorator(name='list',
                   decorator=swagger_auto_schema(operation_description="Получить список вопросов в пройденых анкетах",
                                                 filter_inspectors=[DjangoFilterDescriptionInspector], ))
-class AnswerQuestionViewSet(mixins.RetrieveModelMixin,
+class AnswerQuestionViewSet(ReplicaReadMixin,
+                            FastReadMixin,
+                            ExpandQuerysetMixin,
+                            mixins.RetrieveModelMixin,
                             mixins.UpdateModelMixin,
                             mixins.ListModelMixin,
                             GenericViewSet):
@@ -259,40 +562,44 @@ class AnswerQuestionViewSet(mixins.RetrieveModelMixin,
         Получить вопрос
 
         partial_update:
-        Изменить вопрос
+        Изменить ответ на вопрос. Ответ создается первым POST /answers/{id}/answer/
 
         partial_update:
-        Изменить вопрос
+        Изменить ответ на вопрос. Ответ создается первым POST /answers/{id}/answer/
     """
 
-    queryset = AnswerQuestion.objects.all()
+    queryset = AnswerQuestion.objects.filter(questionnaire__deleted_at__isnull=True)
     serializer_class = serializers.AnswerQuestionSerializer
+    expand_prefetch = ('answer_options',)
+    pagination_class = KeysetPagination
     filter_backends = (DjangoFilterBackend, OrderingFilter)
     filterset_fields = ('answer_questionnaire',)
-    # ordering_fields = ('created_at')
-    # ordering = ('created_at',)
+    # Только поля без NULL: ключ страницы сравнивается по значению
+    ordering_fields = ('pk', 'answer_questionnaire', 'question', 'question_type')
+    ordering = ('pk',)
 
     swagger_schema = NoTitleAutoSchema
 
     def get_queryset(self):
-        queryset = self.queryset
+        queryset = super(AnswerQuestionViewSet, self).get_queryset()
         if not self.request.user.is_staff:  # Не админ видит только свои данные
-            queryset = queryset.filter(answer_questionnaire__user=self.request.user)
+            queryset = queryset.filter(user=self.request.user)
         return queryset
 
     def retrieve(self, request, pk):
-        answer_question = self.get_queryset().get(pk=pk)
+        answer_question = self.get_read_queryset().get(pk=pk)
         if answer_question.question_type == 0:
-            serializer = serializers.AnswerQuestionTextSerializer(answer_question, many=False)
+            serializer = self.get_serializer(answer_question, serializer_class=serializers.AnswerQuestionTextSerializer)
         else:
-            serializer = serializers.AnswerQuestionOptionSerializer(answer_question, many=False)
+            serializer = self.get_serializer(answer_question,
+                                             serializer_class=serializers.AnswerQuestionOptionSerializer)
         # serializer = self.serializer_class(answer_question, many=False)
         return Response(serializer.data)
 
+    @db.retry_on_locked
     def update(self, request, pk, *args, **kwargs):
         partial = kwargs.pop('partial', False)
         instance = self.get_object()
-        print(request.data, pk)
         if self.get_queryset().get(pk=pk).question_type == 0:
             serializer = serializers.AnswerQuestionTextSerializer(instance, data=request.data, partial=partial)
         else:
@@ -307,6 +614,13 @@ class AnswerQuestionViewSet(mixins.RetrieveModelMixin,
 
         return Response(serializer.data)
 
+    def perform_update(self, serializer):
+        serializers.check_open(serializer.instance.questionnaire)
+        # Одна транзакция на запись, что бы retry_on_locked повторял ее целиком
+        with transaction.atomic():
+            instance = serializer.save()
+            documents.save([instance.answer_questionnaire_id])
+
     @swagger_auto_schema()
     def get_permissions(self):
         permission_classes = [IsAuthenticated]
@@ -315,7 +629,9 @@ class AnswerQuestionViewSet(mixins.RetrieveModelMixin,
 
 @method_decorator(name='list', decorator=swagger_auto_schema(operation_description="Список вариантов в ответе",
                                                              filter_inspectors=[DjangoFilterDescriptionInspector], ))
-class AnswerOptionViewSet(mixins.CreateModelMixin,
+class AnswerOptionViewSet(ReplicaReadMixin,
+                          FastReadMixin,
+                          mixins.CreateModelMixin,
                           mixins.RetrieveModelMixin,
                           # mixins.UpdateModelMixin,
                           mixins.DestroyModelMixin,
@@ -323,7 +639,7 @@ class AnswerOptionViewSet(mixins.CreateModelMixin,
                           GenericViewSet):
     """
         create:
-        Добавить вариант в ответ
+        Добавить вариант в ответ. Ответ на вопрос создается первым POST /answers/{id}/answer/
 
         retrieve:
         Получить вариант в ответе
@@ -331,21 +647,46 @@ class AnswerOptionViewSet(mixins.CreateModelMixin,
         destroy:
         Удалить вариант в ответе
     """
-    queryset = AnswerOption.objects.all()
+    queryset = AnswerOption.objects.filter(questionnaire__deleted_at__isnull=True)
     serializer_class = serializers.AnswerOptionSerializer
+    pagination_class = KeysetPagination
     filter_backends = (DjangoFilterBackend, OrderingFilter)
     filterset_fields = ('answer_question',)
-    # ordering_fields = ('created_at')
-    # ordering = ('created_at',)
+    ordering_fields = ('pk', 'answer_question', 'option')
+    ordering = ('pk',)
 
     swagger_schema = NoTitleAutoSchema
 
     def get_queryset(self):
         queryset = self.queryset
         if not self.request.user.is_staff:  # Не админ видит только свои данные
-            queryset = queryset.filter(answer_question__answer_questionnaire__user=self.request.user)
+            queryset = queryset.filter(user=self.request.user)
         return queryset
 
+    # Повтор всего действия, а не транзакции: после отката сериализатор нужно проверить заново
+    @db.retry_on_locked
+    def create(self, request, *args, **kwargs):
+        return super(AnswerOptionViewSet, self).create(request, *args, **kwargs)
+
+    @db.retry_on_locked
+    def destroy(self, request, *args, **kwargs):
+        return super(AnswerOptionViewSet, self).destroy(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            instance = serializer.save()
+            results.count_answer_options([(instance.answer_question.question_id, instance.answer_question_id,
+                                           instance.option_id)])
+            documents.save([instance.answer_question.answer_questionnaire_id])
+
+    def perform_destroy(self, instance):
+        serializers.check_open(instance.questionnaire)
+        with transaction.atomic():
+            instance.delete()
+            results.discount_answer_options([(instance.answer_question.question_id, instance.answer_question_id,
+                                              instance.option_id)])
+            documents.save([instance.answer_question.answer_questionnaire_id])
+
     @swagger_auto_schema()
     def get_permissions(self):
         permission_classes = [IsAuthenticated]